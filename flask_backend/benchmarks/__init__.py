@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""Benchmarks of the storage layer, run with `python -m benchmarks.<name>`
+"""
+from db import db, redis_client
+import sys
+
+# The databases of the app, which the benchmarks must never wipe
+APP_DATABASES = ('swe_journal', 'swe_journal_dev')
+APP_REDIS_DBS = (0, 2)
+
+
+def require_disposable(redis: bool = False) -> None:
+    """Exit if the benchmark, which wipes its databases, is connected to
+    the app's MongoDB database or, if it also wipes Redis, to the app's
+    Redis db, whatever MODE is
+    """
+    wiped = []
+    if db._db.name in APP_DATABASES:
+        wiped.append(f'the MongoDB database {db._db.name}')
+
+    redis_db = redis_client.connection_pool.connection_kwargs.get('db', 0)
+    if redis and redis_db in APP_REDIS_DBS:
+        wiped.append(f'the Redis db {redis_db}')
+
+    if wiped:
+        sys.exit(f'This benchmark would wipe {" and ".join(wiped)}: run '
+                 f'it with MODE=TEST and a DB_DATABASE of its own')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Benchmark deleting comments from posts with many comments
+
+Compares DBStorage.delete_comment with the former implementation, which
+read the whole post to find the comment among its embedded comments
+before pulling it.
+
+Run from flask_backend against a disposable database, as it wipes it:
+    DB_DATABASE=swe_journal_bench python -m benchmarks.delete_comment
+"""
+from benchmarks import require_disposable
+from bson import ObjectId
+from datetime import datetime, timedelta
+from db import db
+from typing import Callable, List, Tuple
+import argparse
+import statistics
+import time
+
+
+def seed_post(
+        number_of_comments: int,
+        embed_all: bool
+) -> Tuple[List[str], str]:
+    """Create a post with its comments, embedding every comment in the
+    post as it used to, or only the latest ones as it does now.
+    Return the ids of the comments and the id of the post.
+    """
+    username = 'bench_user'
+    user_id = ObjectId()
+    post_id = db.insert_post({
+        'user_id': user_id,
+        'username': username,
+        'title': 'Benchmark post',
+        'content': 'Benchmark content',
+        'is_public': True,
+        'number_of_likes': 0,
+        'comments': [],
+        'number_of_comments': 0,
+        'datePosted': datetime.utcnow()
+    })
+
+    start = datetime.utcnow()
+    documents = [
+        {
+            '_id': ObjectId(),
+            'user_id': user_id,
+            'username': username,
+            'post_id': post_id,
+            'body': f'Comment {i}',
+            'date_posted': start + timedelta(milliseconds=i)
+        }
+        for i in range(number_of_comments)
+    ]
+    db._db['comments'].insert_many(documents)
+
+    embedded = [dict(d, _id=str(d['_id'])) for d in documents]
+    if not embed_all:
+        embedded = embedded[-3:]
+    db._db['posts'].update_one(
+        {'_id': post_id},
+        {'$set': {
+            'comments': embedded,
+            'number_of_comments': number_of_comments
+        }}
+    )
+
+    return [str(d['_id']) for d in documents], str(post_id)
+
+
+def legacy_delete_comment(comment_id: str, username: str,
+                          post_id: str) -> bool:
+    """The former implementation of DBStorage.delete_comment"""
+    comments = db._db['comments']
+    posts = db._db['posts']
+
+    comments.delete_one({'_id': ObjectId(comment_id), 'username': username})
+    post = posts.find_one({'_id': ObjectId(post_id)})
+    for comment in post['comments']:
+        if comment['_id'] == comment_id:
+            posts.update_one(
+                {'_id': ObjectId(post_id)},
+                {
+                    '$inc': {'number_of_comments': -1},
+                    '$pull': {'comments': {'_id': comment_id}}
+                }
+            )
+            return True
+    return False
+
+
+def run(name: str, delete: Callable[[str, str, str], bool],
+        number_of_comments: int, deletes: int, embed_all: bool) -> None:
+    """Time `deletes` deletions spread over the post's comments"""
+    db.clear_db()
+    comment_ids, post_id = seed_post(number_of_comments, embed_all)
+
+    step = max(number_of_comments // deletes, 1)
+    timings = []
+    for comment_id in comment_ids[::step][:deletes]:
+        start = time.perf_counter()
+        delete(comment_id, 'bench_user', post_id)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f'{name:>8}: {len(timings)} deletes, '
+          f'p50 {statistics.median(timings):.2f} ms, '
+          f'p99 {timings[int(len(timings) * 0.99) - 1]:.2f} ms, '
+          f'{len(timings) / (sum(timings) / 1000):.0f} deletes/s')
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmarks"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--comments', type=int, default=10000,
+                        help='number of comments on the post')
+    parser.add_argument('--deletes', type=int, default=500,
+                        help='number of comments to delete')
+    args = parser.parse_args()
+    require_disposable()
+
+    run('legacy', legacy_delete_comment, args.comments, args.deletes,
+        embed_all=True)
+    run('current', db.delete_comment, args.comments, args.deletes,
+        embed_all=False)
+    db.clear_db()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark the logins per second per core at each bcrypt cost
+
+A login verifies one password: the time of a verification on a single
+core bounds the logins a core can serve. The pool's throughput is also
+measured, to check that it scales with its number of workers.
+
+Run from flask_backend:
+    python -m benchmarks.password_hashing --rounds 10 11 12 13 --workers 4
+"""
+from passwords import PasswordHasher
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import time
+
+
+def logins_per_second(hasher: PasswordHasher, hashed_password: bytes,
+                      logins: int, threads: int) -> float:
+    """Return the password verifications per second, with `threads`
+    request threads verifying at once
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = executor.map(
+            lambda _: hasher.verify(hashed_password, 'benchmark password'),
+            range(logins)
+        )
+        assert all(results)
+
+    return logins / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, nargs='+',
+                        default=[10, 11, 12, 13],
+                        help='bcrypt costs to measure')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='processes of the hashing pool')
+    parser.add_argument('--logins', type=int, default=20,
+                        help='logins per measure')
+    args = parser.parse_args()
+
+    print(f'{"cost":>4} {"ms/login":>9} {"logins/s/core":>14} '
+          f'{"pool logins/s":>14}')
+    for rounds in args.rounds:
+        inline = PasswordHasher(rounds=rounds, workers=0)
+        hashed_password = inline.hash('benchmark password')
+
+        per_core = logins_per_second(inline, hashed_password,
+                                     args.logins, threads=1)
+
+        pool = PasswordHasher(rounds=rounds, workers=args.workers)
+        pool.verify(hashed_password, 'benchmark password')  # start the pool
+        pooled = logins_per_second(pool, hashed_password, args.logins,
+                                   threads=args.workers * 2)
+        pool.configure(rounds, 0)
+
+        print(f'{rounds:>4} {1000 / per_core:>9.1f} {per_core:>14.1f} '
+              f'{pooled:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Benchmark recomputing the current streaks from the posts
+
+Seeds users with a daily post over their last days, half of them with a
+broken streak, then times Streaks.rebuild and reports users per second.
+
+Run from flask_backend against a disposable database and the test Redis
+db, as it wipes them:
+    MODE=TEST DB_DATABASE=swe_journal_bench \
+        python -m benchmarks.streak_rebuild
+"""
+from benchmarks import require_disposable
+from bson import ObjectId
+from datetime import datetime, timedelta
+from db import db, leaderboard, redis_client, streaks
+import argparse
+import time
+
+STREAK_TTL = 28 * 3600
+
+
+def seed(users: int, posts_per_user: int, chunk: int = 10000) -> None:
+    """Create `users` users with `posts_per_user` daily posts each"""
+    now = datetime.utcnow()
+    for first in range(0, users, chunk):
+        user_docs, post_docs = [], []
+        for i in range(first, min(first + chunk, users)):
+            user_id = ObjectId()
+            user_docs.append({'_id': user_id, 'username': f'bench{i}',
+                              'email': f'bench{i}@example.com',
+                              'longest_streak': posts_per_user})
+            # Odd users missed their last two days
+            offset = 2 if i % 2 else 0
+            post_docs.extend(
+                {'user_id': str(user_id), 'username': f'bench{i}',
+                 'is_public': False,
+                 'datePosted': now - timedelta(days=day + offset, hours=1)}
+                for day in range(posts_per_user)
+            )
+        db._db['users'].insert_many(user_docs)
+        db._db['posts'].insert_many(post_docs)
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000,
+                        help='number of users')
+    parser.add_argument('--posts', type=int, default=10,
+                        help='number of posts per user')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='users written to Redis per round trip')
+    args = parser.parse_args()
+    require_disposable(redis=True)
+
+    db.clear_db()
+    redis_client.flushdb()
+    db.ensure_indexes()
+    seed(args.users, args.posts)
+
+    start = time.perf_counter()
+    count = streaks.rebuild(db, STREAK_TTL, leaderboard, args.batch_size)
+    elapsed = time.perf_counter() - start
+
+    print(f'{args.users} users, {args.users * args.posts} posts: '
+          f'restored {count} streaks in {elapsed:.1f} s, '
+          f'{args.users / elapsed:.0f} users/s')
+
+    db.clear_db()
+    redis_client.flushdb()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Maintenance commands of our app, run with `flask <command>`
+"""
+import click
+from db import (
+    activity,
+    db,
+    job_queue,
+    leaderboard,
+    like_buffer,
+    streaks,
+    timeline,
+    user_cache,
+)
+from db.migrations import DuplicateUsersError
+from flask import Flask
+import socket
+from tasks import TASKS
+import time
+
+
+def register_commands(app: Flask) -> None:
+    """Register the maintenance commands on the app
+    """
+
+    @app.cli.command('migrate')
+    def migrate():
+        """Apply the pending MongoDB migrations
+        """
+        try:
+            applied = db.migrate()
+        except DuplicateUsersError as e:
+            raise click.ClickException(
+                f'{e}\nDeduplicate these users, then migrate again')
+
+        for m in applied:
+            click.echo(f'Applied migration {m.version}: {m.description}')
+        if not applied:
+            click.echo('No pending migration')
+
+    @app.cli.command('ensure-indexes')
+    def ensure_indexes():
+        """Create the declared MongoDB indexes that don't exist yet
+        """
+        db.ensure_indexes()
+        click.echo('Indexes are up to date')
+
+    @app.cli.command('flush-likes')
+    @click.option('--once', is_flag=True, help='Flush once and exit.')
+    def flush_likes(once):
+        """Write the likes buffered in Redis to MongoDB periodically
+        """
+        interval = app.config['LIKES_FLUSH_INTERVAL']
+
+        while True:
+            count = like_buffer.flush()
+            if count:
+                click.echo(f'Flushed {count} likes')
+            if once:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('rebuild-timeline')
+    def rebuild_timeline():
+        """Rebuild the public timeline in Redis from MongoDB
+        """
+        count = timeline.rebuild()
+        if count is None:
+            raise click.ClickException('The timeline is already being '
+                                       'rebuilt')
+        click.echo(f'Public timeline rebuilt with {count} posts')
+
+    @app.cli.command('rebuild-activity')
+    def rebuild_activity():
+        """Mark the days of every post in the users' activity bitmaps
+        """
+        count = activity.rebuild(db)
+        click.echo(f'Activity rebuilt from {count} posts')
+
+    @app.cli.command('rebuild-leaderboard')
+    def rebuild_leaderboard():
+        """Put the users' longest streaks on the leaderboard
+        """
+        count = leaderboard.rebuild(db)
+        click.echo(f'Leaderboard rebuilt from {count} users')
+
+    @app.cli.command('rebuild-streaks')
+    def rebuild_streaks():
+        """Recompute the users' current streaks from their posts
+        """
+        count = streaks.rebuild(db, app.config['STREAK_TTL'], leaderboard)
+        click.echo(f'Restored {count} current streaks')
+
+    @app.cli.command('user-cache-stats')
+    @click.option('--reset', is_flag=True,
+                  help='Set the counters back to 0 after printing them.')
+    def user_cache_stats(reset):
+        """Print the lookups of the users' cache by every worker
+        """
+        stats = user_cache.total_stats()
+        click.echo(f'Hits in memory: {stats["local_hits"]}')
+        click.echo(f'Hits in Redis: {stats["redis_hits"]}')
+        click.echo(f'Misses: {stats["misses"]}')
+        click.echo(f'Hit rate: {stats["hit_rate"]:.1%}')
+        if reset:
+            user_cache.reset_total_stats()
+
+    @app.cli.command('worker')
+    @click.option('--burst', is_flag=True,
+                  help='Run the queued jobs and exit.')
+    @click.option('--name', default=None,
+                  help='Name of the worker, unique and stable across '
+                       'restarts (default: <hostname>).')
+    def worker(burst, name):
+        """Run the background jobs
+        """
+        name = name or socket.gethostname()
+        count = job_queue.work(TASKS, worker=name, burst=burst)
+        click.echo(f'Ran {count} jobs')
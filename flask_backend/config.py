@@ -20,8 +20,98 @@ class Config:
     HOST = os.getenv('FLASK_HOST', '0.0.0.0')
     PORT = os.getenv('FLASK_PORT', '5000')
 
+    # Build the MongoDB indexes at startup instead of with `flask migrate`
+    ENSURE_INDEXES = False
+
+    # Rendered feed's pages: lifetime of a page, of its stale copy served
+    # while it is rebuilt, and of the rebuild lock (in seconds)
+    FEED_CACHE_TTL = int(os.getenv('FEED_CACHE_TTL', '60'))
+    FEED_CACHE_STALE_TTL = int(os.getenv('FEED_CACHE_STALE_TTL', '3600'))
+    FEED_CACHE_LOCK_TTL = 5
+
+    # Last page number of the paginated feed, deeper pages are read with
+    # cursors
+    FEED_MAX_PAGE = int(os.getenv('FEED_MAX_PAGE', '500'))
+
+    # Count likes in Redis and write them to MongoDB by batches, every
+    # LIKES_FLUSH_INTERVAL seconds (run `flask flush-likes`)
+    LIKES_BUFFERING = os.getenv('LIKES_BUFFERING') == '1'
+    LIKES_FLUSH_INTERVAL = int(os.getenv('LIKES_FLUSH_INTERVAL', '5'))
+
+    # Comments returned by /feed/post_comments: default page size, and
+    # the largest one a client may ask for with page_size
+    COMMENTS_PAGE_SIZE = int(os.getenv('COMMENTS_PAGE_SIZE', '20'))
+    COMMENTS_MAX_PAGE_SIZE = int(os.getenv('COMMENTS_MAX_PAGE_SIZE', '100'))
+
+    # An entry is refused while the user's current streak has more than
+    # STREAK_MAX_ALLOWED_TTL seconds left, then the streak lasts STREAK_TTL
+    # seconds: one post in a 20h interval, within 28h (1 and 2 minutes in
+    # development)
+    if os.getenv('MODE') == 'DEV':
+        STREAK_MAX_ALLOWED_TTL, STREAK_TTL = 60, 120
+    else:
+        STREAK_MAX_ALLOWED_TTL, STREAK_TTL = 8 * 3600, 28 * 3600
+
+    # Recompute the current streaks from the posts at startup when Redis
+    # lost them, in a background thread (or run `flask rebuild-streaks`)
+    STREAKS_RESTORE_ON_START = True
+    STREAKS_RESTORE_LOCK_TTL = 600
+
+    # Users returned by /leaderboard: default count, and the largest one
+    # a client may ask for with limit
+    LEADERBOARD_SIZE = int(os.getenv('LEADERBOARD_SIZE', '10'))
+    LEADERBOARD_MAX_SIZE = int(os.getenv('LEADERBOARD_MAX_SIZE', '100'))
+
+    # Each worker remembers the identities whose token was found in Redis
+    # for TOKEN_CACHE_TTL seconds (0 to disable), TOKEN_CACHE_SIZE at most
+    TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '5'))
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+
+    # The users' documents are kept USER_CACHE_TTL seconds in each worker
+    # (0 to disable), USER_CACHE_SIZE at most, and USER_CACHE_REDIS_TTL
+    # seconds in Redis
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '5'))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+    USER_CACHE_REDIS_TTL = int(os.getenv('USER_CACHE_REDIS_TTL', '300'))
+
+    # Cost of the passwords' bcrypt hashes, rehashed at login when it
+    # changes, and number of processes hashing them (0 to hash inline)
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+
+    # Background jobs run by `flask worker`: attempts of a job, delay
+    # before its first retry, doubled after each attempt, and how long
+    # the state of an ended job is kept (in seconds)
+    JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '3'))
+    JOBS_RETRY_DELAY = float(os.getenv('JOBS_RETRY_DELAY', '5'))
+    JOBS_RESULT_TTL = int(os.getenv('JOBS_RESULT_TTL', '86400'))
+
+    # Requests allowed to each client on the rate limited routes of a
+    # blueprint: (limit, period in seconds)
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+    RATE_LIMITS = {
+        'auth_bp': (10, 60),
+        'home_bp': (30, 60),
+        'feed_bp': (60, 60),
+        'profile_bp': (30, 60),
+    }
+
+    # Number of proxies in front of the app setting X-Forwarded-For,
+    # to rate limit the clients' IP addresses instead of the proxy's
+    PROXY_COUNT = int(os.getenv('PROXY_COUNT', '0'))
+
 
 class TestConfig(Config):
     """Testing configuration for our app
     """
     TESTING = True
+    ENSURE_INDEXES = True
+    # Tests revoke tokens by deleting them from Redis
+    TOKEN_CACHE_TTL = 0
+    # Cheap hashes, computed inline
+    BCRYPT_ROUNDS = 4
+    PASSWORD_HASH_WORKERS = 0
+    RATE_LIMIT_ENABLED = False
+    # Streaks of 2 and 4 seconds, restored by the tests themselves
+    STREAK_MAX_ALLOWED_TTL, STREAK_TTL = 2, 4
+    STREAKS_RESTORE_ON_START = False
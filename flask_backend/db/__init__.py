@@ -1,7 +1,30 @@
 #!/usr/bin/env python3
 """Initialize MongoDB client
 """
+from db.activity import Activity
 from db.db_manager import DBStorage
 from db.redis_client import redis_client
+from db.sessions import SessionStore
+from db.streaks import Streaks
+from db.feed_cache import FeedCache
+from db.job_queue import JobQueue
+from db.leaderboard import Leaderboard
+from db.like_buffer import LikeBuffer
+from db.rate_limiter import RateLimiter
+from db.timeline import Timeline
+from db.token_cache import TokenCache
+from db.user_cache import UserCache
 
 db = DBStorage()
+timeline = Timeline(redis_client, db)
+feed_cache = FeedCache(redis_client)
+like_buffer = LikeBuffer(redis_client, db, feed_cache)
+token_cache = TokenCache(redis_client)
+sessions = SessionStore(redis_client, token_cache)
+rate_limiter = RateLimiter(redis_client)
+streaks = Streaks(redis_client)
+activity = Activity(redis_client)
+leaderboard = Leaderboard(redis_client)
+user_cache = UserCache(redis_client, db)
+db.on_user_changed(user_cache.invalidate)
+job_queue = JobQueue(redis_client)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Module for the users' daily activity, stored as yearly bitmaps in Redis.
+"""
+from datetime import date, datetime, timedelta
+from redis import Redis
+from typing import Any, Dict, List, Tuple
+
+
+# Read a year's bitmap with its number of active days and its runs of
+# consecutive active days, found by jumping between bits with BITPOS.
+#   KEYS: bitmap
+#   ARGV: number of days in the year
+# Return {active days, bitmap, start of run 1, end of run 1, ...}
+YEAR_SCRIPT = """
+local bitmap = redis.call('GET', KEYS[1])
+if not bitmap then
+    return {0, ''}
+end
+
+local days = tonumber(ARGV[1])
+local result = {redis.call('BITCOUNT', KEYS[1]), bitmap}
+
+local start = redis.call('BITPOS', KEYS[1], 1, 0, -1, 'BIT')
+while start ~= -1 and start < days do
+    local stop = redis.call('BITPOS', KEYS[1], 0, start, -1, 'BIT')
+    if stop == -1 or stop > days then
+        stop = days
+    end
+    table.insert(result, start)
+    table.insert(result, stop)
+
+    start = redis.call('BITPOS', KEYS[1], 1, stop, -1, 'BIT')
+end
+
+return result
+"""
+
+
+class Activity:
+    """ Set a bit per day a user logged an entry, in a bitmap per user
+    and year: 46 bytes at most per user per year.
+    """
+
+    def __init__(self, client: Redis) -> None:
+        """ Constructor """
+        self._redis = client
+        self._read_year = client.register_script(YEAR_SCRIPT)
+
+    @staticmethod
+    def key(user_id: str, year: int) -> str:
+        """ Return the Redis key of a user's bitmap of a year """
+        return f'activity:{user_id}:{year}'
+
+    @staticmethod
+    def _position(day: date) -> Tuple[int, int]:
+        """ Return the year of a day and its offset in the year """
+        return day.year, day.timetuple().tm_yday - 1
+
+    def mark(self, user_id: str, day: datetime, pipe=None) -> None:
+        """ Mark a user active on a (UTC) day, in a pipeline if given """
+        year, offset = self._position(day)
+        (pipe or self._redis).setbit(self.key(user_id, year), offset, 1)
+
+    def year(self, user_id: str, year: int) -> Dict[str, Any]:
+        """ Return a user's activity of a year: a 0/1 flag per day, the
+        number of active days, and the streaks of consecutive active days
+        """
+        first_day = date(year, 1, 1)
+        days = (date(year + 1, 1, 1) - first_day).days
+
+        result = self._read_year(keys=[self.key(user_id, year)], args=[days])
+        active_days, bitmap, bounds = result[0], result[1], result[2:]
+
+        # Redis numbers the bits of each byte from the most significant
+        bitmap = bitmap.ljust((days + 7) // 8, b'\0')
+        heatmap: List[int] = [
+            (bitmap[i // 8] >> (7 - i % 8)) & 1 for i in range(days)
+        ]
+
+        streaks = [
+            {
+                'start': (first_day + timedelta(days=start)).isoformat(),
+                'length': stop - start
+            }
+            for start, stop in zip(bounds[::2], bounds[1::2])
+        ]
+
+        return {
+            'year': year,
+            'days': heatmap,
+            'active_days': active_days,
+            'streaks': streaks,
+            'longest_streak': max((s['length'] for s in streaks), default=0)
+        }
+
+    def rebuild(self, storage, batch_size: int = 1000) -> int:
+        """ Mark the days of every post in the db.
+        Return the number of posts read.
+        """
+        count = 0
+        pipe = self._redis.pipeline(transaction=False)
+        for post in storage.iter_posts_dates(batch_size=batch_size):
+            self.mark(post['user_id'], post['datePosted'], pipe)
+            count += 1
+            if count % batch_size == 0:
+                pipe.execute()
+
+        pipe.execute()
+
+        return count
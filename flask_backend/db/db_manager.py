@@ -2,26 +2,62 @@
 """
 Module for managing storage of SWE_journal in MongoDB.
 """
-from pymongo.errors import ConnectionFailure
+from pymongo.errors import ConnectionFailure, DuplicateKeyError
 from pymongo import ReturnDocument
 from pymongo.results import InsertOneResult
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING, DeleteOne, UpdateOne
 from bson import ObjectId
+from db.migrations import MIGRATIONS, Migration, ensure_db_indexes
+from datetime import datetime
 import os
-import bcrypt
-from typing import Any, Dict, List, Optional
+from passwords import password_hasher
+from typing import (
+    Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+)
 
 
 def hash_pass(password: str) -> bytes:
     """ hash a password and return the hashed value """
-    hash_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-    return hash_password
+    return password_hasher.hash(password)
 
 
 def check_hash_password(hashed_password: bytes, password: str) -> bool:
     """ check if hashed value of two string are the same """
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+    return password_hasher.verify(hashed_password, password)
+
+
+class DuplicateUserError(Exception):
+    """ Raised when a user's email or username is already used """
+
+    def __init__(self, field: str) -> None:
+        """ Constructor """
+        super().__init__(f'{field} already used')
+        self.field = field
+
+
+# Number of latest comments embedded in a listed post
+COMMENTS_PREVIEW = 3
+
+# Order of a post's comments, from the oldest to the most recent
+COMMENTS_SORT = [('date_posted', ASCENDING), ('_id', ASCENDING)]
+
+# Fields returned when listing posts: counters and a preview of the latest
+# comments instead of the full likes and comments arrays
+FEED_PROJECTION = {
+    '_id': 1,
+    'user_id': 1,
+    'username': 1,
+    'title': 1,
+    'content': 1,
+    'is_public': 1,
+    'number_of_likes': 1,
+    'comments': {'$slice': -COMMENTS_PREVIEW},
+    'number_of_comments': 1,
+    'datePosted': 1,
+}
+
+# Most recent posts first, ties broken on _id so the order is stable
+FEED_SORT = [('datePosted', DESCENDING), ('_id', DESCENDING)]
 
 
 def serialize_ObjectId(di: dict) -> Dict[str, Any]:
@@ -59,6 +95,9 @@ class DBStorage:
 
         self._client = MongoClient(mongo_uri)
 
+        # Called with the id of each user changed or deleted
+        self._user_listeners: List[Callable[[str], None]] = []
+
         try:
             self._client.admin.command('ismaster')
 
@@ -80,16 +119,85 @@ class DBStorage:
             print(f"Connection failed: {err}")
             raise
 
+    def on_user_changed(self, listener: Callable[[str], None]) -> None:
+        """ Call `listener` with the id of each user changed or deleted,
+        to invalidate the copies of its document
+        """
+        self._user_listeners.append(listener)
+
+    def _user_changed(self, user_id: str) -> None:
+        """ Notify the listeners that a user changed """
+        for listener in self._user_listeners:
+            listener(str(user_id))
+
+    # SCHEMA
+
+    def ensure_indexes(self) -> None:
+        """ Create the declared indexes that don't exist yet """
+        ensure_db_indexes(self._db)
+
+    def migrate(self) -> List[Migration]:
+        """ Apply the pending migrations in order,
+        and return the applied ones.
+        """
+        migrations = self._db['migrations']
+        applied_versions = {m['_id'] for m in migrations.find({}, {'_id': 1})}
+
+        applied = []
+        for m in MIGRATIONS:
+            if m.version in applied_versions:
+                continue
+
+            m.apply(self._db)
+            migrations.insert_one({
+                '_id': m.version,
+                'description': m.description,
+                'applied_at': datetime.utcnow()
+            })
+            applied.append(m)
+
+        return applied
+
     # INSERT
 
     def insert_user(self, document: Dict[str, Any]) -> InsertOneResult:
-        """ Create a new user document """
+        """ Create a new user document
+
+        Raise a DuplicateUserError if its email or username is already
+        used, as enforced by the unique indexes
+        """
         password = document['password']
         document['password'] = hash_pass(password)
         users = self._db['users']
-        new_user = users.insert_one(document)
+        try:
+            new_user = users.insert_one(document)
+        except DuplicateKeyError as e:
+            raise DuplicateUserError(self._duplicate_user_field(e, document))
         return new_user.inserted_id
 
+    def _duplicate_user_field(
+            self,
+            error: DuplicateKeyError,
+            document: Dict[str, Any],
+            user_id: Optional[str] = None
+    ) -> str:
+        """ Return which field of a user document, or of the update of
+        the user `user_id`, is already used
+        """
+        key_pattern = (error.details or {}).get('keyPattern', {})
+        for field in ('email', 'username'):
+            if field in key_pattern or f'unique_{field}' in str(error):
+                return field
+
+        # The server didn't tell which index failed
+        query: Dict[str, Any] = {'email': document.get('email')}
+        if user_id:
+            query['_id'] = {'$ne': ObjectId(user_id)}
+        if 'email' in document and self._db['users'].find_one(
+                query, {'_id': 1}):
+            return 'email'
+        return 'username'
+
     def insert_post(self, document: Dict[str, Any]) -> InsertOneResult:
         """ Create a new post document """
         posts = self._db['posts']
@@ -103,12 +211,20 @@ class DBStorage:
         """ Return a user document """
         users = self._db['users']
         try:
-            user = users.find(info, {'password': 0})
-            return list(map(serialize_ObjectId, user))[0]
+            # Users being deleted are already gone
+            user = users.find_one(
+                {**info, 'deleted': {'$ne': True}},
+                {'password': 0}
+            )
+            return serialize_ObjectId(user) if user else None
 
         except Exception as e:
             return None
 
+    def find_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """ Return a user document without password, by id """
+        return self.find_user({'_id': ObjectId(user_id)})
+
     def get_hash(self, email: str) -> Optional[Dict[str, Any]]:
         """ Return a user's hashed password """
         users = self._db['users']
@@ -128,6 +244,25 @@ class DBStorage:
         except Exception as e:
             return None
 
+    def find_user_feed(self, user_id: str) -> List[Dict[str, Any]]:
+        """ Return the posts created by a user as listed in a feed,
+        from the most to the less recent.
+        """
+        posts = self._db['posts']
+        user_posts = posts.find(
+            {'user_id': user_id},
+            FEED_PROJECTION
+        ).sort(FEED_SORT)
+
+        return list(map(serialize_ObjectId, user_posts))
+
+    def find_user_post_ids(self, user_id: str) -> List[str]:
+        """ Return the ids of the posts created by a user. """
+        posts = self._db['posts']
+        user_posts = posts.find({'user_id': user_id}, {'_id': 1})
+
+        return [str(p['_id']) for p in user_posts]
+
     def find_post(self, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """ Return a post document """
         posts = self._db['posts']
@@ -150,6 +285,152 @@ class DBStorage:
 
         return list(map(serialize_ObjectId, posts.find()))
 
+    def find_public_posts(
+            self,
+            skip: int = 0,
+            limit: int = 0,
+            before: Optional[Tuple[datetime, ObjectId]] = None
+    ) -> List[Dict[str, Any]]:
+        """ Return a page of public posts, from the most to the less recent.
+        A limit of 0 returns every public post after `skip`.
+        If `before` is a (datePosted, _id) pair, only the posts that come
+        after it in the feed's order are returned.
+        """
+        posts = self._db['posts']
+        query = {'is_public': True}
+
+        if before is not None:
+            date_posted, post_id = before
+            query['$or'] = [
+                {'datePosted': {'$lt': date_posted}},
+                {'datePosted': date_posted, '_id': {'$lt': post_id}}
+            ]
+
+        public_posts = posts.find(
+            query,
+            FEED_PROJECTION
+        ).sort(FEED_SORT).skip(skip).limit(limit)
+
+        return list(map(serialize_ObjectId, public_posts))
+
+    def iter_public_posts(
+            self,
+            projection: Optional[Dict[str, Any]] = None,
+            batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """ Iterate over every public post, from the most to the less recent,
+        fetching them from the db by batches.
+        """
+        posts = self._db['posts']
+        public_posts = posts.find(
+            {'is_public': True},
+            projection if projection is not None else FEED_PROJECTION,
+            batch_size=batch_size
+        ).sort(FEED_SORT)
+
+        return map(serialize_ObjectId, public_posts)
+
+    def iter_posts_dates(
+            self,
+            batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """ Iterate over the user_id and datePosted of every post,
+        fetching them from the db by batches.
+        """
+        posts = self._db['posts']
+        dates = posts.find(
+            {},
+            {'_id': 0, 'user_id': 1, 'datePosted': 1},
+            batch_size=batch_size
+        )
+
+        return map(serialize_ObjectId, dates)
+
+    def iter_users_posts_dates(
+            self,
+            batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """ Iterate over the user_id and datePosted of every post, grouped
+        by user from the most to the less recent, in one aggregation
+        walking the user_posts index and streamed by batches.
+        """
+        posts = self._db['posts']
+        dates = posts.aggregate(
+            [
+                {'$sort': {'user_id': ASCENDING, 'datePosted': DESCENDING}},
+                {'$project': {'_id': 0, 'user_id': 1, 'datePosted': 1}},
+            ],
+            allowDiskUse=True,
+            batchSize=batch_size
+        )
+
+        return map(serialize_ObjectId, dates)
+
+    def iter_longest_streaks(
+            self,
+            batch_size: int = 1000
+    ) -> Iterator[Dict[str, Any]]:
+        """ Iterate over the _id and longest_streak of the users with a
+        streak, fetching them from the db by batches.
+        """
+        users = self._db['users']
+        found = users.find(
+            {'longest_streak': {'$gt': 0}},
+            {'longest_streak': 1},
+            batch_size=batch_size
+        )
+
+        return map(serialize_ObjectId, found)
+
+    def find_posts_by_ids(self, post_ids: List[str]) -> List[Dict[str, Any]]:
+        """ Return the public posts whose ids are in `post_ids`,
+        in the same order.
+        """
+        posts = self._db['posts']
+        found = posts.find(
+            {
+                '_id': {'$in': [ObjectId(post_id) for post_id in post_ids]},
+                'is_public': True
+            },
+            FEED_PROJECTION
+        )
+        by_id = {p['_id']: p for p in map(serialize_ObjectId, found)}
+
+        return [by_id[post_id] for post_id in post_ids if post_id in by_id]
+
+    def find_liked_post_ids(
+            self,
+            user_id: str,
+            post_ids: List[str]
+    ) -> Set[str]:
+        """ Return which of the posts in `post_ids` are liked by a user """
+        likes = self._db['likes']
+        liked = likes.find(
+            {
+                'user_id': ObjectId(user_id),
+                'post_id': {'$in': [ObjectId(post_id) for post_id in post_ids]}
+            },
+            {'_id': 0, 'post_id': 1}
+        )
+
+        return {str(like['post_id']) for like in liked}
+
+    def find_usernames(self, user_ids: List[str]) -> Dict[str, str]:
+        """ Return the usernames of the users in `user_ids`, by id """
+        users = self._db['users']
+        found = users.find(
+            {'_id': {'$in': [ObjectId(user_id) for user_id in user_ids]}},
+            {'username': 1}
+        )
+
+        return {str(user['_id']): user['username'] for user in found}
+
+    def count_public_posts(self) -> int:
+        """ Return the number of public posts """
+        posts = self._db['posts']
+
+        return posts.count_documents({'is_public': True})
+
     # UPDATE
 
     def update_user_info(
@@ -157,32 +438,53 @@ class DBStorage:
             user_id: str,
             update_fields: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
-        """ update and return a user document. """
+        """ update and return a user document.
+
+        Raise a DuplicateUserError if the new email or username is
+        already used
+        """
         users = self._db['users']
         update_fields.pop('password', None)
 
         try:
-            # Update the user
+            # Update the user. A new username is copied to the user's
+            # posts and comments by the rename_user job
             updated_user = users.find_one_and_update(
                 {'_id': ObjectId(user_id)},
                 {'$set': update_fields},
                 return_document=ReturnDocument.AFTER
             )
 
-            # If the username was updated, update it also in user's posts
-            new_username = update_fields.get('username')
-            if new_username:
-                posts = self._db['posts']
-                posts.update_many(
-                    {'user_id': user_id},
-                    {'$set': {'username': new_username}},
-                )
+            self._user_changed(user_id)
 
-            return list(map(serialize_ObjectId, updated_user))[0]
+            return serialize_ObjectId(updated_user) if updated_user else None
 
+        except DuplicateKeyError as e:
+            raise DuplicateUserError(
+                self._duplicate_user_field(e, update_fields, user_id)
+            )
         except Exception as e:
             return None
 
+    def update_longest_streak(self, user_id: str, streak: int) -> bool:
+        """ Raise a user's longest streak to `streak` if it is longer.
+        Return whether it is a new record.
+        """
+        users = self._db['users']
+        before = users.find_one_and_update(
+            {'_id': ObjectId(user_id)},
+            {'$max': {'longest_streak': streak}},
+            projection={'longest_streak': 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+        record = (before is not None
+                  and before.get('longest_streak', 0) < streak)
+        if record:
+            self._user_changed(user_id)
+
+        return record
+
     def update_user_password(
             self,
             user_id: str,
@@ -211,12 +513,30 @@ class DBStorage:
                 {'_id': ObjectId(user_id)},
                 {'$set': {'password': new_hashed_password}}
             )
+            self._user_changed(user_id)
 
             return 0
 
         except Exception as e:
             return -3
 
+    def replace_password_hash(
+            self,
+            user_id: str,
+            old_hash: bytes,
+            new_hash: bytes
+    ) -> bool:
+        """ Replace the hash of a user's password by a new hash of the same
+        password, unless the password was changed meanwhile.
+        """
+        users = self._db['users']
+        replaced = users.update_one(
+            {'_id': ObjectId(user_id), 'password': old_hash},
+            {'$set': {'password': new_hash}}
+        )
+
+        return replaced.modified_count == 1
+
     def update_post(
             self,
             post_id: str,
@@ -238,47 +558,151 @@ class DBStorage:
 
     # FEED'S INTERACTIONS
 
-    def like_post(self, user_id: str, post_id: str) -> bool:
-        """ add likes to a post document. """
+    def like_post(self, user_id: str, post_id: str) -> int:
+        """Record a user's like of a post and count it on the post
+
+        Return 0 if successfully liked, otherwise:
+            * -1: post not found
+            * -2: post already liked by the user
+        """
+        likes = self._db['likes']
         posts = self._db['posts']
-        post = posts.find_one({'_id': ObjectId(post_id)})
-        users = self._db['users']
-        user = users.find_one({'_id': ObjectId(user_id)})
 
-        if user['username'] not in post['likes']:
-            posts.update_one(
-                {"_id": ObjectId(post_id)},
-                {
-                    "$inc": {"number_of_likes": 1},
-                    "$addToSet": {"likes": user['username']}
-                }
-            )
-            return False
-        return True
+        # The unique (post_id, user_id) index rejects a second like
+        try:
+            likes.insert_one({
+                'post_id': ObjectId(post_id),
+                'user_id': ObjectId(user_id),
+                'date_liked': datetime.utcnow()
+            })
+        except DuplicateKeyError:
+            return -2
+
+        result = posts.update_one(
+            {'_id': ObjectId(post_id)},
+            {'$inc': {'number_of_likes': 1}}
+        )
+        if not result.matched_count:
+            likes.delete_one({
+                'post_id': ObjectId(post_id),
+                'user_id': ObjectId(user_id)
+            })
+            return -1
 
-    def unlike_post(self, user_id: str, post_id: str) -> bool:
+        return 0
+
+    def unlike_post(self, user_id: str, post_id: str) -> int:
+        """Remove a user's like of a post and uncount it on the post
+
+        Return 0 if successfully unliked, otherwise:
+            * -1: post not found
+            * -2: post not liked by the user
+        """
+        likes = self._db['likes']
+        posts = self._db['posts']
+
+        result = likes.delete_one({
+            'post_id': ObjectId(post_id),
+            'user_id': ObjectId(user_id)
+        })
+        if not result.deleted_count:
+            if posts.count_documents({'_id': ObjectId(post_id)}, limit=1):
+                return -2
+            return -1
+
+        posts.update_one(
+            {'_id': ObjectId(post_id)},
+            {'$inc': {'number_of_likes': -1}}
+        )
+        return 0
+
+    def post_exists(self, post_id: str) -> bool:
+        """ Check whether a post exists """
+        posts = self._db['posts']
+
+        return bool(posts.count_documents({'_id': ObjectId(post_id)}, limit=1))
+
+    def is_liked(self, user_id: str, post_id: str) -> bool:
+        """ Check whether a user likes a post """
+        likes = self._db['likes']
+
+        return bool(likes.count_documents(
+            {'post_id': ObjectId(post_id), 'user_id': ObjectId(user_id)},
+            limit=1
+        ))
+
+    def apply_likes(self, states: List[Tuple[str, str, bool]]) -> None:
+        """Write (post_id, user_id, liked) states in bulk,
+        then recount the likes of the touched posts.
+        Applying the same states twice is harmless. The states of posts
+        or users deleted since they were recorded are skipped.
+        """
+        likes = self._db['likes']
         posts = self._db['posts']
-        post = posts.find_one({"_id": ObjectId(post_id)})
         users = self._db['users']
-        user = users.find_one({'_id': ObjectId(user_id)})
 
-        if user['username'] in post['likes']:
-            posts.update_one(
-                {"_id": ObjectId(post_id)},
-                {
-                    "$inc": {"number_of_likes": -1},
-                    "$pull": {"likes": user['username']}
-                }
+        post_ids = {ObjectId(p) for p, _, _ in states}
+        user_ids = {ObjectId(u) for _, u, _ in states}
+        post_ids = set(posts.distinct('_id', {'_id': {'$in': list(post_ids)}}))
+        user_ids = set(users.distinct(
+            '_id',
+            {'_id': {'$in': list(user_ids)}, 'deleted': {'$ne': True}}
+        ))
+
+        requests = []
+        for post_id, user_id, liked in states:
+            if (ObjectId(post_id) not in post_ids
+                    or ObjectId(user_id) not in user_ids):
+                continue
+            like = {'post_id': ObjectId(post_id), 'user_id': ObjectId(user_id)}
+            if liked:
+                requests.append(UpdateOne(
+                    like,
+                    {'$setOnInsert': {'date_liked': datetime.utcnow()}},
+                    upsert=True
+                ))
+            else:
+                requests.append(DeleteOne(like))
+
+        if not requests:
+            return
+        likes.bulk_write(requests, ordered=False)
+
+        self._recount_likes(list(post_ids))
+
+    def _recount_likes(self, post_ids: List[ObjectId]) -> None:
+        """ Recount the likes of posts from the likes collection, rather
+        than increment them, so that counters converge
+        """
+        likes = self._db['likes']
+        posts = self._db['posts']
+
+        if not post_ids:
+            return
+
+        counts = {
+            c['_id']: c['count']
+            for c in likes.aggregate([
+                {'$match': {'post_id': {'$in': post_ids}}},
+                {'$group': {'_id': '$post_id', 'count': {'$sum': 1}}}
+            ])
+        }
+        posts.bulk_write([
+            UpdateOne(
+                {'_id': post_id},
+                {'$set': {'number_of_likes': counts.get(post_id, 0)}}
             )
-            return False
-        return True
+            for post_id in post_ids
+        ], ordered=False)
 
     def insert_comment(
             self,
             document: Dict[str, Any],
             post_id: str
     ) -> InsertOneResult:
-        """ Create a new comment document """
+        """ Create a new comment document, count it on the post and
+        add it to the post's preview of its latest comments.
+        """
         posts = self._db['posts']
         comments = self._db['comments']
 
@@ -288,7 +712,12 @@ class DBStorage:
             {"_id": ObjectId(post_id)},
             {
                 "$inc": {"number_of_comments": 1},
-                "$addToSet": {"comments": document}
+                "$push": {
+                    "comments": {
+                        "$each": [document],
+                        "$slice": -COMMENTS_PREVIEW
+                    }
+                }
             }
         )
         return new_comment.inserted_id
@@ -317,14 +746,25 @@ class DBStorage:
             username: str,
             body: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
-        """ Updates a comment document. """
+        """ Updates a comment document, and its copy in the post's
+        preview if there.
+        """
         comments = self._db['comments']
+        posts = self._db['posts']
         try:
             updated_comment = comments.find_one_and_update(
                 {'_id': ObjectId(comment_id), 'username': username},
                 {'$set': {'body': body}},
                 return_document=ReturnDocument.AFTER
             )
+            if updated_comment:
+                posts.update_one(
+                    {
+                        '_id': updated_comment['post_id'],
+                        'comments._id': str(comment_id)
+                    },
+                    {'$set': {'comments.$.body': body}}
+                )
             return serialize_ObjectId(updated_comment)
 
         except Exception as e:
@@ -336,46 +776,134 @@ class DBStorage:
             username: str,
             post_id: str
     ) -> bool:
-        """ deletes a comments and remove it from the post. """
+        """ deletes a comment of a post and remove it from the post.
+        The post is only updated if the comment was deleted. """
         comments = self._db['comments']
         posts = self._db['posts']
         try:
-            comments.delete_one({
+            deleted = comments.delete_one({
                 '_id': ObjectId(comment_id),
-                'username': username
+                'username': username,
+                'post_id': ObjectId(post_id)
             })
-            post = posts.find_one({'_id': ObjectId(post_id)})
-
-            for c in post['comments']:
-                if comment_id == c['_id']:
-                    posts.update_one(
-                        {"_id": ObjectId(post_id)},
-                        {
-                            "$inc": {"number_of_comments": -1},
-                            "$pull": {"comments": {'_id': comment_id}}
-                        }
-                    )
-                    return True
+
+            # The post only embeds its latest comments, so rely on the
+            # comments collection to know whether to uncount it
+            if deleted.deleted_count:
+                post = posts.find_one_and_update(
+                    {
+                        "_id": ObjectId(post_id),
+                        "number_of_comments": {"$gt": 0}
+                    },
+                    {
+                        "$inc": {"number_of_comments": -1},
+                        "$pull": {"comments": {'_id': comment_id}}
+                    },
+                    projection={'comments._id': 1}
+                )
+                previewed = post is not None and any(
+                    c['_id'] == str(comment_id)
+                    for c in post.get('comments', [])
+                )
+                if previewed:
+                    self._refill_preview(ObjectId(post_id))
+                return True
         except Exception as e:
             print(e)
             return False
         return False
 
-    def get_post_comments(self, post_id: str):
-        """ return all the comment documents
-        associated with a post document. """
+    def _refill_preview(self, post_id: ObjectId) -> None:
+        """ Put back the oldest of the latest comments of a post at the
+        start of its preview, after one of them was deleted
+        """
+        comments = self._db['comments']
+        posts = self._db['posts']
+
+        oldest = list(comments.find({'post_id': post_id}).sort(
+            [(field, DESCENDING) for field, _ in COMMENTS_SORT]
+        ).skip(COMMENTS_PREVIEW - 1).limit(1))
+        if not oldest:
+            return
+
+        comment = dict(oldest[0], _id=str(oldest[0]['_id']))
+        # The slice drops it again if a new comment filled the preview
+        posts.update_one(
+            {'_id': post_id, 'comments._id': {'$ne': comment['_id']}},
+            {'$push': {'comments': {
+                '$each': [comment],
+                '$position': 0,
+                '$slice': -COMMENTS_PREVIEW
+            }}}
+        )
+
+    def get_post_comments(
+            self,
+            post_id: str,
+            limit: int = 0,
+            after: Optional[Tuple[datetime, ObjectId]] = None
+    ):
+        """ return the comment documents associated with a post document,
+        from the oldest to the most recent. A limit of 0 returns them all.
+        If `after` is a (date_posted, _id) pair, only the comments that
+        come after it are returned. """
         comments = self._db['comments']
         try:
-            post_comments = comments.find(
-                {
-                    'post_id': ObjectId(post_id)
-                }
+            query = {'post_id': ObjectId(post_id)}
 
-            ).sort('date_posted', 1)
+            if after is not None:
+                date_posted, comment_id = after
+                query['$or'] = [
+                    {'date_posted': {'$gt': date_posted}},
+                    {'date_posted': date_posted, '_id': {'$gt': comment_id}}
+                ]
+
+            post_comments = comments.find(
+                query
+            ).sort(COMMENTS_SORT).limit(limit)
             return list(map(serialize_ObjectId, post_comments))
         except Exception as e:
             return None
 
+    def get_posts_comments(
+            self,
+            post_ids: List[str],
+            limit: int
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """ Return the first `limit` comments of each post in `post_ids`,
+        from the oldest to the most recent, in a single aggregation.
+        Posts without comments are mapped to an empty list.
+
+        Each post looks its comments up through the post_comments_by_date
+        index and stops after `limit` of them, so only the returned
+        comments are read (the $lookup's pipeline needs MongoDB 5.0).
+        """
+        posts = self._db['posts']
+        found = posts.aggregate([
+            {'$match': {
+                '_id': {'$in': [ObjectId(p) for p in post_ids]}
+            }},
+            {'$project': {'_id': 1}},
+            {'$lookup': {
+                'from': 'comments',
+                'localField': '_id',
+                'foreignField': 'post_id',
+                'pipeline': [
+                    {'$sort': {'date_posted': 1, '_id': 1}},
+                    {'$limit': limit}
+                ],
+                'as': 'comments'
+            }}
+        ])
+
+        by_post = {str(post_id): [] for post_id in post_ids}
+        for post in found:
+            by_post[str(post['_id'])] = list(
+                map(serialize_ObjectId, post['comments'])
+            )
+
+        return by_post
+
     def delete_many_comments(
             self,
             post_id: str = None,
@@ -395,8 +923,231 @@ class DBStorage:
         except Exception as e:
             return False
 
+    def _id_batch(
+            self,
+            collection: str,
+            query: Dict[str, Any],
+            after: Optional[ObjectId],
+            batch_size: int,
+            projection: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """ Return the next `batch_size` documents matching `query` whose
+        _id comes after `after`, in _id order
+        """
+        if after is not None:
+            query = {**query, '_id': {'$gt': after}}
+
+        documents = self._db[collection].find(query, projection or {'_id': 1})
+
+        return list(documents.sort('_id', ASCENDING).limit(batch_size))
+
+    @staticmethod
+    def _id_range(
+            query: Dict[str, Any],
+            after: Optional[ObjectId],
+            last: ObjectId
+    ) -> Dict[str, Any]:
+        """ Restrict `query` to the _id range (after, last] """
+        ids: Dict[str, Any] = {'$lte': last}
+        if after is not None:
+            ids['$gt'] = after
+
+        return {**query, '_id': ids}
+
+    def _refresh_comments(self, post_ids: List[ObjectId]) -> None:
+        """ Recount the comments of posts and rebuild the preview of their
+        latest comments from the comments collection, in a single
+        aggregation
+        """
+        posts = self._db['posts']
+        if not post_ids:
+            return
+
+        found = posts.aggregate([
+            {'$match': {'_id': {'$in': post_ids}}},
+            {'$project': {'_id': 1}},
+            {'$lookup': {
+                'from': 'comments',
+                'localField': '_id',
+                'foreignField': 'post_id',
+                'pipeline': [
+                    {'$sort': {field: -1 for field, _ in COMMENTS_SORT}},
+                    {'$limit': COMMENTS_PREVIEW}
+                ],
+                'as': 'latest'
+            }},
+            {'$lookup': {
+                'from': 'comments',
+                'localField': '_id',
+                'foreignField': 'post_id',
+                'pipeline': [{'$count': 'count'}],
+                'as': 'count'
+            }}
+        ])
+
+        requests = [
+            UpdateOne(
+                {'_id': post['_id']},
+                {'$set': {
+                    'comments': [dict(c, _id=str(c['_id']))
+                                 for c in post['latest']][::-1],
+                    'number_of_comments': (
+                        post['count'][0]['count'] if post['count'] else 0
+                    )
+                }}
+            )
+            for post in found
+        ]
+
+        if requests:
+            posts.bulk_write(requests, ordered=False)
+
+    def rename_user_posts_batch(
+            self,
+            user_id: str,
+            username: str,
+            after: Optional[ObjectId] = None,
+            batch_size: int = 1000
+    ) -> List[ObjectId]:
+        """ Set `username` on the next batch of a user's posts.
+        Return the _ids of the batch, empty once they are all renamed.
+        """
+        query = {'user_id': user_id, 'username': {'$ne': username}}
+        batch = [p['_id'] for p in
+                 self._id_batch('posts', query, after, batch_size)]
+        if batch:
+            self._db['posts'].update_many(
+                self._id_range(query, after, batch[-1]),
+                {'$set': {'username': username}}
+            )
+
+        return batch
+
+    def rename_user_comments_batch(
+            self,
+            user_id: str,
+            username: str,
+            after: Optional[ObjectId] = None,
+            batch_size: int = 1000
+    ) -> List[ObjectId]:
+        """ Set `username` on the next batch of a user's comments, and on
+        their copies in the posts' previews.
+        Return the _ids of the batch, empty once they are all renamed.
+        """
+        query = {'user_id': ObjectId(user_id), 'username': {'$ne': username}}
+        batch = self._id_batch(
+            'comments', query, after, batch_size, {'post_id': 1}
+        )
+        if not batch:
+            return []
+
+        self._db['comments'].update_many(
+            self._id_range(query, after, batch[-1]['_id']),
+            {'$set': {'username': username}}
+        )
+
+        # A preview holds a few comments: rename one per pass
+        previews = {
+            '_id': {'$in': list({c['post_id'] for c in batch})},
+            'comments': {'$elemMatch': {
+                'user_id': ObjectId(user_id),
+                'username': {'$ne': username}
+            }}
+        }
+        for _ in range(COMMENTS_PREVIEW):
+            renamed = self._db['posts'].update_many(
+                previews,
+                {'$set': {'comments.$.username': username}}
+            )
+            if not renamed.modified_count:
+                break
+
+        return [c['_id'] for c in batch]
+
     # DELETE
 
+    def mark_user_deleted(self, user_id: str) -> bool:
+        """ Hide a user until the delete_user job deletes it.
+        Return whether the user exists.
+        """
+        users = self._db['users']
+        result = users.update_one(
+            {'_id': ObjectId(user_id)},
+            {'$set': {'deleted': True}}
+        )
+        self._user_changed(user_id)
+
+        return result.matched_count == 1
+
+    def delete_user_comments_batch(
+            self,
+            user_id: str,
+            after: Optional[ObjectId] = None,
+            batch_size: int = 1000
+    ) -> List[ObjectId]:
+        """ Delete the next batch of a user's comments, uncount them and
+        drop them from the posts' previews.
+        Return the _ids of the batch, empty once they are all deleted.
+        """
+        query = {'user_id': ObjectId(user_id)}
+        batch = self._id_batch(
+            'comments', query, after, batch_size, {'post_id': 1}
+        )
+        if not batch:
+            return []
+
+        self._db['comments'].delete_many(
+            self._id_range(query, after, batch[-1]['_id'])
+        )
+        self._refresh_comments(list({c['post_id'] for c in batch}))
+
+        return [c['_id'] for c in batch]
+
+    def delete_user_likes_batch(
+            self,
+            user_id: str,
+            after: Optional[ObjectId] = None,
+            batch_size: int = 1000
+    ) -> List[ObjectId]:
+        """ Delete the next batch of a user's likes and uncount them.
+        Return the _ids of the batch, empty once they are all deleted.
+        """
+        query = {'user_id': ObjectId(user_id)}
+        batch = self._id_batch(
+            'likes', query, after, batch_size, {'post_id': 1}
+        )
+        if not batch:
+            return []
+
+        self._db['likes'].delete_many(
+            self._id_range(query, after, batch[-1]['_id'])
+        )
+        self._recount_likes(list({like['post_id'] for like in batch}))
+
+        return [like['_id'] for like in batch]
+
+    def delete_user_posts_batch(
+            self,
+            user_id: str,
+            after: Optional[ObjectId] = None,
+            batch_size: int = 1000
+    ) -> List[ObjectId]:
+        """ Delete the next batch of a user's posts, with their comments
+        and likes.
+        Return the _ids of the batch, empty once they are all deleted.
+        """
+        query = {'user_id': user_id}
+        batch = [p['_id'] for p in
+                 self._id_batch('posts', query, after, batch_size)]
+        if not batch:
+            return []
+
+        self._db['comments'].delete_many({'post_id': {'$in': batch}})
+        self._db['likes'].delete_many({'post_id': {'$in': batch}})
+        self._db['posts'].delete_many(self._id_range(query, after, batch[-1]))
+
+        return batch
+
     def delete_post(self, post_id: str, user_id: str) -> bool:
         """ delete a post document from db """
         posts = self._db['posts']
@@ -406,46 +1157,44 @@ class DBStorage:
             if not deleted:
                 return False
 
-            posts.delete_one({
+            result = posts.delete_one({
                 '_id': ObjectId(post_id),
                 'user_id': user_id
             })
-            return True
-        except Exception as e:
-            return False
 
-    def delete_user(self, user_id: str) -> bool:
-        """ delete a user from db """
-
-        # First, delete all the user's posts
-
-        posts = self._db['posts']
-
-        try:
-            # Remove all of the user's comments
-            deleted = self.delete_many_comments(user_id=user_id)
-
-            if not deleted:
-                return False
-            posts.delete_many({
-                'user_id': user_id
-            })
+            # Remove the post's likes
+            if result.deleted_count:
+                self._db['likes'].delete_many({'post_id': ObjectId(post_id)})
 
+            return True
         except Exception as e:
             return False
 
-        # Then, delete the user himself
-
-        users = self._db['users']
-
+    def delete_user(self, user_id: str, batch_size: int = 1000) -> bool:
+        """ delete a user from db, with the user's comments, likes and
+        posts, by batches. The delete_user job does it in the background.
+        """
         try:
-            users.delete_one({
-                '_id': ObjectId(user_id)
-            })
+            for delete_batch in (
+                    self.delete_user_comments_batch,
+                    self.delete_user_likes_batch,
+                    self.delete_user_posts_batch
+            ):
+                after = None
+                while True:
+                    batch = delete_batch(user_id, after, batch_size)
+                    if not batch:
+                        break
+                    after = batch[-1]
+
+            # Then, delete the user himself
+            self._db['users'].delete_one({'_id': ObjectId(user_id)})
 
         except Exception as e:
             return False
 
+        self._user_changed(user_id)
+
         return True
 
     def clear_db(self):
@@ -455,3 +1204,5 @@ class DBStorage:
         self._db.drop_collection('users')
         self._db.drop_collection('posts')
         self._db.drop_collection('comments')
+        self._db.drop_collection('likes')
+        self.ensure_indexes()
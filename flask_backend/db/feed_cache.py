@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Module for caching the rendered feed's pages in Redis.
+"""
+from redis import Redis
+from typing import Callable
+import time
+
+
+class FeedCache:
+    """ Cache the rendered feed's pages as JSON bytes, under a global
+    version that is bumped whenever the public content changes.
+    """
+
+    VERSION_KEY = 'feed:version'
+
+    def __init__(self, client: Redis) -> None:
+        """ Constructor """
+        self._redis = client
+
+    def version(self) -> int:
+        """ Return the current version of the feed """
+        version = self._redis.get(self.VERSION_KEY)
+        return int(version) if version else 0
+
+    def bump(self) -> None:
+        """ Invalidate every cached page """
+        self._redis.incr(self.VERSION_KEY)
+
+    def get_or_build(
+            self,
+            page_key: str,
+            build: Callable[[], bytes],
+            ttl: int = 60,
+            stale_ttl: int = 3600,
+            lock_ttl: int = 5,
+            wait: float = 2.0
+    ) -> bytes:
+        """ Return the cached page, building it if missing.
+
+        Only one worker builds a missing page at a time: the others serve
+        its last rendered copy if any, or wait for the build to finish.
+        """
+        key = f'feed:page:{self.version()}:{page_key}'
+        stale_key = f'feed:page:stale:{page_key}'
+
+        page = self._redis.get(key)
+        if page is not None:
+            return page
+
+        lock_key = key + ':lock'
+        if self._redis.set(lock_key, 1, nx=True, ex=lock_ttl):
+            try:
+                page = build()
+                pipe = self._redis.pipeline()
+                pipe.setex(key, ttl, page)
+                pipe.setex(stale_key, stale_ttl, page)
+                pipe.execute()
+            finally:
+                self._redis.delete(lock_key)
+
+            return page
+
+        # Another worker is building the page
+        page = self._redis.get(stale_key)
+        if page is not None:
+            return page
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            page = self._redis.get(key)
+            if page is not None:
+                return page
+
+        # The build is taking too long, do it ourselves
+        return build()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Module declaring the indexes of SWE_journal's collections in MongoDB.
+"""
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from typing import Dict, List
+
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='unique_email', unique=True),
+        IndexModel(
+            [('username', ASCENDING)],
+            name='unique_username',
+            unique=True
+        ),
+    ],
+    'posts': [
+        # A user's posts, from the most to the less recent
+        IndexModel(
+            [('user_id', ASCENDING), ('datePosted', DESCENDING)],
+            name='user_posts'
+        ),
+        # The public feed, from the most to the less recent
+        IndexModel(
+            [
+                ('is_public', ASCENDING),
+                ('datePosted', DESCENDING),
+                ('_id', DESCENDING)
+            ],
+            name='public_feed'
+        ),
+    ],
+    'likes': [
+        # A user likes a post once
+        IndexModel(
+            [('post_id', ASCENDING), ('user_id', ASCENDING)],
+            name='unique_like',
+            unique=True
+        ),
+        # The posts liked by a user
+        IndexModel(
+            [('user_id', ASCENDING), ('post_id', ASCENDING)],
+            name='user_likes'
+        ),
+    ],
+    'comments': [
+        # A post's comments, from the oldest to the most recent
+        IndexModel(
+            [
+                ('post_id', ASCENDING),
+                ('date_posted', ASCENDING),
+                ('_id', ASCENDING)
+            ],
+            name='post_comments_by_date'
+        ),
+        IndexModel([('user_id', ASCENDING)], name='user_comments'),
+    ],
+}
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Module for the background jobs queued in Redis.
+"""
+from redis import Redis
+from typing import Any, Callable, Dict, Optional
+import json
+import time
+import traceback
+import uuid
+
+
+# Move the delayed jobs that are due to the queue.
+#   KEYS: delayed jobs, queue
+#   ARGV: now
+PROMOTE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, job_id in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job_id)
+    redis.call('LPUSH', KEYS[2], job_id)
+end
+return #due
+"""
+
+
+class Job:
+    """ A job run by a worker, which records its progress as it goes so
+    that a retry resumes where it stopped.
+    """
+
+    def __init__(self, queue: 'JobQueue', job_id: str,
+                 fields: Dict[str, str]) -> None:
+        """ Constructor """
+        self._queue = queue
+        self.id = job_id
+        self.name = fields['name']
+        self.args: Dict[str, Any] = json.loads(fields['args'])
+        self.checkpoint: Optional[str] = fields.get('checkpoint') or None
+        self.done = int(fields.get('done', 0))
+
+    def progress(self, checkpoint: str, count: int) -> None:
+        """ Record that `count` more items were processed, up to
+        `checkpoint`
+        """
+        self.checkpoint = checkpoint
+        self.done += count
+        self._queue._update(
+            self.id, checkpoint=checkpoint, done=self.done
+        )
+
+
+class JobQueue:
+    """ Queue jobs in a Redis list, run by `flask worker`.
+
+    A worker moves the job it runs to its own processing list, so a job
+    left there by a crashed worker is queued again when it restarts. A
+    failed job is retried after `retry_delay` seconds, doubled after each
+    attempt, until it failed `max_attempts` times. The jobs' states are
+    kept `result_ttl` seconds after they end.
+    """
+
+    QUEUE_KEY = 'jobs:queue'
+    DELAYED_KEY = 'jobs:delayed'
+
+    def __init__(
+            self,
+            client: Redis,
+            max_attempts: int = 3,
+            retry_delay: float = 5.0,
+            result_ttl: int = 86400
+    ) -> None:
+        """ Constructor """
+        self._redis = client
+        self._promote = client.register_script(PROMOTE_SCRIPT)
+        self.configure(max_attempts, retry_delay, result_ttl)
+
+    def configure(self, max_attempts: int, retry_delay: float,
+                  result_ttl: int) -> None:
+        """ Set the attempts of a job, the delay before its first retry
+        and how long its state is kept once it ended, in seconds
+        """
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+        self._result_ttl = result_ttl
+
+    @staticmethod
+    def key(job_id: str) -> str:
+        """ Return the Redis key of a job's state """
+        return f'job:{job_id}'
+
+    @staticmethod
+    def processing_key(worker: str) -> str:
+        """ Return the Redis key of the jobs run by a worker """
+        return f'jobs:processing:{worker}'
+
+    def enqueue(self, name: str, owner: Optional[str] = None,
+                **args: Any) -> str:
+        """ Queue a job running the task `name` with `args`, whose state
+        can only be read by `owner` if given.
+        Return the job's id.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+
+        pipe = self._redis.pipeline()
+        pipe.hset(self.key(job_id), mapping={
+            'name': name,
+            'owner': owner or '',
+            'args': json.dumps(args),
+            'status': 'queued',
+            'attempts': 0,
+            'done': 0,
+            'created_at': now,
+            'updated_at': now
+        })
+        pipe.lpush(self.QUEUE_KEY, job_id)
+        pipe.execute()
+
+        return job_id
+
+    def status(self, job_id: str,
+               owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """ Return the state of a job without its arguments, None if it
+        doesn't exist or, if `owner` is given, belongs to someone else
+        """
+        fields = self._redis.hgetall(self.key(job_id))
+        if not fields:
+            return None
+
+        fields = {k.decode('utf-8'): v.decode('utf-8')
+                  for k, v in fields.items()}
+        if owner is not None and fields.get('owner') != owner:
+            return None
+
+        return {
+            'id': job_id,
+            'name': fields['name'],
+            'status': fields['status'],
+            'attempts': int(fields['attempts']),
+            'done': int(fields['done']),
+            'error': fields.get('error'),
+            'created_at': float(fields['created_at']),
+            'updated_at': float(fields['updated_at'])
+        }
+
+    def work(
+            self,
+            tasks: Dict[str, Callable[[Job], None]],
+            worker: str = 'worker',
+            burst: bool = False,
+            timeout: int = 1
+    ) -> int:
+        """ Run the queued jobs with the tasks of their names, waiting
+        for new ones unless `burst`, where it stops once the queue and the
+        due retries are empty.
+        Return the number of jobs run.
+        """
+        processing = self.processing_key(worker)
+
+        # Queue again the jobs this worker was running when it stopped
+        while self._redis.lmove(processing, self.QUEUE_KEY, 'LEFT', 'RIGHT'):
+            pass
+
+        count = 0
+        while True:
+            self._promote(keys=[self.DELAYED_KEY, self.QUEUE_KEY],
+                          args=[time.time()])
+
+            if burst:
+                job_id = self._redis.lmove(
+                    self.QUEUE_KEY, processing, 'RIGHT', 'LEFT'
+                )
+                if job_id is None:
+                    return count
+            else:
+                job_id = self._redis.blmove(
+                    self.QUEUE_KEY, processing, timeout, 'RIGHT', 'LEFT'
+                )
+                if job_id is None:
+                    continue
+
+            self._run(job_id.decode('utf-8'), tasks)
+            self._redis.lrem(processing, 1, job_id)
+            count += 1
+
+    def _run(self, job_id: str, tasks: Dict[str, Callable[[Job], None]]):
+        """ Run a job, then retry it later if it failed """
+        fields = self._redis.hgetall(self.key(job_id))
+        if not fields:
+            # Expired
+            return
+
+        job = Job(self, job_id, {k.decode('utf-8'): v.decode('utf-8')
+                                 for k, v in fields.items()})
+        attempts = self._redis.hincrby(self.key(job_id), 'attempts', 1)
+        self._update(job_id, status='running')
+
+        try:
+            tasks[job.name](job)
+
+        except Exception:
+            error = traceback.format_exc(limit=3)
+            if attempts < self._max_attempts:
+                self._update(job_id, status='retrying', error=error)
+                delay = self._retry_delay * 2 ** (attempts - 1)
+                self._redis.zadd(self.DELAYED_KEY,
+                                 {job_id: time.time() + delay})
+            else:
+                self._update(job_id, status='failed', error=error)
+                self._redis.expire(self.key(job_id), self._result_ttl)
+            return
+
+        self._update(job_id, status='done')
+        self._redis.expire(self.key(job_id), self._result_ttl)
+
+    def _update(self, job_id: str, **fields: Any) -> None:
+        """ Update a job's state """
+        fields['updated_at'] = time.time()
+        self._redis.hset(self.key(job_id), mapping=fields)
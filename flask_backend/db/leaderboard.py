@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Module for the streak leaderboards stored as Redis sorted sets.
+"""
+from redis import Redis
+from typing import Dict, List, Optional, Tuple
+
+
+# Put a user's current streak on the board until it expires, and raise
+# their longest streak if it is beaten, on Redis' clock.
+#   KEYS: current board, longest board, expiry of the current streaks
+#   ARGV: user id, current streak, seconds before it expires
+RECORD_SCRIPT = """
+local now = tonumber(redis.call('TIME')[1])
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[2], 'GT', ARGV[2], ARGV[1])
+redis.call('ZADD', KEYS[3], now + tonumber(ARGV[3]), ARGV[1])
+"""
+
+# Drop up to a limit of the current streaks that expired, so that Redis
+# isn't blocked when many expire at once. Return the number dropped.
+#   KEYS: current board, expiry of the current streaks
+#   ARGV: maximum number of streaks to drop, a few thousand at most to
+#         stay under Lua's limit of arguments
+PRUNE_SCRIPT = """
+local now = redis.call('TIME')[1]
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now,
+                           'LIMIT', 0, ARGV[1])
+if #expired > 0 then
+    redis.call('ZREM', KEYS[1], unpack(expired))
+    redis.call('ZREM', KEYS[2], unpack(expired))
+end
+return #expired
+"""
+
+
+class Leaderboard:
+    """ Rank the users by current and longest streak.
+
+    Current streaks also have their expiry time in a third sorted set,
+    and the expired ones are dropped lazily before each read.
+    """
+
+    BOARDS = ('current', 'longest')
+    EXPIRY_KEY = 'leaderboard:current:expiry'
+
+    def __init__(self, client: Redis) -> None:
+        """ Constructor """
+        self._redis = client
+        self._record = client.register_script(RECORD_SCRIPT)
+        self._prune = client.register_script(PRUNE_SCRIPT)
+
+    @staticmethod
+    def key(board: str) -> str:
+        """ Return the Redis key of a board """
+        return f'leaderboard:{board}'
+
+    def record(self, user_id: str, streak: int, ttl: int,
+               pipe=None) -> None:
+        """ Set a user's current streak, which lasts `ttl` seconds,
+        in a pipeline if given
+        """
+        self._record(
+            keys=[self.key('current'), self.key('longest'), self.EXPIRY_KEY],
+            args=[user_id, streak, ttl],
+            client=pipe
+        )
+
+    def prune(self, batch_size: int = 1000) -> int:
+        """ Drop the expired current streaks by batches, one script each.
+        Return how many were.
+        """
+        count = 0
+        while True:
+            dropped = self._prune(
+                keys=[self.key('current'), self.EXPIRY_KEY],
+                args=[batch_size]
+            )
+            count += dropped
+            if dropped < batch_size:
+                return count
+
+    def top(self, board: str, count: int) -> List[Tuple[str, int]]:
+        """ Return the `count` best (user_id, streak) of a board """
+        if board == 'current':
+            self.prune()
+
+        entries = self._redis.zrevrange(
+            self.key(board), 0, count - 1, withscores=True
+        )
+
+        return [(user_id.decode('utf-8'), int(streak))
+                for user_id, streak in entries]
+
+    def rank(self, user_id: str) -> Dict[str, Optional[Dict[str, int]]]:
+        """ Return a user's 1-based rank and streak on each board,
+        None for the boards the user is not on.
+        """
+        self.prune()
+
+        pipe = self._redis.pipeline(transaction=False)
+        for board in self.BOARDS:
+            pipe.zrevrank(self.key(board), user_id)
+            pipe.zscore(self.key(board), user_id)
+        results = pipe.execute()
+
+        ranks = {}
+        for board, rank, streak in zip(
+                self.BOARDS, results[::2], results[1::2]):
+            if rank is None:
+                ranks[board] = None
+            else:
+                ranks[board] = {'rank': rank + 1, 'streak': int(streak)}
+
+        return ranks
+
+    def remove(self, user_id: str) -> None:
+        """ Take a user off the boards """
+        pipe = self._redis.pipeline()
+        for board in self.BOARDS:
+            pipe.zrem(self.key(board), user_id)
+        pipe.zrem(self.EXPIRY_KEY, user_id)
+        pipe.execute()
+
+    def rebuild(self, storage, batch_size: int = 1000) -> int:
+        """ Raise the longest streaks of the board to the users' ones in
+        the db. Return the number of users read.
+        """
+        count = 0
+        pipe = self._redis.pipeline(transaction=False)
+        for user in storage.iter_longest_streaks(batch_size=batch_size):
+            pipe.zadd(
+                self.key('longest'),
+                {user['_id']: user['longest_streak']},
+                gt=True
+            )
+            count += 1
+            if count % batch_size == 0:
+                pipe.execute()
+
+        pipe.execute()
+
+        return count
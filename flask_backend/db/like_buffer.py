@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Module for buffering likes in Redis before writing them to MongoDB.
+"""
+from db.feed_cache import FeedCache
+from redis import Redis
+from typing import Dict, List, Tuple
+
+
+# Record the new like state of a user on a post, if it changes, and move
+# the post's pending likes delta accordingly. Return 1 if the state changed.
+# A state back to the flushing or db one is dropped, so that each pending
+# state counts for +1 (like) or -1 (unlike) in its post's delta.
+#   KEYS: pending ops, pending deltas, flushing ops
+#   ARGV: '<post_id>:<user_id>', post_id, wanted state, state in the db
+RECORD_SCRIPT = """
+local base = redis.call('HGET', KEYS[3], ARGV[1])
+if not base then
+    base = ARGV[4]
+end
+local state = redis.call('HGET', KEYS[1], ARGV[1])
+if not state then
+    state = base
+end
+
+if state == ARGV[3] then
+    return 0
+end
+
+if ARGV[3] == base then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+else
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+end
+if ARGV[3] == '1' then
+    redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+else
+    redis.call('HINCRBY', KEYS[2], ARGV[2], -1)
+end
+return 1
+"""
+
+# Move the pending ops and deltas aside to be flushed, unless a previous
+# flush was interrupted. Return 1 if there is something to flush.
+#   KEYS: pending ops, pending deltas, flushing ops, flushing deltas
+SWAP_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 1
+end
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+
+redis.call('RENAME', KEYS[1], KEYS[3])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('RENAME', KEYS[2], KEYS[4])
+end
+return 1
+"""
+
+# Drop the flushed states written to the db, and their share of their
+# posts' flushing deltas, so that these are not counted twice.
+#   KEYS: flushing ops, flushing deltas
+#   ARGV: '<post_id>:<user_id>' fields
+APPLIED_SCRIPT = """
+for _, field in ipairs(ARGV) do
+    local state = redis.call('HGET', KEYS[1], field)
+    if state then
+        redis.call('HDEL', KEYS[1], field)
+
+        local post_id = string.match(field, '^([^:]+):')
+        local step = -1
+        if state == '0' then
+            step = 1
+        end
+        if redis.call('HINCRBY', KEYS[2], post_id, step) == 0 then
+            redis.call('HDEL', KEYS[2], post_id)
+        end
+    end
+end
+"""
+
+
+class LikeBuffer:
+    """ Record likes and unlikes in Redis, where they are counted right
+    away, and write them to MongoDB by batches.
+
+    A flush first moves the pending changes aside, then by batches
+    applies them to the db as idempotent upserts and deletes, recounts
+    the likes of the touched posts from the likes collection, and drops
+    them with their share of the deltas. A flush
+    interrupted at any point is resumed by the next one, and the
+    counters converge to the number of likes in the db. The cached feed's
+    pages are invalidated once the changes are written.
+    """
+
+    OPS_KEY = 'likes:pending'
+    DELTA_KEY = 'likes:pending:delta'
+    FLUSHING_OPS_KEY = 'likes:flushing'
+    FLUSHING_DELTA_KEY = 'likes:flushing:delta'
+
+    def __init__(self, client: Redis, storage,
+                 feed_cache: FeedCache) -> None:
+        """ Constructor """
+        self._redis = client
+        self._storage = storage
+        self._feed_cache = feed_cache
+        self._record = client.register_script(RECORD_SCRIPT)
+        self._swap = client.register_script(SWAP_SCRIPT)
+        self._applied = client.register_script(APPLIED_SCRIPT)
+
+    def _set_state(self, user_id: str, post_id: str, liked: bool) -> int:
+        """Set whether a user likes a post
+
+        Return 0 if successfully set, otherwise:
+            * -1: post not found
+            * -2: the user already had this state
+        """
+        if not self._storage.post_exists(post_id):
+            return -1
+
+        in_db = self._storage.is_liked(user_id, post_id)
+        changed = self._record(
+            keys=[self.OPS_KEY, self.DELTA_KEY, self.FLUSHING_OPS_KEY],
+            args=[
+                f'{post_id}:{user_id}',
+                str(post_id),
+                '1' if liked else '0',
+                '1' if in_db else '0'
+            ]
+        )
+
+        return 0 if changed else -2
+
+    def like(self, user_id: str, post_id: str) -> int:
+        """Record a user's like of a post, with the codes of like_post
+        """
+        return self._set_state(user_id, post_id, True)
+
+    def unlike(self, user_id: str, post_id: str) -> int:
+        """Record a user's unlike of a post, with the codes of unlike_post
+        """
+        return self._set_state(user_id, post_id, False)
+
+    def pending_deltas(self, post_ids: List[str]) -> Dict[str, int]:
+        """ Return the likes counts not flushed yet of the posts """
+        if not post_ids:
+            return {}
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hmget(self.DELTA_KEY, post_ids)
+        pipe.hmget(self.FLUSHING_DELTA_KEY, post_ids)
+        pending, flushing = pipe.execute()
+
+        return {
+            post_id: int(p or 0) + int(f or 0)
+            for post_id, p, f in zip(post_ids, pending, flushing)
+            if p or f
+        }
+
+    def pending_likes(
+            self,
+            user_id: str,
+            post_ids: List[str]
+    ) -> Dict[str, bool]:
+        """ Return the like states of a user not flushed yet on the posts """
+        if not post_ids:
+            return {}
+
+        fields = [f'{post_id}:{user_id}' for post_id in post_ids]
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hmget(self.OPS_KEY, fields)
+        pipe.hmget(self.FLUSHING_OPS_KEY, fields)
+        pending, flushing = pipe.execute()
+
+        states = {}
+        for post_id, p, f in zip(post_ids, pending, flushing):
+            state = p if p is not None else f
+            if state is not None:
+                states[post_id] = state == b'1'
+
+        return states
+
+    def _apply(self, batch: List[Tuple[str, str, bool]]) -> int:
+        """ Write a batch of flushing states to the db, then drop them.
+        Return the number of states written.
+        """
+        self._storage.apply_likes(batch)
+        self._applied(
+            keys=[self.FLUSHING_OPS_KEY, self.FLUSHING_DELTA_KEY],
+            args=[f'{post_id}:{user_id}' for post_id, user_id, _ in batch]
+        )
+
+        return len(batch)
+
+    def flush(self, batch_size: int = 1000) -> int:
+        """ Write the pending likes and unlikes to the db.
+        Return the number of changes written.
+        """
+        if not self._swap(keys=[
+            self.OPS_KEY,
+            self.DELTA_KEY,
+            self.FLUSHING_OPS_KEY,
+            self.FLUSHING_DELTA_KEY
+        ]):
+            return 0
+
+        count = 0
+        batch: List[Tuple[str, str, bool]] = []
+        for field, state in self._redis.hscan_iter(
+                self.FLUSHING_OPS_KEY,
+                count=batch_size
+        ):
+            post_id, user_id = field.decode('utf-8').split(':')
+            batch.append((post_id, user_id, state == b'1'))
+
+            if len(batch) == batch_size:
+                count += self._apply(batch)
+                batch = []
+
+        if batch:
+            count += self._apply(batch)
+
+        if count:
+            self._feed_cache.bump()
+        self._redis.delete(self.FLUSHING_OPS_KEY, self.FLUSHING_DELTA_KEY)
+
+        return count
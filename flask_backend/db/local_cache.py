@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Module for the caches kept in each worker's memory, invalidated through
+Redis pub/sub.
+"""
+from collections import OrderedDict
+from redis import Redis
+from redis.exceptions import RedisError
+from threading import Lock, Thread
+from typing import Any, Iterable, Optional, Tuple
+import os
+import time
+
+
+class LocalCache:
+    """ Bounded LRU of entries living `ttl` seconds in a worker's memory.
+
+    Invalidations are published on CHANNEL: every worker listens to it
+    and drops the invalidated keys right away. The cache is bypassed while
+    the worker is not subscribed, so an invalidation is never missed.
+    """
+
+    CHANNEL = ''
+
+    def __init__(
+            self,
+            client: Redis,
+            ttl: float = 5.0,
+            max_size: int = 10000
+    ) -> None:
+        """ Constructor """
+        self._redis = client
+        self._ttl = ttl
+        self._max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        # Incremented by each invalidation, to not cache a value read
+        # while it was being invalidated
+        self._generation = 0
+        self._pid = None
+        self._listener = None
+
+    def configure(self, ttl: float, max_size: int) -> None:
+        """ Set the lifetime of the entries, in seconds, and the maximum
+        number of entries. A ttl of 0 disables the cache.
+        """
+        with self._lock:
+            self._ttl = ttl
+            self._max_size = max_size
+            self._entries.clear()
+
+    def clear(self) -> None:
+        """ Drop every entry from this worker's cache """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _enabled(self) -> bool:
+        """ Check that the cache can be used """
+        return self._ttl > 0 and self._listening()
+
+    def _lookup(self, key: str) -> Tuple[Optional[Any], int]:
+        """ Return the cached value of a key, None if it isn't cached,
+        and the generation to store a fresh value with.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return value, self._generation
+                del self._entries[key]
+
+            return None, self._generation
+
+    def _store(self, key: str, value: Any, generation: int) -> None:
+        """ Cache a value unless the cache was invalidated since
+        `generation`
+        """
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic() + self._ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+
+    def _invalidate(self, keys: Iterable[str]) -> None:
+        """ Drop keys from the cache of every worker """
+        keys = list(keys)
+        self._evict(keys)
+        if keys:
+            self._redis.publish(self.CHANNEL, ' '.join(keys))
+
+    def _evict(self, keys: Iterable[str]) -> None:
+        """ Drop keys from this worker's cache """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _listening(self) -> bool:
+        """ Check that this worker listens to the invalidations,
+        subscribing in a background thread if it doesn't yet.
+        """
+        if self._pid != os.getpid():
+            # First use, or a worker forked with the parent's cache
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._entries.clear()
+                    self._listener = None
+
+        if self._listener is None or not self._listener.is_alive():
+            with self._lock:
+                if self._listener is None or not self._listener.is_alive():
+                    self._entries.clear()
+                    pubsub = self._redis.pubsub()
+                    try:
+                        # Wait for the subscription to be confirmed
+                        pubsub.subscribe(self.CHANNEL)
+                        confirmed = pubsub.get_message(timeout=1.0)
+                    except RedisError:
+                        confirmed = None
+                    if confirmed is None:
+                        pubsub.close()
+                        return False
+
+                    self._listener = Thread(
+                        target=self._listen,
+                        args=(pubsub,),
+                        daemon=True
+                    )
+                    self._listener.start()
+
+        return True
+
+    def _listen(self, pubsub) -> None:
+        """ Evict the keys published on CHANNEL until the connection is
+        lost, then empty the cache.
+        """
+        try:
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    self._evict(message['data'].decode('utf-8').split())
+        except RedisError:
+            pass
+        finally:
+            self.clear()
+            pubsub.close()
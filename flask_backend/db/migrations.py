@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Module registering the versioned migrations of SWE_journal's MongoDB.
+
+Each migration is a function taking the database, registered in order
+with the `migration` decorator, and run once by `DBStorage.migrate`.
+"""
+from bson import ObjectId
+from datetime import datetime
+from db.indexes import INDEXES
+from pymongo.database import Database
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from typing import Any, Callable, Dict, List, NamedTuple
+
+
+class Migration(NamedTuple):
+    """ A versioned migration """
+    version: int
+    description: str
+    apply: Callable[[Database], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+class DuplicateUsersError(Exception):
+    """ Raised when users share an email or username, so the unique
+    indexes can't be built until they are deduplicated
+    """
+
+    def __init__(self, duplicates: Dict[str, List[Dict[str, Any]]]) -> None:
+        """ Constructor """
+        lines = [
+            f'{field} {d["_id"]!r}: users {", ".join(map(str, d["ids"]))}'
+            for field, found in duplicates.items()
+            for d in found
+        ]
+        super().__init__('Users share an email or username:\n'
+                         + '\n'.join(lines))
+        self.duplicates = duplicates
+
+
+def migration(version: int, description: str):
+    """ Register a migration, versions must be registered in order """
+
+    def register(func: Callable[[Database], None]):
+        if MIGRATIONS and MIGRATIONS[-1].version >= version:
+            raise ValueError(f'migration {version} registered out of order')
+
+        MIGRATIONS.append(Migration(version, description, func))
+        return func
+
+    return register
+
+
+def ensure_db_indexes(database: Database) -> None:
+    """ Create the declared indexes that don't exist yet """
+    for collection, indexes in INDEXES.items():
+        database[collection].create_indexes(indexes)
+
+
+def find_duplicate_users(
+        database: Database
+) -> Dict[str, List[Dict[str, Any]]]:
+    """ Return the emails and usernames shared by several users, with the
+    ids of these users, by field
+    """
+    duplicates = {}
+    for field in ('email', 'username'):
+        found = list(database['users'].aggregate([
+            {'$group': {
+                '_id': f'${field}',
+                'ids': {'$push': '$_id'},
+                'count': {'$sum': 1}
+            }},
+            {'$match': {'count': {'$gt': 1}}},
+            {'$sort': {'_id': 1}}
+        ]))
+        if found:
+            duplicates[field] = found
+
+    return duplicates
+
+
+@migration(1, 'Create the initial indexes')
+def create_initial_indexes(database: Database) -> None:
+    """ Build the indexes of the users, posts and comments, after checking
+    that no users share an email or username
+    """
+    duplicates = find_duplicate_users(database)
+    if duplicates:
+        raise DuplicateUsersError(duplicates)
+
+    ensure_db_indexes(database)
+
+
+@migration(2, 'Store the likers\' ids in the posts\' likes arrays')
+def store_likers_ids(database: Database) -> None:
+    """ Replace the usernames in each post's likes array by the ids of
+    these users, drop the likes of the users that no longer exist, and
+    recount number_of_likes.
+    """
+    posts = database['posts']
+    users = database['users']
+
+    liked_posts = posts.find(
+        {'likes': {'$exists': True, '$ne': []}},
+        {'likes': 1},
+        batch_size=500
+    )
+    for post in liked_posts:
+        likes = post['likes']
+        # Ids already stored by an interrupted run are kept
+        ids = [ObjectId(like) for like in likes if ObjectId.is_valid(like)]
+        likers = users.find(
+            {'$or': [{'username': {'$in': likes}}, {'_id': {'$in': ids}}]},
+            {'_id': 1}
+        )
+        liker_ids = sorted({str(user['_id']) for user in likers})
+
+        posts.update_one(
+            {'_id': post['_id']},
+            {'$set': {
+                'likes': liker_ids,
+                'number_of_likes': len(liker_ids)
+            }}
+        )
+
+
+@migration(3, 'Move the likes from the posts to a likes collection')
+def move_likes_to_collection(database: Database) -> None:
+    """ Turn the ids in each post's likes array into likes documents,
+    recount number_of_likes and drop the array.
+    """
+    ensure_db_indexes(database)
+
+    posts = database['posts']
+    users = database['users']
+    likes = database['likes']
+
+    liked_posts = posts.find(
+        {'likes': {'$exists': True}},
+        {'likes': 1},
+        batch_size=500
+    )
+    for post in liked_posts:
+        ids = [ObjectId(like) for like in post['likes']
+               if ObjectId.is_valid(like)]
+        likers = users.find({'_id': {'$in': ids}}, {'_id': 1})
+        documents = [
+            {
+                'post_id': post['_id'],
+                'user_id': user['_id'],
+                'date_liked': datetime.utcnow()
+            }
+            for user in likers
+        ]
+
+        if documents:
+            try:
+                likes.insert_many(documents, ordered=False)
+            except BulkWriteError:
+                # Likes already moved by an interrupted run
+                pass
+
+        posts.update_one(
+            {'_id': post['_id']},
+            {
+                '$set': {
+                    'number_of_likes': likes.count_documents(
+                        {'post_id': post['_id']}
+                    )
+                },
+                '$unset': {'likes': ''}
+            }
+        )
+
+
+@migration(4, 'Keep only a preview of the latest comments in the posts')
+def trim_embedded_comments(database: Database) -> None:
+    """ Recount number_of_comments from the comments collection and cut
+    the embedded comments down to the latest ones.
+    """
+    from db.db_manager import COMMENTS_PREVIEW
+
+    posts = database['posts']
+    comments = database['comments']
+
+    commented_posts = posts.find(
+        {'comments': {'$exists': True}},
+        {'_id': 1},
+        batch_size=500
+    )
+    for post in commented_posts:
+        posts.update_one(
+            {'_id': post['_id']},
+            {
+                '$set': {
+                    'number_of_comments': comments.count_documents(
+                        {'post_id': post['_id']}
+                    )
+                },
+                '$push': {
+                    'comments': {'$each': [], '$slice': -COMMENTS_PREVIEW}
+                }
+            }
+        )
+
+
+# Format of the comments' dates before they were stored as datetimes
+COMMENT_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+
+@migration(5, 'Store the comments\' dates as datetimes')
+def convert_comment_dates(database: Database) -> None:
+    """ Parse the RFC-1123 date_posted strings of the comments, and of the
+    posts' embedded comments, into datetimes, and replace the
+    post_comments index with post_comments_by_date.
+    """
+    comments = database['comments']
+    posts = database['posts']
+
+    try:
+        comments.drop_index('post_comments')
+    except OperationFailure:
+        # Index already dropped, or never created
+        pass
+    ensure_db_indexes(database)
+
+    requests = []
+    string_dates = comments.find(
+        {'date_posted': {'$type': 'string'}},
+        {'date_posted': 1},
+        batch_size=1000
+    )
+    for comment in string_dates:
+        requests.append(UpdateOne(
+            {'_id': comment['_id']},
+            {'$set': {
+                'date_posted': datetime.strptime(
+                    comment['date_posted'], COMMENT_DATE_FORMAT
+                )
+            }}
+        ))
+        if len(requests) == 1000:
+            comments.bulk_write(requests, ordered=False)
+            requests = []
+
+    if requests:
+        comments.bulk_write(requests, ordered=False)
+
+    commented_posts = posts.find(
+        {'comments.date_posted': {'$type': 'string'}},
+        {'comments': 1},
+        batch_size=500
+    )
+    for post in commented_posts:
+        for comment in post['comments']:
+            if isinstance(comment.get('date_posted'), str):
+                comment['date_posted'] = datetime.strptime(
+                    comment['date_posted'], COMMENT_DATE_FORMAT
+                )
+        posts.update_one(
+            {'_id': post['_id']},
+            {'$set': {'comments': post['comments']}}
+        )
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Module for rate limiting clients with token buckets stored in Redis.
+"""
+from redis import Redis
+from typing import Sequence, Union
+
+
+# Take a token from each bucket, refilled continuously, on Redis' clock,
+# or none if one of them is empty. Return 0 if the tokens were taken,
+# otherwise the milliseconds to wait for the next one in every bucket.
+#   KEYS: buckets
+#   ARGV: capacity, tokens refilled per millisecond
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1])
+    local ts = tonumber(bucket[2])
+    if not tokens then
+        tokens = capacity
+        ts = now
+    end
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    if tokens < 1 then
+        wait = math.max(wait, math.ceil((1 - tokens) / rate))
+    end
+    levels[i] = tokens
+end
+
+for i, key in ipairs(KEYS) do
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate))
+end
+return wait
+"""
+
+
+class RateLimiter:
+    """ Allow `limit` requests per `period` seconds to each client, in
+    bursts of up to `limit` requests, checked atomically in Redis.
+
+    A request can count for several clients, such as a user and its IP
+    address: it is allowed only if each of them has a request left.
+    """
+
+    KEY_PREFIX = 'ratelimit'
+
+    def __init__(self, client: Redis) -> None:
+        """ Constructor """
+        self._redis = client
+        self._take = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def hit(self, scope: str, client_keys: Union[str, Sequence[str]],
+            limit: int, period: float) -> float:
+        """ Count a request of one or several clients in a scope.
+        Return 0 if it is allowed, otherwise the seconds to wait before
+        the clients' next request is.
+        """
+        if isinstance(client_keys, str):
+            client_keys = [client_keys]
+
+        wait = self._take(
+            keys=[f'{self.KEY_PREFIX}:{scope}:{client_key}'
+                  for client_key in client_keys],
+            args=[limit, limit / (period * 1000)]
+        )
+
+        return int(wait) / 1000
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Module for the users' login sessions stored in Redis.
+"""
+from datetime import timedelta
+from redis import Redis
+from typing import List, Union
+
+
+class SessionStore:
+    """ Keep a key per login session, named after the jti of its refresh
+    token and holding the user id, and the set of each user's sessions.
+
+    Access tokens carry the id of their session in a `sid` claim, so a
+    session is valid for both tokens until it expires or is ended.
+    """
+
+    def __init__(self, client: Redis, token_cache) -> None:
+        """ Constructor """
+        self._redis = client
+        self._token_cache = token_cache
+
+    @staticmethod
+    def key(sid: str) -> str:
+        """ Return the Redis key of a session """
+        return f'session:{sid}'
+
+    @staticmethod
+    def user_key(user_id: str) -> str:
+        """ Return the Redis key of the set of a user's sessions """
+        return f'sessions:{user_id}'
+
+    def start(
+            self,
+            user_id: str,
+            sid: str,
+            ttl: Union[int, timedelta]
+    ) -> None:
+        """ Store a new session of a user for `ttl` (seconds or timedelta)
+        """
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.setex(self.key(sid), ttl, user_id)
+        pipe.sadd(self.user_key(user_id), sid)
+        pipe.expire(self.user_key(user_id), ttl)
+        pipe.execute()
+
+    def is_active(self, sid: str) -> bool:
+        """ Check if a session exists and was not ended """
+        return self._token_cache.is_alive(self.key(sid))
+
+    def end(self, user_id: str, sid: str) -> None:
+        """ End a session """
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.delete(self.key(sid))
+        pipe.srem(self.user_key(user_id), sid)
+        pipe.execute()
+
+        self._token_cache.revoke(self.key(sid))
+
+    def end_all(self, user_id: str) -> int:
+        """ End every session of a user.
+        Return the number of sessions ended.
+        """
+        sids = [sid.decode('utf-8') for sid in
+                self._redis.smembers(self.user_key(user_id))]
+        keys: List[str] = [self.key(sid) for sid in sids]
+
+        # Members of expired sessions are left in the set, only count
+        # the sessions actually ended
+        pipe = self._redis.pipeline(transaction=False)
+        if keys:
+            pipe.delete(*keys)
+        pipe.delete(self.user_key(user_id))
+        ended = pipe.execute()[0] if keys else 0
+
+        self._token_cache.revoke(*keys)
+
+        return ended
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Module for the users' current streaks stored in Redis.
+"""
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from redis import Redis
+from redis.exceptions import ResponseError
+from threading import Thread
+from typing import Iterator, List, Optional, Tuple
+import math
+
+
+# Increment a current streak and restart its countdown, unless the last
+# entry is too recent. Return the streak and the seconds left to wait,
+# 0 if the streak was incremented.
+#   KEYS: current streak
+#   ARGV: TTL above which an entry is too recent, TTL of the streak
+STREAK_SCRIPT = """
+local streak = redis.call('GET', KEYS[1])
+if streak then
+    local ttl = redis.call('TTL', KEYS[1])
+    if ttl > tonumber(ARGV[1]) then
+        return {tonumber(streak), ttl - tonumber(ARGV[1])}
+    end
+end
+
+streak = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return {streak, 0}
+"""
+
+
+class Streaks:
+    """ Keep each user's current streak under `<username>_CS`, expiring
+    when the user misses an entry.
+
+    The streaks can be recomputed from the posts, as the entries refused
+    by record_entry are not stored. SENTINEL_KEY tells they were, and is
+    lost with them if Redis restarts without persistence.
+    """
+
+    SENTINEL_KEY = 'streaks:restored'
+    LOCK_KEY = 'streaks:restore:lock'
+
+    def __init__(self, client: Redis) -> None:
+        """ Constructor """
+        self._redis = client
+        self._record = client.register_script(STREAK_SCRIPT)
+
+    @staticmethod
+    def key(username: str) -> str:
+        """ Return the Redis key of a user's current streak """
+        return f'{username}_CS'
+
+    def rename(self, old_username: str, new_username: str) -> None:
+        """ Move a user's current streak to a new username """
+        try:
+            self._redis.rename(self.key(old_username), self.key(new_username))
+        except ResponseError:
+            # No current streak
+            pass
+
+    def record_entry(
+            self,
+            username: str,
+            max_allowed_ttl: int,
+            ttl: int
+    ) -> Tuple[int, int]:
+        """ Count a new entry in a user's current streak, which then
+        lasts `ttl` seconds. The entry is refused while the streak has
+        more than `max_allowed_ttl` seconds left.
+
+        Return the current streak and the seconds to wait before the
+        next entry is allowed, 0 if this one was counted.
+        """
+        streak, wait = self._record(
+            keys=[self.key(username)],
+            args=[max_allowed_ttl, ttl]
+        )
+
+        return int(streak), int(wait)
+
+    @staticmethod
+    def _current_streaks(
+            posts: Iterator[dict],
+            streak_ttl: int,
+            now: datetime
+    ) -> Iterator[Tuple[str, int, int]]:
+        """ Walk the posts' dates grouped by user, from the most to the
+        less recent, and yield the (user_id, streak, ttl) of the users
+        whose streak is not broken.
+        """
+        for user_id, dates in groupby(posts, key=itemgetter('user_id')):
+            last = next(dates)['datePosted']
+            ttl = math.ceil(streak_ttl - (now - last).total_seconds())
+            if ttl <= 0:
+                continue
+
+            # An entry continued the streak if the previous one had not
+            # expired yet
+            streak, previous = 1, last
+            for post in dates:
+                gap = (previous - post['datePosted']).total_seconds()
+                if gap >= streak_ttl:
+                    break
+                streak, previous = streak + 1, post['datePosted']
+
+            yield user_id, streak, ttl
+
+    def rebuild(
+            self,
+            storage,
+            streak_ttl: int,
+            leaderboard=None,
+            batch_size: int = 1000
+    ) -> int:
+        """ Recompute the current streaks from the posts' dates, also on
+        the leaderboard if given, and set SENTINEL_KEY.
+        Return the number of streaks restored.
+        """
+        count = 0
+        posts = storage.iter_users_posts_dates(batch_size=batch_size)
+        restored = self._current_streaks(posts, streak_ttl, datetime.utcnow())
+
+        batch: List[Tuple[str, int, int]] = []
+        for entry in restored:
+            batch.append(entry)
+            if len(batch) == batch_size:
+                count += self._write(storage, batch, leaderboard)
+                batch = []
+
+        count += self._write(storage, batch, leaderboard)
+        self._redis.set(self.SENTINEL_KEY, 1)
+
+        return count
+
+    def _write(self, storage, batch: List[Tuple[str, int, int]],
+               leaderboard) -> int:
+        """ Write a batch of (user_id, streak, ttl) in one round trip.
+        Return the number of streaks written.
+        """
+        if not batch:
+            return 0
+
+        usernames = storage.find_usernames([user_id for user_id, *_ in batch])
+
+        pipe = self._redis.pipeline(transaction=False)
+        count = 0
+        for user_id, streak, ttl in batch:
+            username = usernames.get(user_id)
+            if username is None:
+                # Deleted user
+                continue
+            pipe.setex(self.key(username), ttl, streak)
+            if leaderboard is not None:
+                leaderboard.record(user_id, streak, ttl, pipe)
+            count += 1
+        pipe.execute()
+
+        return count
+
+    def restore_if_lost(
+            self,
+            storage,
+            streak_ttl: int,
+            leaderboard=None,
+            lock_ttl: int = 600
+    ) -> Optional[Thread]:
+        """ Rebuild the streaks in a background thread if SENTINEL_KEY is
+        missing, unless another process already does.
+        Return the thread, or None if there is nothing to do.
+        """
+        if self._redis.exists(self.SENTINEL_KEY):
+            return None
+        if not self._redis.set(self.LOCK_KEY, 1, nx=True, ex=lock_ttl):
+            return None
+
+        def restore():
+            try:
+                self.rebuild(storage, streak_ttl, leaderboard)
+            finally:
+                self._redis.delete(self.LOCK_KEY)
+
+        thread = Thread(target=restore, name='restore-streaks', daemon=True)
+        thread.start()
+
+        return thread
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Module for the materialized public timeline stored in Redis.
+"""
+from calendar import timegm
+from datetime import datetime
+from redis import Redis
+from threading import Thread
+from typing import Dict, List, Optional
+
+
+# Add a post to the timeline, and to the changes made during a rebuild.
+#   KEYS: timeline, rebuilding flag, changes
+#   ARGV: post_id, score
+ADD_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+end
+"""
+
+# Remove posts from the timeline, and record it during a rebuild.
+#   KEYS: timeline, rebuilding flag, changes
+#   ARGV: post ids
+REMOVE_SCRIPT = """
+redis.call('ZREM', KEYS[1], unpack(ARGV))
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    for _, post_id in ipairs(ARGV) do
+        redis.call('HSET', KEYS[3], post_id, '')
+    end
+end
+"""
+
+# Replay the changes made during the rebuild on the new timeline, then
+# swap it in. Return the number of posts in the timeline.
+#   KEYS: new timeline, timeline, rebuilding flag, changes, built flag
+SWAP_SCRIPT = """
+local changes = redis.call('HGETALL', KEYS[4])
+for i = 1, #changes, 2 do
+    if changes[i + 1] == '' then
+        redis.call('ZREM', KEYS[1], changes[i])
+    else
+        redis.call('ZADD', KEYS[1], changes[i + 1], changes[i])
+    end
+end
+
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+else
+    redis.call('DEL', KEYS[2])
+end
+redis.call('DEL', KEYS[3], KEYS[4])
+redis.call('SET', KEYS[5], 1)
+return redis.call('ZCARD', KEYS[2])
+"""
+
+
+def to_score(date: datetime) -> int:
+    """ Return a UTC datetime as milliseconds since the epoch """
+    return timegm(date.utctimetuple()) * 1000 + date.microsecond // 1000
+
+
+class Timeline:
+    """ Keep the ids of the public posts in a Redis sorted set,
+    scored by their datePosted.
+
+    A rebuild fills a new set from the db while the posts keep being
+    added and removed: these changes are also recorded, and replayed on
+    the new set right before it replaces the timeline. Only one rebuild
+    runs at a time, under LOCK_KEY.
+    """
+
+    KEY = 'public_timeline'
+    BUILT_KEY = 'public_timeline:built'
+    LOCK_KEY = 'public_timeline:lock'
+    NEW_KEY = 'public_timeline:rebuilding'
+    REBUILDING_KEY = 'public_timeline:rebuilding:flag'
+    CHANGES_KEY = 'public_timeline:rebuilding:changes'
+
+    # Seconds after which an interrupted rebuild stops recording changes
+    # and releases the lock, both renewed by each batch
+    REBUILDING_TTL = 600
+
+    def __init__(self, client: Redis, storage) -> None:
+        """ Constructor """
+        self._redis = client
+        self._storage = storage
+        self._add = client.register_script(ADD_SCRIPT)
+        self._remove = client.register_script(REMOVE_SCRIPT)
+        self._swap = client.register_script(SWAP_SCRIPT)
+
+    def add(self, post_id: str, date_posted: datetime) -> None:
+        """ Add a public post to the timeline """
+        self._add(
+            keys=[self.KEY, self.REBUILDING_KEY, self.CHANGES_KEY],
+            args=[str(post_id), to_score(date_posted)]
+        )
+
+    def remove(self, *post_ids: str) -> None:
+        """ Remove posts from the timeline """
+        if post_ids:
+            self._remove(
+                keys=[self.KEY, self.REBUILDING_KEY, self.CHANGES_KEY],
+                args=list(map(str, post_ids))
+            )
+
+    def is_built(self) -> bool:
+        """ Check whether the timeline reflects the posts in the db """
+        return bool(self._redis.exists(self.BUILT_KEY))
+
+    def page(self, start: int, count: int) -> Optional[List[str]]:
+        """ Return `count` post ids from rank `start`, the most recent first,
+        or None if the timeline is not built yet, in which case it starts
+        being rebuilt in the background.
+        """
+        if not self.is_built():
+            self.rebuild_in_background()
+            return None
+
+        ids = self._redis.zrevrange(self.KEY, start, start + count - 1)
+        return [post_id.decode('utf-8') for post_id in ids]
+
+    def size(self) -> int:
+        """ Return the number of posts in the timeline """
+        return self._redis.zcard(self.KEY)
+
+    def rebuild_in_background(self) -> Optional[Thread]:
+        """ Rebuild the timeline in a background thread, unless another
+        process already does.
+        Return the thread, or None if a rebuild is running.
+        """
+        if not self._lock():
+            return None
+
+        def rebuild():
+            try:
+                self._rebuild()
+            finally:
+                self._redis.delete(self.LOCK_KEY)
+
+        thread = Thread(target=rebuild, name='rebuild-timeline', daemon=True)
+        thread.start()
+
+        return thread
+
+    def rebuild(self, batch_size: int = 1000) -> Optional[int]:
+        """ Rebuild the timeline from the public posts in the db, unless
+        another process already does.
+        Return the number of posts in the new timeline, or None if a
+        rebuild is running.
+        """
+        if not self._lock():
+            return None
+
+        try:
+            return self._rebuild(batch_size)
+        finally:
+            self._redis.delete(self.LOCK_KEY)
+
+    def _lock(self) -> bool:
+        """ Take the rebuild's lock. Return whether it was free. """
+        return bool(self._redis.set(
+            self.LOCK_KEY, 1, nx=True, ex=self.REBUILDING_TTL
+        ))
+
+    def _rebuild(self, batch_size: int = 1000) -> int:
+        """ Rebuild the timeline, holding the lock """
+        # Record the changes from now on, before reading the posts
+        pipe = self._redis.pipeline()
+        pipe.delete(self.NEW_KEY, self.CHANGES_KEY)
+        pipe.set(self.REBUILDING_KEY, 1, ex=self.REBUILDING_TTL)
+        pipe.execute()
+
+        batch = {}
+        posts = self._storage.iter_public_posts(
+            projection={'_id': 1, 'datePosted': 1},
+            batch_size=batch_size
+        )
+        for post in posts:
+            batch[str(post['_id'])] = to_score(post['datePosted'])
+            if len(batch) == batch_size:
+                self._write_batch(batch)
+                batch = {}
+
+        if batch:
+            self._write_batch(batch)
+
+        # Swap the new timeline in at once, with the changes made meanwhile
+        return self._swap(keys=[
+            self.NEW_KEY,
+            self.KEY,
+            self.REBUILDING_KEY,
+            self.CHANGES_KEY,
+            self.BUILT_KEY
+        ])
+
+    def _write_batch(self, batch: Dict[str, int]) -> None:
+        """ Add a batch of posts to the timeline being rebuilt """
+        pipe = self._redis.pipeline()
+        pipe.zadd(self.NEW_KEY, batch)
+        pipe.expire(self.REBUILDING_KEY, self.REBUILDING_TTL)
+        pipe.expire(self.LOCK_KEY, self.REBUILDING_TTL)
+        pipe.execute()
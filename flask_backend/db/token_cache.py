@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Module for caching the verified JWT identities in each worker's memory.
+"""
+from db.local_cache import LocalCache
+
+
+class TokenCache(LocalCache):
+    """ Remember which token keys (the sessions' keys) exist in Redis,
+    so most requests skip the EXISTS round trip. Only live tokens are
+    cached: an unknown or revoked one is always checked in Redis.
+    """
+
+    CHANNEL = 'tokens:revoked'
+
+    def is_alive(self, identity: str) -> bool:
+        """ Check if the token of an identity is stored in Redis """
+        if not self._enabled():
+            return bool(self._redis.exists(identity))
+
+        alive, generation = self._lookup(identity)
+        if alive:
+            return True
+
+        if not self._redis.exists(identity):
+            return False
+
+        self._store(identity, True, generation)
+
+        return True
+
+    def revoke(self, *identities: str) -> None:
+        """ Drop identities from the cache of every worker """
+        self._invalidate(identities)
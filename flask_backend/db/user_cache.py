@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Module for caching the users' documents in each worker's memory and in
+Redis.
+"""
+from bson import json_util
+from collections import Counter
+from db.local_cache import LocalCache
+from redis import Redis
+from threading import Lock
+from typing import Any, Dict, Optional
+import time
+
+
+class UserCache(LocalCache):
+    """ Read-through cache of the users' documents, without their
+    password: in each worker's memory for `ttl` seconds, then in Redis
+    under `user:<id>` for `redis_ttl` seconds, then in MongoDB. The Redis
+    copy is Extended JSON, so dates come back as datetimes.
+
+    Each worker counts its lookups, and adds them to the totals of every
+    worker in STATS_KEY at most every `stats_interval` seconds.
+
+    The storage calls invalidate after changing a user, which deletes the
+    Redis copy and publishes the id to every worker. A read racing with
+    a change may put the old document back in Redis: `redis_ttl` bounds
+    how long it is served.
+    """
+
+    CHANNEL = 'users:invalidated'
+    STATS_KEY = 'user_cache:stats'
+    COUNTERS = ('local_hits', 'redis_hits', 'misses')
+
+    def __init__(
+            self,
+            client: Redis,
+            storage,
+            ttl: float = 5.0,
+            max_size: int = 10000,
+            redis_ttl: int = 300,
+            stats_interval: float = 10.0
+    ) -> None:
+        """ Constructor """
+        super().__init__(client, ttl, max_size)
+        self._storage = storage
+        self._redis_ttl = redis_ttl
+        self._stats_interval = stats_interval
+        self._counts: Counter = Counter()
+        self._unpushed: Counter = Counter()
+        self._pushed_at = time.monotonic()
+        self._counts_lock = Lock()
+
+    def configure(self, ttl: float, max_size: int,
+                  redis_ttl: int = 300) -> None:
+        """ Set the lifetime of the entries in memory and in Redis, in
+        seconds, and the maximum number of entries in memory. A ttl of 0
+        disables the cache in memory.
+        """
+        super().configure(ttl, max_size)
+        self._redis_ttl = redis_ttl
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        """ Return the Redis key of a user's document """
+        return f'user:{user_id}'
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """ Return a user's document without password, None if the user
+        doesn't exist
+        """
+        local = self._enabled()
+        if local:
+            user, generation = self._lookup(user_id)
+            if user is not None:
+                self._count('local_hits')
+                return dict(user)
+
+        cached = self._redis.get(self.key(user_id))
+        if cached is not None:
+            self._count('redis_hits')
+            user = json_util.loads(cached)
+        else:
+            self._count('misses')
+            user = self._storage.find_user_by_id(user_id)
+            if user is None:
+                return None
+            self._redis.set(
+                self.key(user_id), json_util.dumps(user), ex=self._redis_ttl
+            )
+
+        if local:
+            self._store(user_id, user, generation)
+
+        return dict(user)
+
+    def invalidate(self, *user_ids: str) -> None:
+        """ Drop users from Redis and from the cache of every worker """
+        if user_ids:
+            self._redis.delete(*map(self.key, user_ids))
+        self._invalidate(user_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        """ Return this worker's hits in memory and in Redis, misses,
+        and the rate of lookups served from a cache
+        """
+        with self._counts_lock:
+            return self._with_hit_rate(self._counts)
+
+    def total_stats(self) -> Dict[str, Any]:
+        """ Return the stats of every worker, as last pushed to Redis """
+        counts = {
+            name.decode('utf-8'): int(count)
+            for name, count in self._redis.hgetall(self.STATS_KEY).items()
+        }
+
+        return self._with_hit_rate(counts)
+
+    def reset_total_stats(self) -> None:
+        """ Set the stats of every worker in Redis back to 0 """
+        self._redis.delete(self.STATS_KEY)
+
+    @classmethod
+    def _with_hit_rate(cls, counts: Dict[str, int]) -> Dict[str, Any]:
+        """ Return the counters with the rate of lookups served from a
+        cache
+        """
+        stats: Dict[str, Any] = {
+            name: counts.get(name, 0) for name in cls.COUNTERS
+        }
+
+        lookups = sum(stats.values())
+        hits = stats['local_hits'] + stats['redis_hits']
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+
+        return stats
+
+    def _count(self, name: str) -> None:
+        """ Count a lookup, and push the counts not pushed yet to Redis
+        if `stats_interval` elapsed since the last push
+        """
+        now = time.monotonic()
+        with self._counts_lock:
+            self._counts[name] += 1
+            self._unpushed[name] += 1
+            if now - self._pushed_at < self._stats_interval:
+                return
+            unpushed, self._unpushed = self._unpushed, Counter()
+            self._pushed_at = now
+
+        pipe = self._redis.pipeline(transaction=False)
+        for counter, count in unpushed.items():
+            pipe.hincrby(self.STATS_KEY, counter, count)
+        pipe.execute()
@@ -4,9 +4,20 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
+from cli import register_commands
+from db import (
+    db,
+    job_queue,
+    leaderboard,
+    streaks,
+    token_cache,
+    user_cache,
+)
+from passwords import password_hasher
 from routes import auth_bp, home_bp, profile_bp, feed_bp
 from flask_jwt_extended import JWTManager
 from flasgger import Swagger
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 
 def create_app(config=Config):
@@ -26,6 +37,10 @@ def create_app(config=Config):
     # Set configuration
     app.config.from_object(config)
 
+    # Trust the X-Forwarded-For header of our proxies
+    if app.config['PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_COUNT'])
+
     # Set up CORS
     CORS(app)
 
@@ -38,6 +53,48 @@ def create_app(config=Config):
     app.register_blueprint(feed_bp, url_prefix='/api/feed')
     app.register_blueprint(profile_bp, url_prefix='/api/me')
 
+    # Register maintenance commands
+    register_commands(app)
+
+    # Size the cache of verified tokens
+    token_cache.configure(
+        app.config['TOKEN_CACHE_TTL'],
+        app.config['TOKEN_CACHE_SIZE']
+    )
+
+    # Size the cache of users' documents
+    user_cache.configure(
+        app.config['USER_CACHE_TTL'],
+        app.config['USER_CACHE_SIZE'],
+        app.config['USER_CACHE_REDIS_TTL']
+    )
+
+    # Set the retries of the background jobs
+    job_queue.configure(
+        app.config['JOBS_MAX_ATTEMPTS'],
+        app.config['JOBS_RETRY_DELAY'],
+        app.config['JOBS_RESULT_TTL']
+    )
+
+    # Set the cost of the passwords' hashes
+    password_hasher.configure(
+        app.config['BCRYPT_ROUNDS'],
+        app.config['PASSWORD_HASH_WORKERS']
+    )
+
+    # Create the missing indexes, migrations do it in production
+    if app.config.get('ENSURE_INDEXES'):
+        db.ensure_indexes()
+
+    # Recompute the current streaks if Redis lost them
+    if app.config['STREAKS_RESTORE_ON_START']:
+        streaks.restore_if_lost(
+            db,
+            app.config['STREAK_TTL'],
+            leaderboard,
+            app.config['STREAKS_RESTORE_LOCK_TTL']
+        )
+
     @jwt.invalid_token_loader
     def unauthorized_response(callback):
         """Return an error if invalid JWT
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Hash and verify passwords with bcrypt in a pool of worker processes
+"""
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+import bcrypt
+import multiprocessing
+import os
+
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    """Hash a password with a new salt of `rounds` cost"""
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _checkpw(password: bytes, hashed_password: bytes) -> bool:
+    """Check a password against its hash"""
+    return bcrypt.checkpw(password, hashed_password)
+
+
+def hash_rounds(hashed_password: bytes) -> int:
+    """Return the cost a bcrypt hash was computed with"""
+    # A bcrypt hash reads $<version>$<cost>$<salt and hash>
+    return int(hashed_password.split(b'$')[2])
+
+
+class PasswordHasher:
+    """Run bcrypt in a bounded pool of processes: a burst of logins uses
+    at most `workers` cores and waits in the pool's queue, leaving the
+    CPU to the requests of the other routes.
+
+    The pool is started on first use in each process, so the workers
+    forked by the server each get their own. With 0 workers, passwords
+    are hashed in the calling thread.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 0) -> None:
+        """Constructor"""
+        self._rounds = rounds
+        self._workers = workers
+        self._pool = None
+        self._pid = None
+        self._lock = Lock()
+
+    @property
+    def rounds(self) -> int:
+        """Return the cost of the new hashes"""
+        return self._rounds
+
+    def configure(self, rounds: int, workers: int) -> None:
+        """Set the cost of the new hashes and the number of processes"""
+        with self._lock:
+            if workers != self._workers and self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            self._rounds = rounds
+            self._workers = workers
+
+    def _run(self, func, *args):
+        """Run func in the pool, or inline without workers"""
+        if self._workers <= 0:
+            return func(*args)
+
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    # Spawn the workers, forking a threaded server is unsafe
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self._workers,
+                        mp_context=multiprocessing.get_context('spawn')
+                    )
+                    self._pid = os.getpid()
+
+        return self._pool.submit(func, *args).result()
+
+    def hash(self, password: str) -> bytes:
+        """Hash a password at the configured cost"""
+        return self._run(_hashpw, password.encode('utf-8'), self._rounds)
+
+    def verify(self, hashed_password: bytes, password: str) -> bool:
+        """Check a password against its hash"""
+        return self._run(_checkpw, password.encode('utf-8'), hashed_password)
+
+    def needs_rehash(self, hashed_password: bytes) -> bool:
+        """Check if a hash was computed at another cost than the current"""
+        return hash_rounds(hashed_password) != self._rounds
+
+
+password_hasher = PasswordHasher()
@@ -3,15 +3,20 @@
 """
 from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime
-from db import db, redis_client as rc
+from db import db, sessions
+from db.db_manager import DuplicateUserError
+from passwords import password_hasher
+from routes.rate_limit import rate_limit
 from functools import wraps
-import bcrypt
 from flask_jwt_extended import (
     create_access_token,
     jwt_required,
+    get_jwt,
+    get_jti,
     get_jwt_identity,
     create_refresh_token,
 )
+from typing import Dict
 from flasgger.utils import swag_from
 
 
@@ -19,27 +24,40 @@ from flasgger.utils import swag_from
 auth_bp = Blueprint('auth_bp', __name__)
 
 
-def store_token(token_key, token, ttl_seconds):
-    """Store JWT in redis
+def issue_tokens(user_id: str) -> Dict[str, str]:
+    """Start a new session for a user, and return its JWTs
+
+    The session is named after the jti of the refresh token, and the
+    access token refers to it in its `sid` claim
     """
-    rc.setex(token_key, ttl_seconds, token)
+    refresh_token = create_refresh_token(identity=user_id)
+    sid = get_jti(refresh_token)
+    access_token = create_access_token(
+        identity=user_id,
+        additional_claims={'sid': sid}
+    )
 
+    sessions.start(
+        user_id,
+        sid,
+        current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
+    )
 
-def is_token_expired(token_key):
-    """Check if a JWT is stored and alive in Redis
-    """
-    return rc.exists(token_key)
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token
+    }
 
 
 def verify_token_in_redis(func):
-    """Decorator to ensure a JWT presence
+    """Decorator to ensure the JWT's session is still active
     """
 
     @wraps(func)
     def valid_token(*args, **kwargs):
-        identity = get_jwt_identity()
+        sid = get_jwt().get('sid')
 
-        if not is_token_expired(identity):
+        if not sid or not sessions.is_active(sid):
             return jsonify({"error": "Token has been revoked"}), 401
 
         return func(*args, **kwargs)
@@ -48,6 +66,7 @@ def verify_token_in_redis(func):
 
 
 @auth_bp.route('/register', methods=['POST'])
+@rate_limit
 @swag_from('../documentation/auth/register.yml')
 def register():
     """Register a new user
@@ -71,15 +90,7 @@ def register():
     if not password:
         return jsonify({'error': 'Missing password'}), 400
 
-    # Ensure email is not already used
-    if db.find_user({'email': email}):
-        return jsonify({'error': 'Email already used'}), 400
-
-    # Ensure username is not already used
-    if db.find_user({'username': username}):
-        return jsonify({'error': 'Username already used'}), 400
-
-    # Insert user to db
+    # Insert user to db, the unique indexes reject used emails and usernames
     doc = {
         'email': email,
         'username': username,
@@ -87,13 +98,17 @@ def register():
         'created_at': datetime.utcnow(),
         'longest_streak': 0
     }
-    db.insert_user(doc)
+    try:
+        db.insert_user(doc)
+    except DuplicateUserError as e:
+        return jsonify({'error': f'{e.field.capitalize()} already used'}), 400
 
     # Return respose
     return jsonify({'Created user': username, 'email': email}), 201
 
 
 @auth_bp.route("/login", methods=["POST"])
+@rate_limit
 @swag_from('../documentation/auth/login.yml')
 def login():
     """Log in a user creating a JWT for him
@@ -117,40 +132,19 @@ def login():
 
         # Check that the password is correct
         hashed_password = db.get_hash(email)
-        verified = bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+        verified = password_hasher.verify(hashed_password, password)
         if verified:
 
-            # Create JWT Access Token
-            access_token = create_access_token(
-                identity=str(user_from_db['_id'])
-            )
-
-            # Create JWT Refresh Token
-            refresh_token = create_refresh_token(
-                identity=str(user_from_db['_id'])
-            )
-
-            # Store JWT Access Token
-            store_token(
-                str(user_from_db['_id']),
-                access_token,
-                current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-            )
-
-            # Store JWT Refresh Token
-            store_token(
-                str(user_from_db['_id']) + "_refresh",
-                refresh_token,
-                current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
-            )
-
-            # Return both JWTs as a response
-            return jsonify(
-                {
-                    'access_token': access_token,
-                    'refresh_token': refresh_token
-                }
-            ), 200
+            # Hash the password again if the cost setting changed
+            if password_hasher.needs_rehash(hashed_password):
+                db.replace_password_hash(
+                    user_from_db['_id'],
+                    hashed_password,
+                    password_hasher.hash(password)
+                )
+
+            # Create both JWTs in a new session
+            return jsonify(issue_tokens(str(user_from_db['_id']))), 200
 
     # Return an error if credentials were wrong
     return jsonify({'error': 'The email and/or password are incorrect'}), 401
@@ -166,18 +160,15 @@ def refresh():
     # Get the JWT identity of the current user
     current_user = get_jwt_identity()
 
-    # Check JWT Refresh token
-    key = current_user + '_refresh'
-    if not is_token_expired(key):
+    # Check the session of the JWT Refresh token
+    sid = get_jwt()['jti']
+    if not sessions.is_active(sid):
         return jsonify({"error": "Token has been revoked"}), 401
 
-    # Create and store a new JWT Access token
-    new_access_token = create_access_token(identity=current_user)
-
-    store_token(
-        current_user,
-        new_access_token,
-        current_app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+    # Create a new JWT Access token in the same session
+    new_access_token = create_access_token(
+        identity=current_user,
+        additional_claims={'sid': sid}
     )
 
     # Return the new JWT Access Token
@@ -189,10 +180,20 @@ def refresh():
 @verify_token_in_redis
 @swag_from('../documentation/auth/logout.yml')
 def logout():
-    """Invalidate JWTs by deleting them from Redis
+    """Invalidate the JWTs by ending their session
     """
-    current_user = get_jwt_identity()
-    rc.delete(current_user)
-    rc.delete(current_user + "_refresh")
+    sessions.end(get_jwt_identity(), get_jwt()['sid'])
+
+    return jsonify({}), 204
+
+
+@auth_bp.route('/logout_all', methods=['POST'])
+@jwt_required()
+@verify_token_in_redis
+@swag_from('../documentation/auth/logout_all.yml')
+def logout_all():
+    """Invalidate the JWTs of every session of the current user
+    """
+    sessions.end_all(get_jwt_identity())
 
     return jsonify({}), 204
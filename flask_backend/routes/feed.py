@@ -1,75 +1,323 @@
 #!/usr/bin/env python3
 """ Feed routes """
-from flask import Blueprint, jsonify, request
+from flask import (
+    Blueprint,
+    current_app,
+    jsonify,
+    request,
+    stream_with_context,
+)
 from datetime import datetime
-from db import db
+from db import db, feed_cache, like_buffer, timeline, user_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from routes.auth import verify_token_in_redis
-from typing import Dict
+from routes.rate_limit import rate_limit
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from base64 import urlsafe_b64encode, urlsafe_b64decode
 from bson import ObjectId
+from bson.errors import InvalidId
 from flasgger import swag_from
 
 # Create feed Blueprint
 feed_bp = Blueprint('feed_bp', __name__)
 
+# Number of posts in a feed's page
+POSTS_PER_PAGE = 20
+
+# Number of posts serialized at once when streaming the feed
+STREAM_BATCH_SIZE = 100
+
+# Number of posts whose comments can be fetched in a single request
+MAX_COMMENTED_POSTS = 50
+
 
 def serialize_comment(comment: Dict) -> Dict:
     """Serialize a comment
     """
     comment['post_id'] = str(comment['post_id'])
     comment['user_id'] = str(comment['user_id'])
+    # Stringify date_posted
+    if isinstance(comment.get('date_posted'), datetime):
+        comment['date_posted'] = comment['date_posted'].strftime(
+            '%a, %d %b %Y %H:%M:%S GMT'
+        )
     return comment
 
 
+def encode_cursor(date: datetime, _id: str) -> str:
+    """Encode the position of an item as an opaque cursor
+    """
+    raw = f'{date.isoformat()}|{_id}'.encode('utf-8')
+    return urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Decode a cursor back to its (date, _id) position
+
+    Raise a ValueError if the cursor is malformed
+    """
+    try:
+        raw = urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date, _id = raw.split('|')
+        return datetime.fromisoformat(date), ObjectId(_id)
+    except (ValueError, InvalidId):
+        raise ValueError(f'invalid cursor: {cursor}')
+
+
+def comments_page_size(data: Dict) -> Optional[int]:
+    """Return the number of comments per page asked in a request's data,
+    bounded by COMMENTS_MAX_PAGE_SIZE, or None if it is invalid
+    """
+    page_size = data.get(
+        'page_size', current_app.config['COMMENTS_PAGE_SIZE']
+    )
+    # bool is a subclass of int, but true isn't a page size
+    if type(page_size) is not int or page_size < 1:
+        return None
+
+    return min(page_size, current_app.config['COMMENTS_MAX_PAGE_SIZE'])
+
+
+def paginate_comments(
+        comments: List[Dict],
+        page_size: int
+) -> Tuple[List[Dict], Optional[str]]:
+    """Cut comments fetched with one extra comment down to a page,
+    and return its serialized comments with the cursor of the next page
+    """
+    next_cursor = None
+    if len(comments) > page_size:
+        comments = comments[:page_size]
+        last = comments[-1]
+        next_cursor = encode_cursor(last['date_posted'], last['_id'])
+
+    return [serialize_comment(c) for c in comments], next_cursor
+
+
+def serialize_post(post: Dict) -> Dict:
+    """Serialize a feed's post
+    """
+    # Stringify datePosted
+    post['datePosted'] = post['datePosted'].strftime('%Y/%m/%d %H:%M:%S')
+    for i in range(len(post['comments'])):
+        post['comments'][i] = serialize_comment(post['comments'][i])
+
+    return post
+
+
+def serialize_feed(posts: List[Dict]) -> List[Dict]:
+    """Serialize a list of feed's posts
+    """
+    return [serialize_post(p) for p in posts]
+
+
+def find_likes(post_ids: List[str]) -> Tuple[Dict[str, int], Set[str]]:
+    """Return the likes buffered in Redis and not flushed to the db yet,
+    counted by post, and the ids of the posts the current user likes
+    """
+    if not post_ids:
+        return {}, set()
+
+    user_id = get_jwt_identity()
+    liked = db.find_liked_post_ids(user_id, post_ids)
+
+    if current_app.config['LIKES_BUFFERING']:
+        pending = like_buffer.pending_likes(user_id, post_ids)
+        liked = {p for p in post_ids if pending.get(p, p in liked)}
+        return like_buffer.pending_deltas(post_ids), liked
+
+    return {}, liked
+
+
+def mark_liked_posts(posts: List[Dict]) -> List[Dict]:
+    """Flag the posts liked by the current user, merging the likes
+    buffered in Redis and not flushed to the db yet
+    """
+    deltas, liked = find_likes([p['_id'] for p in posts])
+
+    for p in posts:
+        p['number_of_likes'] += deltas.get(p['_id'], 0)
+        p['liked_by_me'] = p['_id'] in liked
+
+    return posts
+
+
+def wants_stream() -> bool:
+    """Check whether the client asked for the feed as a NDJSON stream
+    """
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+
+    accepted = request.accept_mimetypes
+    return accepted.best == 'application/x-ndjson'
+
+
+def stream_feed() -> Iterator[str]:
+    """Yield every public post as a line of JSON
+    """
+    batch = []
+    for post in db.iter_public_posts():
+        batch.append(serialize_post(post))
+
+        # Look the likes up by batches of posts
+        if len(batch) == STREAM_BATCH_SIZE:
+            for p in mark_liked_posts(batch):
+                yield current_app.json.dumps(p) + '\n'
+            batch = []
+
+    for p in mark_liked_posts(batch):
+        yield current_app.json.dumps(p) + '\n'
+
+
 @feed_bp.route('/get_posts', methods=['GET'])
 @jwt_required()
 @verify_token_in_redis
 @swag_from('../documentation/feed/get_feed.yml')
 def get_feed():
     """ Return all the public posts """
-    posts = list(filter(lambda p: p['is_public'] is True, db.find_all_posts()))
 
-    # Sort posts from the most to the less recent
-    posts.sort(key=lambda x: x['datePosted'], reverse=True)
+    # If a cursor is given (even empty), page by keyset from that position
+    if 'cursor' in request.args:
+        return get_feed_after_cursor(request.args.get('cursor'))
 
-    # Stringify datePosted
-    for p in posts:
-        p['datePosted'] = p['datePosted'].strftime('%Y/%m/%d %H:%M:%S')
-        for i in range(len(p['comments'])):
-            p['comments'][i] = serialize_comment(p['comments'][i])
-
-    # If a page is queried, paginate with 20 posts per page
+    # If a page is queried, paginate with POSTS_PER_PAGE posts per page
     page = request.args.get('page')
     if page:
         try:
             page_num = int(page)
+        except ValueError:
+            return jsonify({'error': 'page argument must be an integer'}), 400
 
-            if page_num < 1:
-                return jsonify(
-                    {
-                        'error': 'page number must be greater or equal to 1'
-                    }
-                ), 400
+        if page_num < 1:
+            return jsonify(
+                {
+                    'error': 'page number must be greater or equal to 1'
+                }
+            ), 400
 
-            # Compute posts quantity
-            len_posts = len(posts)
+        # Bound the pages cached, and the posts skipped to reach them
+        max_page = current_app.config['FEED_MAX_PAGE']
+        if page_num > max_page:
+            return jsonify(
+                {
+                    'error': f'page number must be lower or equal to '
+                             f'{max_page}, use cursor to read further'
+                }
+            ), 400
 
-            # Extract the page
-            if (page_num - 1) * 20 > len_posts:
-                return jsonify({'info': 'page out of range'})
+        # Serve the page from the cache, rendering it if needed
+        page = feed_cache.get_or_build(
+            f'posts:{page_num}',
+            lambda: render_feed_page(page_num),
+            ttl=current_app.config['FEED_CACHE_TTL'],
+            stale_ttl=current_app.config['FEED_CACHE_STALE_TTL'],
+            lock_ttl=current_app.config['FEED_CACHE_LOCK_TTL']
+        )
+
+        return current_app.response_class(
+            splice_likes(page),
+            mimetype='application/json'
+        )
+
+    # Stream all posts, one per line, with no pagination
+    if wants_stream():
+        return current_app.response_class(
+            stream_with_context(stream_feed()),
+            mimetype='application/x-ndjson'
+        )
+
+    # Return all posts with no pagination
+    posts = db.find_public_posts()
+
+    return jsonify(mark_liked_posts(serialize_feed(posts)))
+
+
+def render_feed_page(page_num: int) -> bytes:
+    """Render a feed's page for splice_likes: a JSON line with the ids of
+    its posts and their likes counts, then a line per post with its JSON
+    object left open for the likes
+    """
+    # Extract the page from the timeline, or from the db if the
+    # timeline is being rebuilt
+    skip = (page_num - 1) * POSTS_PER_PAGE
+    post_ids = timeline.page(skip, POSTS_PER_PAGE)
+
+    if post_ids is not None:
+        posts = db.find_posts_by_ids(post_ids)
+        count_posts = timeline.size
+    else:
+        posts = db.find_public_posts(skip=skip, limit=POSTS_PER_PAGE)
+        count_posts = db.count_public_posts
+
+    # An empty page past the first one may be out of range
+    if not posts and skip > 0 and skip > count_posts():
+        return current_app.json.dumps({'info': 'page out of range'}).encode()
+
+    posts = serialize_feed(posts)
+    header = {
+        'ids': [p['_id'] for p in posts],
+        'likes': [p.pop('number_of_likes', 0) for p in posts]
+    }
+    lines = [current_app.json.dumps(header)]
+    # JSON escapes the newlines in strings, so a post holds on one line
+    lines.extend(current_app.json.dumps(p)[:-1] for p in posts)
+
+    return '\n'.join(lines).encode()
+
+
+def splice_likes(page: bytes) -> bytes:
+    """Close the posts of a rendered feed's page with their likes counts
+    and whether the current user likes them, without parsing the posts
+    """
+    header, *posts = page.split(b'\n')
+    info = current_app.json.loads(header)
+    if 'ids' not in info:
+        # Page out of range
+        return header
+
+    deltas, liked = find_likes(info['ids'])
+    closed = [
+        b'%s, "number_of_likes": %d, "liked_by_me": %s}' % (
+            post,
+            likes + deltas.get(post_id, 0),
+            b'true' if post_id in liked else b'false'
+        )
+        for post, post_id, likes in zip(posts, info['ids'], info['likes'])
+    ]
+
+    return b'[' + b', '.join(closed) + b']'
+
+
+def get_feed_after_cursor(cursor: str):
+    """Return the page of public posts following `cursor`,
+    with the cursor of the next page
+    """
+    before = None
+    if cursor:
+        try:
+            before = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'invalid cursor'}), 400
 
-            return jsonify(posts[(page_num - 1) * 20: page_num * 20])
+    # Fetch one extra post to know whether a next page exists
+    posts = db.find_public_posts(limit=POSTS_PER_PAGE + 1, before=before)
 
-        except ValueError:
-            return jsonify({'error': 'page argument must be an integer'}), 400
+    next_cursor = None
+    if len(posts) > POSTS_PER_PAGE:
+        posts = posts[:POSTS_PER_PAGE]
+        last = posts[-1]
+        next_cursor = encode_cursor(last['datePosted'], last['_id'])
 
-    else:  # Return all posts with no pagination
-        return jsonify(posts)
+    return jsonify({
+        'data': mark_liked_posts(serialize_feed(posts)),
+        'next_cursor': next_cursor
+    })
 
 
 @feed_bp.route('/like', methods=['POST'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/feed/like.yml')
 def like():
     """ Add likes to a post document """
@@ -79,33 +327,31 @@ def like():
     # Get the post id
     post_id = data.get('post_id')
 
-    # Get the current user's id
-    user_id = get_jwt_identity()
-
     # Check if post id is missing
     if not post_id:
         return jsonify({"error": "Missing post_id"}), 400
 
-    # Return the post associated with post_id
-    post = db.find_post({"_id": ObjectId(post_id)})
-
-    # Check if the post exist.
-    if post:
+    # Like the post if it exists and is not already liked by the current user
+    if current_app.config['LIKES_BUFFERING']:
+        res_code = like_buffer.like(get_jwt_identity(), post_id)
+    else:
+        res_code = db.like_post(get_jwt_identity(), post_id)
 
-        # Check if the post is already liked by the current user
-        liked = db.like_post(user_id, post['_id'])
+    if res_code == -1:
+        return jsonify({"error": "Post not found."}), 404
+    if res_code == -2:
+        return jsonify({"error": "User has already liked the post."}), 400
 
-        if liked:
-            return jsonify({"error": "User has already liked the post."}), 400
-
-        return jsonify({"success": "Post liked successfully."}), 201
-
-    return jsonify({"error": "Post not found."}), 404
+    # Buffered likes are merged when reading the feed
+    if not current_app.config['LIKES_BUFFERING']:
+        feed_cache.bump()
+    return jsonify({"success": "Post liked successfully."}), 201
 
 
 @feed_bp.route('/unlike', methods=['POST'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/feed/unlike.yml')
 def unlike():
     """ remove likes from a post document """
@@ -115,34 +361,33 @@ def unlike():
     # Get the post id
     post_id = data.get('post_id')
 
-    # Get the current user's id
-    user_id = get_jwt_identity()
-
     # Check if post id is missing.
     if not post_id:
         return jsonify({"error": "Missing post_id"}), 400
 
-    # Return the post associated with post_id
-    post = db.find_post({"_id": ObjectId(post_id)})
+    # Unlike the post if it exists and is liked by the current user
+    if current_app.config['LIKES_BUFFERING']:
+        res_code = like_buffer.unlike(get_jwt_identity(), post_id)
+    else:
+        res_code = db.unlike_post(get_jwt_identity(), post_id)
 
-    # Check if the post exist.
-    if post:
-        unliked = db.unlike_post(user_id, post['_id'])
+    if res_code == -1:
+        return jsonify({"error": "Post not found."}), 404
+    if res_code == -2:
+        return jsonify(
+            {"error": "User can only unliked the post that he liked."}
+        ), 400
 
-        # Check if the post is already unliked by the current user
-        if unliked:
-            return jsonify(
-                {"error": "User can only unliked the post that he liked."}
-            ), 400
-
-        return jsonify({"success": "Post unliked successfully."}), 200
-
-    return jsonify({"error": "Post not found."}), 404
+    # Buffered likes are merged when reading the feed
+    if not current_app.config['LIKES_BUFFERING']:
+        feed_cache.bump()
+    return jsonify({"success": "Post unliked successfully."}), 200
 
 
 @feed_bp.route('/comment', methods=['POST'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/feed/comment.yml')
 def comment():
     """ route for adding comments to a post """
@@ -154,7 +399,7 @@ def comment():
 
     # Get the current user
     user_id = get_jwt_identity()
-    user = db.find_user({"_id": ObjectId(user_id)})
+    user = user_cache.get(user_id)
 
     # comment body
     comment_body = data.get('body')
@@ -173,15 +418,14 @@ def comment():
             'username': user['username'],
             'post_id': ObjectId(post_id),
             'body': comment_body,
-            'date_posted': datetime.utcnow().strftime(
-                '%a, %d %b %Y %H:%M:%S GMT'
-            )
+            'date_posted': datetime.utcnow()
         }
 
         comment_id = db.insert_comment(comment_document, post_id)
         comment = db.find_comment(comment_id, user['username'])
 
         if comment_id:
+            feed_cache.bump()
             return jsonify(
                 {
                     'data': serialize_comment(comment),
@@ -195,6 +439,7 @@ def comment():
 @feed_bp.route('/update_comment', methods=['PUT'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/feed/update_comment.yml')
 def update_comment():
     """ route for updating comments from a post """
@@ -206,7 +451,7 @@ def update_comment():
 
     # Get the current user
     user_id = get_jwt_identity()
-    user = db.find_user({"_id": ObjectId(user_id)})
+    user = user_cache.get(user_id)
 
     # comment id
     comment_id = data.get('comment_id')
@@ -233,6 +478,7 @@ def update_comment():
         updated_comment = db.update_comment(
             comment_id, user['username'], comment_body)
         if updated_comment:
+            feed_cache.bump()
             return jsonify(
                 {
                     'data': serialize_comment(updated_comment),
@@ -246,6 +492,7 @@ def update_comment():
 @feed_bp.route('/delete_comment', methods=['DELETE'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/feed/delete_comment.yml')
 def delete_comment():
     """ route for deleting comments from a post """
@@ -257,7 +504,7 @@ def delete_comment():
 
     # Get the current user
     user_id = get_jwt_identity()
-    user = db.find_user({"_id": ObjectId(user_id)})
+    user = user_cache.get(user_id)
 
     # comment id
     comment_id = data.get('comment_id')
@@ -270,16 +517,12 @@ def delete_comment():
     if not comment_id:
         return jsonify({"error": "Missing comment_id"}), 400
 
-    # Return the post associated with post_id
-    post = db.find_post({"_id": ObjectId(post_id)})
-
-    # Check if the post exist.
-    if post:
+    # Delete the comment, only if it belongs to the user and the post
+    deleted = db.delete_comment(comment_id, user['username'], post_id)
 
-        deleted = db.delete_comment(comment_id, user['username'], post_id)
-
-        if deleted:
-            return jsonify({"msg": "Comment deleted successfully."}), 200
+    if deleted:
+        feed_cache.bump()
+        return jsonify({"msg": "Comment deleted successfully."}), 200
 
     return jsonify({"error": "Post not found."}), 404
 
@@ -289,7 +532,7 @@ def delete_comment():
 @verify_token_in_redis
 @swag_from('../documentation/feed/post_comments.yml')
 def post_comments():
-    """ route for returing all the comments associated with a post """
+    """ route for returing a page of the comments associated with a post """
     # Get data from request
     data = request.get_json()
 
@@ -300,24 +543,92 @@ def post_comments():
     if not post_id:
         return jsonify({"error": "Missing post_id"}), 400
 
+    # Get the page size, bounded by COMMENTS_MAX_PAGE_SIZE
+    page_size = comments_page_size(data)
+    if page_size is None:
+        return jsonify(
+            {"error": "page_size must be a positive integer"}
+        ), 400
+
+    # Get the position of the page
+    after = None
+    cursor = data.get('cursor')
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'invalid cursor'}), 400
+
     # Return the post associated with post_id
     post = db.find_post({"_id": ObjectId(post_id)})
 
     # Check if the post exist.
     if post:
 
-        # Get comments from db
-        comments = db.get_post_comments(post_id)
+        # Get comments from db, with one extra comment to know
+        # whether a next page exists
+        comments = db.get_post_comments(
+            post_id, limit=page_size + 1, after=after
+        )
 
-        for i in range(len(comments)):
-            comments[i] = serialize_comment(comments[i])
+        comments, next_cursor = paginate_comments(comments, page_size)
 
         if comments:
             return jsonify(
                 {
                     'data': comments,
+                    'next_cursor': next_cursor,
                     "msg": "Comments retrieved successfully."
                 }
             ), 200
 
     return jsonify({"error": "Post not found."}), 404
+
+
+@feed_bp.route('/posts_comments', methods=['POST'])
+@jwt_required()
+@verify_token_in_redis
+@swag_from('../documentation/feed/posts_comments.yml')
+def posts_comments():
+    """ route for returning the first page of comments of several posts """
+    # Get data from request
+    data = request.get_json()
+
+    # Get the posts ids
+    post_ids = data.get('post_ids')
+
+    # Check if the posts ids are missing
+    if not post_ids or not isinstance(post_ids, list):
+        return jsonify({"error": "Missing post_ids"}), 400
+
+    if len(post_ids) > MAX_COMMENTED_POSTS:
+        return jsonify(
+            {"error": f"At most {MAX_COMMENTED_POSTS} post_ids are allowed"}
+        ), 400
+
+    if not all(isinstance(p, str) and ObjectId.is_valid(p)
+               for p in post_ids):
+        return jsonify({"error": "Invalid post_ids"}), 400
+
+    # Get the page size, bounded by COMMENTS_MAX_PAGE_SIZE
+    page_size = comments_page_size(data)
+    if page_size is None:
+        return jsonify(
+            {"error": "page_size must be a positive integer"}
+        ), 400
+
+    # Get the comments of every post at once, with one extra comment
+    # per post to know whether a next page exists
+    by_post = db.get_posts_comments(post_ids, limit=page_size + 1)
+
+    pages = {}
+    for post_id, comments in by_post.items():
+        comments, next_cursor = paginate_comments(comments, page_size)
+        pages[post_id] = {'data': comments, 'next_cursor': next_cursor}
+
+    return jsonify(
+        {
+            'data': pages,
+            "msg": "Comments retrieved successfully."
+        }
+    ), 200
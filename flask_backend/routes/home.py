@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 """The Home page routes
 """
-from bson import ObjectId
 from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from routes.auth import verify_token_in_redis
-from db import db, redis_client as rc
-from flask import Blueprint, jsonify, request
+from routes.rate_limit import rate_limit
+from db import (
+    activity,
+    db,
+    feed_cache,
+    job_queue,
+    leaderboard,
+    streaks,
+    timeline,
+    user_cache,
+)
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from routes.auth import verify_token_in_redis
-import os
 from flasgger import swag_from
 
 # Create home Blueprint
@@ -25,7 +33,7 @@ def home():
 
     # Get the user
     user_id = get_jwt_identity()
-    user = db.find_user({'_id': ObjectId(user_id)})
+    user = user_cache.get(user_id)
     if user:
         return jsonify({'user_id': user_id, 'username': user['username']}), 200
 
@@ -33,6 +41,7 @@ def home():
 @home_bp.route('/log', methods=['POST'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/home/log.yml')
 def log():
     """Log a new entry
@@ -40,31 +49,7 @@ def log():
 
     # Get the user
     user_id = get_jwt_identity()
-    user = db.find_user({'_id': ObjectId(user_id)})
-
-    # First, only allow one post in a 20h interval
-
-    # Current streak key in Redis
-    cs_key = f"{user['username']}_CS"
-
-    # Define 20h as the minimum interval between two entries (0 < ttl < 8h),
-    # or 1 minute for development, or 2 seconds for testing
-    if os.getenv('MODE') == 'DEV':
-        max_allowed_ttl = 60
-    elif os.getenv('MODE') == 'TEST':
-        max_allowed_ttl = 2
-    else:
-        max_allowed_ttl = 8 * 3600
-
-    # Check current streak
-    current_streak = rc.get(cs_key)
-    if not current_streak:
-        current_streak = 0
-    elif rc.ttl(cs_key) > max_allowed_ttl:
-        return jsonify({'error': 'Only one post per day is allowed',
-                        'ttl': rc.ttl(cs_key) - max_allowed_ttl}), 400
-    else:
-        current_streak = int(current_streak.decode('utf-8'))
+    user = user_cache.get(user_id)
 
     # Get data
     data = request.get_json()
@@ -76,7 +61,6 @@ def log():
         'title': data.get('title'),
         'content': data.get('content'),
         'is_public': data.get('is_public', False),
-        'likes': [],
         'number_of_likes': 0,
         'comments': [],
         'datePosted': datetime.utcnow()
@@ -89,42 +73,107 @@ def log():
     elif type(entry['is_public']) is not bool:
         return jsonify({'error': '`is_public` must be true or false'}), 400
 
+    # Only allow one post in a 20h interval, then reset the user's current
+    # streak for 28h: an entry is refused while it has more than 8h left
+    max_allowed_ttl = current_app.config['STREAK_MAX_ALLOWED_TTL']
+    streak_ttl = current_app.config['STREAK_TTL']
+
+    new_current_streak, wait = streaks.record_entry(
+        user['username'], max_allowed_ttl, streak_ttl
+    )
+    if wait:
+        return jsonify({'error': 'Only one post per day is allowed',
+                        'ttl': wait}), 400
+
+    # Rank the new current streak
+    leaderboard.record(user_id, new_current_streak, streak_ttl)
+
     # Store this log in MongoDB
     db.insert_post(entry)
 
+    # Mark the day in the user's activity
+    activity.mark(user_id, entry['datePosted'])
+
+    # Show it in the public timeline
+    if entry['is_public']:
+        timeline.add(entry['_id'], entry['datePosted'])
+        feed_cache.bump()
+
     # Make response
     response = entry.copy()
     response['_id'] = str(response['_id'])
     response['user_id'] = str(response['user_id'])
     del response['number_of_likes']
-    del response['likes']
     del response['comments']
 
     time_fmt = '%Y/%m/%d %H:%M:%S'
     response['datePosted'] = response['datePosted'].strftime(time_fmt)
 
-    # Response will return if the user marks a new longest streak
-    response['new_record'] = False
-
-    # Reset user's current streak key in Redis for 28h,
-    # or 2 minutes for development, or 4 seconds for testing
-    new_current_streak = current_streak + 1
-    if os.getenv('MODE') == 'DEV':
-        rc.setex(cs_key, 120, new_current_streak)
-    elif os.getenv('MODE') == 'TEST':
-        rc.setex(cs_key, 4, new_current_streak)
-    else:
-        rc.setex(cs_key, 28 * 3600, new_current_streak)
-
-    # Update user's longest streak if applicable
-    new_longest_streak = user['longest_streak']
-    if new_current_streak > new_longest_streak:
-        new_longest_streak = new_current_streak
-        response['new_record'] = True
-
-    db.update_user_info(user_id, {
-        'longest_streak': new_longest_streak
-    })
+    # Update user's longest streak, and tell if it is a new record
+    response['new_record'] = db.update_longest_streak(
+        user_id, new_current_streak
+    )
 
     # Return response
     return jsonify(response), 201
+
+
+@home_bp.route('/leaderboard')
+@jwt_required()
+@verify_token_in_redis
+@swag_from('../documentation/home/leaderboard.yml')
+def get_leaderboard():
+    """Get the users with the best current or longest streaks
+    """
+
+    # Get the board
+    board = request.args.get('board', 'current')
+    if board not in leaderboard.BOARDS:
+        return jsonify({'error': 'board must be current or longest'}), 400
+
+    # Get the number of users, bounded by LEADERBOARD_MAX_SIZE
+    limit = request.args.get('limit', current_app.config['LEADERBOARD_SIZE'])
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+
+    if limit < 1:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    limit = min(limit, current_app.config['LEADERBOARD_MAX_SIZE'])
+
+    # Rank the users, with their usernames fetched in one query
+    top = leaderboard.top(board, limit)
+    usernames = db.find_usernames([user_id for user_id, _ in top])
+
+    response = [
+        {
+            'rank': rank,
+            'user_id': user_id,
+            'username': usernames[user_id],
+            'streak': streak
+        }
+        for rank, (user_id, streak) in enumerate(top, 1)
+        if user_id in usernames
+    ]
+
+    # Return response
+    return jsonify(response)
+
+
+@home_bp.route('/jobs/<job_id>')
+@jwt_required()
+@rate_limit
+@swag_from('../documentation/home/get_job.yml')
+def get_job(job_id):
+    """Get the progress of a background job started by the user
+    """
+
+    # The sessions of a deleted account are ended, but its token still
+    # follows the deletion: only the token's signature is checked
+    job = job_queue.status(job_id, owner=get_jwt_identity())
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    # Return response
+    return jsonify(job)
@@ -4,10 +4,23 @@
 from bson import ObjectId
 from flask import Blueprint, jsonify, request
 from datetime import datetime
-from db import db, redis_client as rc
+from db import (
+    activity,
+    db,
+    feed_cache,
+    job_queue,
+    leaderboard,
+    redis_client as rc,
+    sessions,
+    streaks,
+    timeline,
+    user_cache,
+)
+from db.db_manager import DuplicateUserError
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from routes.auth import verify_token_in_redis
-from routes.feed import serialize_comment
+from routes.rate_limit import rate_limit
+from routes.feed import mark_liked_posts, serialize_feed
 from flasgger import swag_from
 
 # Create profile Blueprint
@@ -26,7 +39,7 @@ def get_infos():
 
     # Get the user
     user_id = get_jwt_identity()
-    user = db.find_user({'_id': ObjectId(user_id)})
+    user = user_cache.get(user_id)
 
     # Return response
     response = {'email': user['email'], 'username': user['username']}
@@ -43,13 +56,13 @@ def get_streaks():
 
     # Get the user
     user_id = get_jwt_identity()
-    user = db.find_user({'_id': ObjectId(user_id)})
+    user = user_cache.get(user_id)
 
     # Get longest streak
     longest_streak = user['longest_streak']
 
     # Get current streak
-    cs_key = user['username'] + '_CS'
+    cs_key = streaks.key(user['username'])
     current_streak = rc.get(cs_key)
 
     if not current_streak:
@@ -67,6 +80,40 @@ def get_streaks():
     return jsonify(response)
 
 
+@profile_bp.route('/rank')
+@jwt_required()
+@verify_token_in_redis
+@swag_from('../documentation/profile/get_rank.yml')
+def get_rank():
+    """Get user's rank by current and longest streak
+    """
+
+    # Return response
+    return jsonify(leaderboard.rank(get_jwt_identity()))
+
+
+@profile_bp.route('/activity')
+@jwt_required()
+@verify_token_in_redis
+@swag_from('../documentation/profile/get_activity.yml')
+def get_activity():
+    """Get user's daily activity and streaks of a year
+    """
+
+    # Get the year, the current one by default
+    year = request.args.get('year', str(datetime.utcnow().year))
+    try:
+        year = int(year)
+    except ValueError:
+        return jsonify({'error': 'year argument must be an integer'}), 400
+
+    if not 1970 <= year <= 9999:
+        return jsonify({'error': 'year must be between 1970 and 9999'}), 400
+
+    # Return response
+    return jsonify(activity.year(get_jwt_identity(), year))
+
+
 @profile_bp.route('/posts')
 @jwt_required()
 @verify_token_in_redis
@@ -78,18 +125,12 @@ def get_posts():
     # Get the user_id
     user_id = get_jwt_identity()
 
-    # Return posts
-    posts = db.find_user_posts(user_id)
-
-    # Sort posts from the most to the less recent
-    posts.sort(key=lambda x: x['datePosted'], reverse=True)
+    # Return posts, from the most to the less recent
+    posts = mark_liked_posts(serialize_feed(db.find_user_feed(user_id)))
 
     for p in posts:
         del p['_id']
         del p['user_id']
-        p['datePosted'] = p['datePosted'].strftime('%Y/%m/%d %H:%M:%S')
-        for i in range(len(p['comments'])):
-            p['comments'][i] = serialize_comment(p['comments'][i])
 
     return jsonify(posts)
 
@@ -99,6 +140,7 @@ def get_posts():
 @profile_bp.route('/update_post', methods=['PUT'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/profile/update_post.yml')
 def update_post():
     """Update a user's post
@@ -140,6 +182,13 @@ def update_post():
                       'content': content, 'is_public': is_public}
     db.update_post(post_id, user_id, updated_fields)
 
+    # Keep the public timeline and the cached feed in sync with the post
+    if is_public:
+        timeline.add(post_id, post['datePosted'])
+    else:
+        timeline.remove(post_id)
+    feed_cache.bump()
+
     # Return response
     return jsonify({'success': 'post updated'}), 201
 
@@ -147,6 +196,7 @@ def update_post():
 @profile_bp.route('/update_infos', methods=['PUT'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/profile/update_infos.yml')
 def update_infos():
     """Update the user's infos
@@ -165,7 +215,20 @@ def update_infos():
             return jsonify({'error': 'Only update email and/or username'}), 400
 
     # Update the user's infos
-    db.update_user_info(user_id, data)
+    user = user_cache.get(user_id)
+    try:
+        updated = db.update_user_info(user_id, data)
+    except DuplicateUserError as e:
+        return jsonify({'error': f'{e.field.capitalize()} already used'}), 400
+
+    # Copy a new username to the user's posts and comments in the
+    # background, and keep the user's current streak
+    new_username = data.get('username')
+    if updated and new_username and new_username != user['username']:
+        streaks.rename(user['username'], new_username)
+        job_id = job_queue.enqueue('rename_user', owner=user_id,
+                                   user_id=user_id)
+        return jsonify({'success': 'user updated', 'job_id': job_id}), 202
 
     # Return response
     return jsonify({'success': 'user updated'}), 201
@@ -174,6 +237,7 @@ def update_infos():
 @profile_bp.route('/update_password', methods=['PUT'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/profile/update_password.yml')
 def update_password():
     """Update the user's password
@@ -213,6 +277,7 @@ def update_password():
 @profile_bp.route('/delete_post', methods=['DELETE'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/profile/delete_post.yml')
 def delete_post():
     """Delete a user's post
@@ -232,6 +297,8 @@ def delete_post():
         return jsonify({'error': 'You have no post with this post_id'}), 400
 
     if db.delete_post(post_id, user_id) is True:
+        timeline.remove(post_id)
+        feed_cache.bump()
         return jsonify({'success': 'deleted post'}), 200
     else:
         return jsonify({'error': 'something went wrong'}), 500
@@ -240,6 +307,7 @@ def delete_post():
 @profile_bp.route('/delete_user', methods=['DELETE'])
 @jwt_required()
 @verify_token_in_redis
+@rate_limit
 @swag_from('../documentation/profile/delete_user.yml')
 def delete_user():
     """Delete a user's account
@@ -248,7 +316,16 @@ def delete_user():
     # Get the user_id
     user_id = get_jwt_identity()
 
-    if db.delete_user(user_id) is True:
-        return jsonify({'success': 'account deleted'}), 200
+    # Hide the user right away, and end the user's sessions
+    if db.mark_user_deleted(user_id) is True:
+        sessions.end_all(user_id)
+        leaderboard.remove(user_id)
+        feed_cache.bump()
+
+        # Delete the user's posts, comments and likes in the background
+        job_id = job_queue.enqueue('delete_user', owner=user_id,
+                                   user_id=user_id)
+        return jsonify({'success': 'account deletion started',
+                        'job_id': job_id}), 202
     else:
         return jsonify({'error': 'something went wrong'}), 500
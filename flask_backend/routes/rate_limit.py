@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Rate limiting of the routes
+"""
+from db import rate_limiter
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from functools import wraps
+import math
+
+
+def rate_limit(func):
+    """Decorator limiting the requests of each client to a route, with
+    the limit of its blueprint in RATE_LIMITS
+
+    Clients are limited by their IP address, and also by their JWT
+    identity on protected routes, where it must be placed after
+    jwt_required: a request is rejected once either is out of requests
+    """
+
+    @wraps(func)
+    def limited(*args, **kwargs):
+        if not current_app.config['RATE_LIMIT_ENABLED']:
+            return func(*args, **kwargs)
+
+        scope = request.blueprint
+        limit, period = current_app.config['RATE_LIMITS'][scope]
+
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            # Public route, without JWT
+            identity = None
+
+        client_keys = [f'ip:{request.remote_addr}']
+        if identity:
+            client_keys.append(f'user:{identity}')
+
+        wait = rate_limiter.hit(scope, client_keys, limit, period)
+        if wait:
+            response = jsonify({'error': 'Too many requests'})
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response, 429
+
+        return func(*args, **kwargs)
+
+    return limited
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Tasks of the background jobs, run by `flask worker`
+"""
+from bson import ObjectId
+from db import db, feed_cache, timeline
+from db.job_queue import Job
+from typing import Callable, List, Optional, Sequence, Tuple
+
+# Documents processed per batch
+BATCH_SIZE = 500
+
+# A step processes the batch of documents after an _id, and returns their
+# _ids, empty once it is done
+Step = Callable[[Optional[ObjectId]], List[ObjectId]]
+
+
+def run_steps(job: Job, steps: Sequence[Tuple[str, Step]]) -> None:
+    """Run each step until it is done, from the job's checkpoint
+    """
+    names = [name for name, _ in steps]
+    start, after = 0, None
+    if job.checkpoint:
+        name, last_id = job.checkpoint.split(':')
+        start, after = names.index(name), ObjectId(last_id)
+
+    for name, step in steps[start:]:
+        while True:
+            batch = step(after)
+            if not batch:
+                break
+            after = batch[-1]
+            job.progress(f'{name}:{after}', len(batch))
+        after = None
+
+
+def delete_user(job: Job) -> None:
+    """Delete a user's comments, likes and posts, then the user
+    """
+    user_id = job.args['user_id']
+
+    def delete_posts(after: Optional[ObjectId]) -> List[ObjectId]:
+        batch = db.delete_user_posts_batch(user_id, after, BATCH_SIZE)
+        if batch:
+            timeline.remove(*map(str, batch))
+            feed_cache.bump()
+        return batch
+
+    run_steps(job, [
+        ('comments', lambda after: db.delete_user_comments_batch(
+            user_id, after, BATCH_SIZE)),
+        ('likes', lambda after: db.delete_user_likes_batch(
+            user_id, after, BATCH_SIZE)),
+        ('posts', delete_posts),
+    ])
+
+    if not db.delete_user(user_id):
+        raise RuntimeError(f'Could not delete user {user_id}')
+    feed_cache.bump()
+
+
+def rename_user(job: Job) -> None:
+    """Copy a user's current username to the user's posts and comments
+    """
+    user_id = job.args['user_id']
+    user = db.find_user_by_id(user_id)
+    if user is None:
+        # Deleted since
+        return
+    username = user['username']
+
+    run_steps(job, [
+        ('posts', lambda after: db.rename_user_posts_batch(
+            user_id, username, after, BATCH_SIZE)),
+        ('comments', lambda after: db.rename_user_comments_batch(
+            user_id, username, after, BATCH_SIZE)),
+    ])
+    feed_cache.bump()
+
+
+# Tasks by name
+TASKS = {
+    'delete_user': delete_user,
+    'rename_user': rename_user,
+}
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the guard of the benchmarks.
+"""
+import unittest
+from benchmarks import require_disposable
+from db import db
+from redis import Redis
+from unittest.mock import patch
+import benchmarks.delete_comment as delete_comment
+
+
+class TestRequireDisposable(unittest.TestCase):
+    """ Defines a class for testing require_disposable. """
+
+    def test_disposable_databases(self):
+        """ Test running against the test databases """
+        require_disposable()
+        require_disposable(redis=True)
+
+    def test_app_database(self):
+        """ Test that the app's databases are refused, whatever MODE is """
+        for name in ('swe_journal', 'swe_journal_dev'):
+            with patch.object(db, '_db', db._client[name]):
+                with self.assertRaises(SystemExit) as cm:
+                    require_disposable()
+                self.assertIn(name, str(cm.exception.code))
+
+    def test_app_redis_db(self):
+        """ Test that the app's Redis dbs are refused if Redis is wiped """
+        for redis_db in (0, 2):
+            with patch('benchmarks.redis_client', Redis(db=redis_db)):
+                require_disposable()
+                with self.assertRaises(SystemExit) as cm:
+                    require_disposable(redis=True)
+                self.assertIn(f'Redis db {redis_db}', str(cm.exception.code))
+
+
+class TestDeleteCommentBenchmark(unittest.TestCase):
+    """ Defines a class for testing the guard of the comments benchmark. """
+
+    def test_refuse_app_database(self):
+        """ Test that the benchmark exits before clearing the app's
+        database, even with MODE=TEST
+        """
+        with patch.object(db, '_db', db._client['swe_journal']), \
+                patch.object(db, 'clear_db') as clear_db, \
+                patch('sys.argv', ['delete_comment']):
+            with self.assertRaises(SystemExit):
+                delete_comment.main()
+
+        clear_db.assert_not_called()
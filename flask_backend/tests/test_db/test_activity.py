@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the users' activity bitmaps.
+"""
+import unittest
+from datetime import datetime
+from db.activity import Activity
+from fakeredis import FakeRedis
+
+
+class FakeStorage:
+    """ Stand-in for DBStorage.iter_posts_dates """
+
+    def __init__(self, posts):
+        self.posts = posts
+
+    def iter_posts_dates(self, batch_size=1000):
+        return iter(self.posts)
+
+
+class TestActivity(unittest.TestCase):
+    """ Defines a class for testing Activity on a local Redis. """
+
+    def setUp(self):
+        """ Create an activity store on a fresh fake Redis """
+        self.redis = FakeRedis()
+        self.activity = Activity(self.redis)
+
+    def test_year_without_activity(self):
+        """ Test the activity of a year without entries """
+        result = self.activity.year('u1', 2023)
+
+        self.assertEqual(result['year'], 2023)
+        self.assertEqual(result['days'], [0] * 365)
+        self.assertEqual(result['active_days'], 0)
+        self.assertEqual(result['streaks'], [])
+        self.assertEqual(result['longest_streak'], 0)
+
+    def test_year_streaks(self):
+        """ Test the days and streaks of a year """
+        for day in (1, 2, 3, 10, 11):
+            self.activity.mark('u1', datetime(2024, 1, day, 12))
+        self.activity.mark('u1', datetime(2024, 12, 31, 23, 59))
+        self.activity.mark('u2', datetime(2024, 1, 5))
+        self.activity.mark('u1', datetime(2025, 1, 1))
+
+        result = self.activity.year('u1', 2024)
+
+        self.assertEqual(len(result['days']), 366)
+        self.assertEqual(
+            [i for i, day in enumerate(result['days']) if day],
+            [0, 1, 2, 9, 10, 365]
+        )
+        self.assertEqual(result['active_days'], 6)
+        self.assertEqual(result['streaks'], [
+            {'start': '2024-01-01', 'length': 3},
+            {'start': '2024-01-10', 'length': 2},
+            {'start': '2024-12-31', 'length': 1}
+        ])
+        self.assertEqual(result['longest_streak'], 3)
+
+    def test_mark_is_idempotent(self):
+        """ Test that several entries of a day count once """
+        self.activity.mark('u1', datetime(2024, 3, 1, 8))
+        self.activity.mark('u1', datetime(2024, 3, 1, 20))
+
+        self.assertEqual(self.activity.year('u1', 2024)['active_days'], 1)
+
+    def test_rebuild(self):
+        """ Test rebuilding the bitmaps from the posts """
+        storage = FakeStorage([
+            {'user_id': 'u1', 'datePosted': datetime(2024, 2, day)}
+            for day in range(1, 6)
+        ] + [{'user_id': 'u2', 'datePosted': datetime(2023, 7, 4)}])
+
+        self.assertEqual(self.activity.rebuild(storage, batch_size=2), 6)
+
+        self.assertEqual(
+            self.activity.year('u1', 2024)['streaks'],
+            [{'start': '2024-02-01', 'length': 5}]
+        )
+        self.assertEqual(self.activity.year('u2', 2023)['active_days'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
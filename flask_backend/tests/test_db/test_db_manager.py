@@ -6,8 +6,10 @@ import unittest
 from unittest.mock import patch
 import mongomock
 from db import db
+from db.db_manager import DuplicateUserError
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta
+from threading import Thread
 
 
 class TestDBStorage(unittest.TestCase):
@@ -43,6 +45,24 @@ class TestDBStorage(unittest.TestCase):
 
         self.assertFalse('password' in inserted_doc)
 
+    def test_insert_duplicate_user(self):
+        """Test that used emails and usernames are rejected"""
+        self.db.insert_user({'username': 'Mohamed',
+                             'email': 'mohamed@example.com',
+                             'password': 'password123'})
+
+        with self.assertRaises(DuplicateUserError) as cm:
+            self.db.insert_user({'username': 'Other',
+                                 'email': 'mohamed@example.com',
+                                 'password': 'password123'})
+        self.assertEqual(cm.exception.field, 'email')
+
+        with self.assertRaises(DuplicateUserError) as cm:
+            self.db.insert_user({'username': 'Mohamed',
+                                 'email': 'other@example.com',
+                                 'password': 'password123'})
+        self.assertEqual(cm.exception.field, 'username')
+
     def test_update_user_info(self):
         """ Test updating user's info. """
         user_document = {
@@ -64,6 +84,22 @@ class TestDBStorage(unittest.TestCase):
         self.assertEqual(inserted_doc['email'], 'mohamed@example.com')
         self.assertEqual(inserted_doc['longest_streak'], 2)
 
+    def test_update_user_info_to_used_username(self):
+        """ Test updating user's username to another user's. """
+        self.db.insert_user({'username': 'Mohamed',
+                             'email': 'mohamed@example.com',
+                             'password': 'password123'})
+        inserted_id = self.db.insert_user({'username': 'Other',
+                                           'email': 'other@example.com',
+                                           'password': 'password123'})
+
+        with self.assertRaises(DuplicateUserError) as cm:
+            self.db.update_user_info(inserted_id, {
+                'email': 'other@example.com',
+                'username': 'Mohamed'
+            })
+        self.assertEqual(cm.exception.field, 'username')
+
     def test_update_user_password(self):
         """ Test updating user's password. """
         user_document = {
@@ -251,6 +287,106 @@ class TestDBStorage(unittest.TestCase):
         self.assertEqual(posts[0]['user_id'], str(inserted_user_id))
         self.assertEqual(posts[1]['user_id'], str(inserted_user_id))
 
+    def test_find_public_posts(self):
+        """ Test finding a page of public posts. """
+        now = datetime.utcnow()
+        for i in range(10):
+            self.db.insert_post({
+                'user_id': str(ObjectId()),
+                'title': f'Post {i} title',
+                'content': f'Post {i} content',
+                'is_public': i % 2 == 0,
+                'datePosted': now + timedelta(minutes=i)
+            })
+
+        posts = self.db.find_public_posts()
+        self.assertEqual(len(posts), 5)
+        self.assertTrue(all(p['is_public'] for p in posts))
+        self.assertEqual(
+            [p['title'] for p in posts],
+            [f'Post {i} title' for i in (8, 6, 4, 2, 0)]
+        )
+
+        page = self.db.find_public_posts(skip=2, limit=2)
+        self.assertEqual(
+            [p['title'] for p in page],
+            ['Post 4 title', 'Post 2 title']
+        )
+        self.assertEqual(self.db.count_public_posts(), 5)
+
+
+class TestLike(unittest.TestCase):
+    """ Tests for liking and unliking a post document """
+
+    def setUp(self):
+        """ Insert a post before each test """
+        self.db = db
+        self.db.ensure_indexes()
+        self.user_id = ObjectId()
+        self.post_id = self.db.insert_post({
+            'user_id': str(ObjectId()),
+            'title': 'Post title',
+            'content': 'Post content',
+            'number_of_likes': 0,
+        })
+
+    def tearDown(self):
+        """ Clean up the database after each test """
+        self.db.clear_db()
+
+    def test_like_and_unlike(self):
+        """ Test the result codes of liking and unliking """
+        self.assertEqual(self.db.like_post(self.user_id, self.post_id), 0)
+        self.assertEqual(self.db.like_post(self.user_id, self.post_id), -2)
+        self.assertEqual(self.db.like_post(self.user_id, ObjectId()), -1)
+
+        post = self.db.find_post({'_id': self.post_id})
+        self.assertEqual(post['number_of_likes'], 1)
+        self.assertEqual(
+            self.db.find_liked_post_ids(self.user_id, [self.post_id]),
+            {str(self.post_id)}
+        )
+
+        self.assertEqual(self.db.unlike_post(self.user_id, self.post_id), 0)
+        self.assertEqual(self.db.unlike_post(self.user_id, self.post_id), -2)
+        self.assertEqual(self.db.unlike_post(self.user_id, ObjectId()), -1)
+
+        post = self.db.find_post({'_id': self.post_id})
+        self.assertEqual(post['number_of_likes'], 0)
+        self.assertEqual(
+            self.db.find_liked_post_ids(self.user_id, [self.post_id]),
+            set()
+        )
+
+    def test_concurrent_likes(self):
+        """ Test that a like counts once under concurrent requests """
+        results = []
+
+        def like():
+            results.append(self.db.like_post(self.user_id, self.post_id))
+
+        threads = [Thread(target=like) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(results), [-2] * 9 + [0])
+        post = self.db.find_post({'_id': self.post_id})
+        self.assertEqual(post['number_of_likes'], 1)
+
+    def test_find_liked_post_ids(self):
+        """ Test looking up the liked posts of a page at once """
+        other_post_id = self.db.insert_post({'title': 'Other post'})
+        self.db.like_post(self.user_id, self.post_id)
+        self.db.like_post(ObjectId(), other_post_id)
+
+        liked = self.db.find_liked_post_ids(
+            self.user_id,
+            [self.post_id, other_post_id]
+        )
+        self.assertEqual(liked, {str(self.post_id)})
+
 
 class TestComment(unittest.TestCase):
     """ Tests for the comment document """
@@ -415,20 +551,124 @@ class TestComment(unittest.TestCase):
         self.assertEqual(post['number_of_comments'], 0)
         self.assertEqual(len(post['comments']), 0)
 
+    def test_delete_comment_refills_preview(self):
+        """ Test that deleting a previewed comment puts the next latest
+        one back in the preview
+        """
+        start = datetime.utcnow()
+        comment_ids = [
+            str(self.db.insert_comment({
+                'user_id': self.inserted_user_id,
+                'username': self.user_document['username'],
+                'body': f'Comment {i}',
+                'post_id': self.inserted_post_id,
+                'date_posted': start + timedelta(seconds=i)
+            }, self.inserted_post_id))
+            for i in range(5)
+        ]
+
+        def preview():
+            post = self.db.find_post({'_id': self.inserted_post_id})
+            return [c['_id'] for c in post['comments']]
+
+        self.assertEqual(preview(), comment_ids[2:])
+
+        # The preview is left alone when an older comment is deleted
+        self.db.delete_comment(comment_ids[0],
+                               self.user_document['username'],
+                               self.inserted_post_id)
+        self.assertEqual(preview(), comment_ids[2:])
+
+        self.db.delete_comment(comment_ids[4],
+                               self.user_document['username'],
+                               self.inserted_post_id)
+        self.assertEqual(preview(), comment_ids[1:4])
+
+        self.db.delete_comment(comment_ids[2],
+                               self.user_document['username'],
+                               self.inserted_post_id)
+        self.assertEqual(preview(), [comment_ids[1], comment_ids[3]])
+        post = self.db.find_post({'_id': self.inserted_post_id})
+        self.assertEqual(post['number_of_comments'], 2)
+
+    def test_delete_comment_not_deleted(self):
+        """ Test that the post is left untouched when nothing is deleted """
+        comment_id = self.db.insert_comment({
+            'user_id': self.inserted_user_id,
+            'username': self.user_document['username'],
+            'body': 'Comment',
+            'post_id': self.inserted_post_id
+        }, self.inserted_post_id)
+        other_post_id = self.db.insert_post({
+            'title': 'Other post',
+            'number_of_comments': 1,
+            'comments': []
+        })
+
+        # Another user's comment, another post's comment, a missing comment
+        for args in [
+            (comment_id, self.second_user_document['username'],
+             self.inserted_post_id),
+            (comment_id, self.user_document['username'], other_post_id),
+            (ObjectId(), self.user_document['username'],
+             self.inserted_post_id),
+        ]:
+            self.assertFalse(self.db.delete_comment(str(args[0]), *args[1:]))
+
+        post = self.db.find_post({'_id': self.inserted_post_id})
+        other_post = self.db.find_post({'_id': other_post_id})
+        self.assertEqual(post['number_of_comments'], 1)
+        self.assertEqual(len(post['comments']), 1)
+        self.assertEqual(other_post['number_of_comments'], 1)
+
+    def test_comments_preview(self):
+        """ Test that posts only embed their latest comments """
+        comment_ids = []
+        for i in range(5):
+            comment_ids.append(self.db.insert_comment({
+                'user_id': self.inserted_user_id,
+                'username': self.user_document['username'],
+                'body': f'Comment {i}',
+                'post_id': self.inserted_post_id
+            }, self.inserted_post_id))
+
+        post = self.db.find_post({'_id': self.inserted_post_id})
+        self.assertEqual(post['number_of_comments'], 5)
+        self.assertEqual([c['_id'] for c in post['comments']],
+                         [str(c) for c in comment_ids[2:]])
+
+        # Updating a comment updates its preview
+        self.db.update_comment(
+            comment_ids[4], self.user_document['username'], 'Edited'
+        )
+        post = self.db.find_post({'_id': self.inserted_post_id})
+        self.assertEqual(post['comments'][2]['body'], 'Edited')
+
+        # Deleting a comment out of the preview still uncounts it
+        self.assertTrue(self.db.delete_comment(
+            str(comment_ids[0]),
+            self.user_document['username'],
+            self.inserted_post_id
+        ))
+        post = self.db.find_post({'_id': self.inserted_post_id})
+        self.assertEqual(post['number_of_comments'], 4)
+        self.assertEqual(len(post['comments']), 3)
+
     def test_get_post_comments(self):
         """ Test to return all comments associated with a post """
         comment_document_1 = {
             'user_id': self.inserted_user_id,
             'username': self.user_document['username'],
             'body': 'Second comment',
-            'post_id': self.inserted_post_id
-
+            'post_id': self.inserted_post_id,
+            'date_posted': datetime.utcnow()
         }
         comment_document_2 = {
             'user_id': self.inserted_second_user_id,
             'username': self.second_user_document['username'],
             'body': 'Second comment',
-            'post_id': self.inserted_post_id
+            'post_id': self.inserted_post_id,
+            'date_posted': datetime.utcnow() + timedelta(seconds=1)
         }
         comment_id_1 = self.db.insert_comment(
             comment_document_1, self.inserted_post_id
@@ -450,6 +690,16 @@ class TestComment(unittest.TestCase):
 
         self.assertEqual(len(comments), 2)
 
+        # Paginate after the first comment
+        first = comments[0]
+        comments = self.db.get_post_comments(
+            post['_id'],
+            limit=1,
+            after=(first['date_posted'], ObjectId(first['_id']))
+        )
+
+        self.assertEqual([c['_id'] for c in comments], [str(comment_id_2)])
+
     def test_delete_comments_post(self):
         """ Test for removing all comments associated with a post
         when the post is deleted"""
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the feed's pages cache.
+"""
+import unittest
+from db import redis_client as rc, feed_cache
+from threading import Thread
+import time
+
+
+class TestFeedCache(unittest.TestCase):
+    """ Defines a class for testing FeedCache. """
+
+    def setUp(self):
+        """ Count the pages builds before each test """
+        self.builds = 0
+
+    def tearDown(self):
+        """ Clean up Redis after each test """
+        rc.flushdb()
+
+    def build(self) -> bytes:
+        """ Render a dummy page slowly """
+        self.builds += 1
+        time.sleep(0.2)
+        return f'page {self.builds}'.encode()
+
+    def test_page_is_cached(self):
+        """ Test that a page is built once then served from the cache """
+        self.assertEqual(feed_cache.get_or_build('page:1', self.build),
+                         b'page 1')
+        self.assertEqual(feed_cache.get_or_build('page:1', self.build),
+                         b'page 1')
+        self.assertEqual(self.builds, 1)
+
+    def test_bump_invalidates_pages(self):
+        """ Test that bumping the version rebuilds the pages """
+        feed_cache.get_or_build('page:1', self.build)
+        feed_cache.bump()
+
+        self.assertEqual(feed_cache.get_or_build('page:1', self.build),
+                         b'page 2')
+        self.assertEqual(self.builds, 2)
+
+    def test_concurrent_misses_build_once(self):
+        """ Test that concurrent misses wait for a single build """
+        pages = []
+
+        def read():
+            pages.append(feed_cache.get_or_build('page:1', self.build))
+
+        threads = [Thread(target=read) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(pages, [b'page 1'] * 8)
+
+    def test_concurrent_misses_serve_stale_page(self):
+        """ Test that concurrent misses serve the stale page if any """
+        feed_cache.get_or_build('page:1', self.build)
+        feed_cache.bump()
+        pages = []
+
+        def read():
+            pages.append(feed_cache.get_or_build('page:1', self.build))
+
+        threads = [Thread(target=read) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(sorted(pages), [b'page 1'] * 7 + [b'page 2'])
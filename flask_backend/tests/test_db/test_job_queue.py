@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the Redis job queue.
+"""
+import unittest
+from db.job_queue import JobQueue
+from fakeredis import FakeRedis
+
+
+class TestJobQueue(unittest.TestCase):
+    """ Defines a class for testing JobQueue on a local Redis. """
+
+    def setUp(self):
+        """ Create a job queue on a fresh fake Redis """
+        self.redis = FakeRedis()
+        self.queue = JobQueue(self.redis, max_attempts=3, retry_delay=0)
+        self.runs = []
+
+    def record(self, job):
+        """ Task recording its arguments """
+        self.runs.append(job.args)
+
+    def test_enqueue_and_work(self):
+        """ Test running the queued jobs in order """
+        first = self.queue.enqueue('record', n=1)
+        second = self.queue.enqueue('record', n=2)
+        self.assertEqual(self.queue.status(first)['status'], 'queued')
+
+        self.assertEqual(self.queue.work({'record': self.record},
+                                         burst=True), 2)
+
+        self.assertEqual(self.runs, [{'n': 1}, {'n': 2}])
+        for job_id in (first, second):
+            status = self.queue.status(job_id)
+            self.assertEqual(status['status'], 'done')
+            self.assertEqual(status['attempts'], 1)
+        self.assertGreater(self.redis.ttl(JobQueue.key(first)), 0)
+        self.assertIsNone(self.queue.status('unknown'))
+
+    def test_owner(self):
+        """ Test that only the owner of a job reads its state """
+        job_id = self.queue.enqueue('record', owner='user1', n=1)
+
+        self.assertEqual(self.queue.status(job_id, owner='user1')['status'],
+                         'queued')
+        self.assertIsNone(self.queue.status(job_id, owner='user2'))
+        self.assertIsNotNone(self.queue.status(job_id))
+
+        self.queue.work({'record': self.record}, burst=True)
+        self.assertEqual(self.runs, [{'n': 1}])
+
+    def test_retry_resumes_from_checkpoint(self):
+        """ Test that a failed job is retried from its progress """
+        def flaky(job):
+            start = int(job.checkpoint or 0)
+            for i in range(start + 1, 5):
+                self.runs.append(i)
+                if self.runs == [1, 2, 3]:
+                    raise ValueError('Lost connection')
+                job.progress(str(i), 1)
+
+        job_id = self.queue.enqueue('flaky')
+        self.queue.work({'flaky': flaky}, burst=True)
+
+        self.assertEqual(self.runs, [1, 2, 3, 3, 4])
+        status = self.queue.status(job_id)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['attempts'], 2)
+        self.assertEqual(status['done'], 4)
+        self.assertIn('Lost connection', status['error'])
+
+    def test_fails_after_max_attempts(self):
+        """ Test that a job failing every time is given up """
+        def broken(job):
+            self.runs.append(job.id)
+            raise ValueError('Broken')
+
+        job_id = self.queue.enqueue('broken')
+        self.queue.work({'broken': broken}, burst=True)
+
+        self.assertEqual(len(self.runs), 3)
+        self.assertEqual(self.queue.status(job_id)['status'], 'failed')
+        self.assertEqual(self.redis.zcard(JobQueue.DELAYED_KEY), 0)
+
+    def test_retry_waits_for_its_delay(self):
+        """ Test that a retry is not run before its delay """
+        queue = JobQueue(self.redis, max_attempts=2, retry_delay=60)
+
+        def broken(job):
+            raise ValueError('Broken')
+
+        job_id = queue.enqueue('broken')
+        self.assertEqual(queue.work({'broken': broken}, burst=True), 1)
+
+        self.assertEqual(queue.status(job_id)['status'], 'retrying')
+        self.assertEqual(self.redis.zcard(JobQueue.DELAYED_KEY), 1)
+
+    def test_recovers_jobs_of_a_stopped_worker(self):
+        """ Test that a worker runs again the job it was running """
+        job_id = self.queue.enqueue('record', n=1)
+        self.redis.lmove(JobQueue.QUEUE_KEY, JobQueue.processing_key('w1'),
+                         'RIGHT', 'LEFT')
+
+        self.assertEqual(self.queue.work({'record': self.record},
+                                         worker='w1', burst=True), 1)
+
+        self.assertEqual(self.runs, [{'n': 1}])
+        self.assertEqual(self.queue.status(job_id)['status'], 'done')
+        self.assertEqual(self.redis.llen(JobQueue.processing_key('w1')), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the streak leaderboards.
+"""
+import unittest
+from db.leaderboard import Leaderboard
+from fakeredis import FakeRedis
+import time
+
+
+class FakeStorage:
+    """ Stand-in for DBStorage.iter_longest_streaks """
+
+    def __init__(self, users):
+        self.users = users
+
+    def iter_longest_streaks(self, batch_size=1000):
+        return iter(self.users)
+
+
+class TestLeaderboard(unittest.TestCase):
+    """ Defines a class for testing Leaderboard on a local Redis. """
+
+    def setUp(self):
+        """ Create a leaderboard on a fresh fake Redis """
+        self.redis = FakeRedis()
+        self.leaderboard = Leaderboard(self.redis)
+
+    def test_top(self):
+        """ Test ranking users by current and longest streak """
+        self.leaderboard.record('u1', 3, 60)
+        self.leaderboard.record('u2', 5, 60)
+        self.leaderboard.record('u3', 1, 60)
+
+        self.assertEqual(self.leaderboard.top('current', 2),
+                         [('u2', 5), ('u1', 3)])
+        self.assertEqual(self.leaderboard.top('longest', 10),
+                         [('u2', 5), ('u1', 3), ('u3', 1)])
+
+    def test_longest_only_grows(self):
+        """ Test that a restarted streak keeps the longest one """
+        self.leaderboard.record('u1', 4, 60)
+        self.leaderboard.record('u1', 1, 60)
+
+        self.assertEqual(self.leaderboard.top('current', 10), [('u1', 1)])
+        self.assertEqual(self.leaderboard.top('longest', 10), [('u1', 4)])
+
+    def test_expired_streaks_drop_off(self):
+        """ Test that broken current streaks leave the current board """
+        self.leaderboard.record('u1', 2, 1)
+        self.leaderboard.record('u2', 1, 60)
+
+        time.sleep(2)
+
+        self.assertEqual(self.leaderboard.top('current', 10), [('u2', 1)])
+        self.assertEqual(self.leaderboard.top('longest', 10),
+                         [('u1', 2), ('u2', 1)])
+        self.assertEqual(self.redis.zcard(Leaderboard.EXPIRY_KEY), 1)
+
+    def test_prune_by_batches(self):
+        """ Test dropping more expired streaks than a batch """
+        for i in range(5):
+            self.leaderboard.record(f'u{i}', 1, -1)
+        self.leaderboard.record('u5', 1, 60)
+
+        self.assertEqual(self.leaderboard.prune(batch_size=2), 5)
+        self.assertEqual(self.leaderboard.top('current', 10), [('u5', 1)])
+        self.assertEqual(self.redis.zcard(Leaderboard.EXPIRY_KEY), 1)
+
+    def test_rank(self):
+        """ Test a user's rank on each board """
+        self.leaderboard.record('u1', 3, 60)
+        self.leaderboard.record('u2', 5, 60)
+        self.leaderboard.record('u2', 1, 60)
+
+        self.assertEqual(self.leaderboard.rank('u2'), {
+            'current': {'rank': 2, 'streak': 1},
+            'longest': {'rank': 1, 'streak': 5}
+        })
+        self.assertEqual(self.leaderboard.rank('u3'),
+                         {'current': None, 'longest': None})
+
+    def test_remove(self):
+        """ Test taking a user off the boards """
+        self.leaderboard.record('u1', 3, 60)
+        self.leaderboard.remove('u1')
+
+        self.assertEqual(self.leaderboard.top('current', 10), [])
+        self.assertEqual(self.leaderboard.top('longest', 10), [])
+        self.assertEqual(self.redis.zcard(Leaderboard.EXPIRY_KEY), 0)
+
+    def test_rebuild(self):
+        """ Test raising the longest streaks to the db's ones """
+        self.leaderboard.record('u1', 7, 60)
+        storage = FakeStorage([
+            {'_id': 'u1', 'longest_streak': 4},
+            {'_id': 'u2', 'longest_streak': 9},
+            {'_id': 'u3', 'longest_streak': 2}
+        ])
+
+        self.assertEqual(self.leaderboard.rebuild(storage, batch_size=2), 3)
+        self.assertEqual(self.leaderboard.top('longest', 10),
+                         [('u2', 9), ('u1', 7), ('u3', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the likes buffered in Redis.
+"""
+import unittest
+from bson import ObjectId
+from db import db, redis_client as rc, feed_cache, like_buffer
+from threading import Thread
+import random
+
+
+class TestLikeBuffer(unittest.TestCase):
+    """ Defines a class for testing LikeBuffer. """
+
+    def setUp(self):
+        """ Insert a post and its readers before each test """
+        db.ensure_indexes()
+        self.post_id = str(db.insert_post({
+            'title': 'Viral post',
+            'number_of_likes': 0
+        }))
+        users = db._db['users'].insert_many([
+            {'username': f'reader{i}', 'email': f'reader{i}@mail.com'}
+            for i in range(20)
+        ])
+        self.user_ids = list(map(str, users.inserted_ids))
+
+    def tearDown(self):
+        """ Clean up the databases after each test """
+        db.clear_db()
+        rc.flushdb()
+
+    def count_likes(self) -> int:
+        """ Return the likes count of the post in the db """
+        return db.find_post({'_id': ObjectId(self.post_id)})['number_of_likes']
+
+    def test_like_and_unlike(self):
+        """ Test the result codes of buffered likes and unlikes """
+        user_id = self.user_ids[0]
+
+        self.assertEqual(like_buffer.like(user_id, self.post_id), 0)
+        self.assertEqual(like_buffer.like(user_id, self.post_id), -2)
+        self.assertEqual(like_buffer.like(user_id, str(ObjectId())), -1)
+        self.assertEqual(like_buffer.pending_deltas([self.post_id]),
+                         {self.post_id: 1})
+        self.assertEqual(like_buffer.pending_likes(user_id, [self.post_id]),
+                         {self.post_id: True})
+
+        # Nothing was written to the db yet
+        self.assertEqual(self.count_likes(), 0)
+
+        like_buffer.flush()
+        self.assertEqual(self.count_likes(), 1)
+        self.assertEqual(like_buffer.pending_deltas([self.post_id]), {})
+        self.assertEqual(like_buffer.unlike(user_id, self.post_id), 0)
+        self.assertEqual(like_buffer.unlike(user_id, self.post_id), -2)
+
+        like_buffer.flush()
+        self.assertEqual(self.count_likes(), 0)
+        self.assertFalse(db.is_liked(user_id, self.post_id))
+
+    def test_counts_converge(self):
+        """ Test that concurrent likes, unlikes and flushes converge """
+
+        def click(user_id):
+            for _ in range(10):
+                if random.random() < 0.5:
+                    like_buffer.like(user_id, self.post_id)
+                else:
+                    like_buffer.unlike(user_id, self.post_id)
+
+        def flush():
+            for _ in range(5):
+                like_buffer.flush(batch_size=3)
+
+        threads = [Thread(target=click, args=(u,)) for u in self.user_ids]
+        threads.append(Thread(target=flush))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        like_buffer.flush()
+
+        liked = [u for u in self.user_ids if db.is_liked(u, self.post_id)]
+        self.assertEqual(self.count_likes(), len(liked))
+        self.assertEqual(like_buffer.pending_deltas([self.post_id]), {})
+
+    def test_counts_during_flush(self):
+        """ Test that the flushed batches aren't counted twice while the
+        next ones are written
+        """
+        for user_id in self.user_ids[:6]:
+            like_buffer.like(user_id, self.post_id)
+        like_buffer.unlike(self.user_ids[0], self.post_id)
+
+        counts = []
+        original = db.apply_likes
+
+        def apply_and_count(states):
+            counts.append(self.count_likes() + like_buffer.pending_deltas(
+                [self.post_id]).get(self.post_id, 0))
+            original(states)
+
+        db.apply_likes = apply_and_count
+        try:
+            self.assertEqual(like_buffer.flush(batch_size=2), 5)
+        finally:
+            db.apply_likes = original
+
+        self.assertEqual(counts, [5, 5, 5])
+        self.assertEqual(self.count_likes(), 5)
+        self.assertEqual(like_buffer.pending_deltas([self.post_id]), {})
+
+    def test_resume_interrupted_flush(self):
+        """ Test that a flush interrupted before its end is resumed """
+        for user_id in self.user_ids[:5]:
+            like_buffer.like(user_id, self.post_id)
+
+        # The flush is interrupted after writing to the db
+        original = db.apply_likes
+
+        def apply_and_crash(states):
+            original(states)
+            raise RuntimeError('worker killed')
+
+        db.apply_likes = apply_and_crash
+        try:
+            with self.assertRaises(RuntimeError):
+                like_buffer.flush()
+        finally:
+            db.apply_likes = original
+
+        # Likes recorded meanwhile wait for the next flush
+        like_buffer.like(self.user_ids[5], self.post_id)
+
+        like_buffer.flush()
+        self.assertEqual(self.count_likes(), 5)
+        like_buffer.flush()
+        self.assertEqual(self.count_likes(), 6)
+
+    def test_flush_bumps_feed(self):
+        """ Test that only a flush writing changes bumps the feed """
+        version = feed_cache.version()
+        like_buffer.flush()
+        self.assertEqual(feed_cache.version(), version)
+
+        like_buffer.like(self.user_ids[0], self.post_id)
+        like_buffer.flush()
+        self.assertEqual(feed_cache.version(), version + 1)
+
+    def test_skip_deleted_posts_and_users(self):
+        """ Test that the likes of posts or users deleted since they were
+        recorded are not written
+        """
+        author_id = self.user_ids[4]
+        other_id = str(db.insert_post({
+            'title': 'Deleted post',
+            'user_id': author_id,
+            'number_of_likes': 0
+        }))
+        for user_id in self.user_ids[:3]:
+            like_buffer.like(user_id, self.post_id)
+        like_buffer.like(self.user_ids[3], other_id)
+
+        db.delete_post(other_id, author_id)
+        db.mark_user_deleted(self.user_ids[1])
+        db.delete_user(self.user_ids[2])
+
+        like_buffer.flush()
+        self.assertEqual(self.count_likes(), 1)
+        self.assertTrue(db.is_liked(self.user_ids[0], self.post_id))
+        self.assertFalse(db.is_liked(self.user_ids[1], self.post_id))
+        self.assertFalse(db.is_liked(self.user_ids[3], other_id))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the indexes and migrations of DBStorage.
+"""
+import unittest
+from datetime import datetime
+from db import db
+from db.indexes import INDEXES
+from db.migrations import (MIGRATIONS, DuplicateUsersError,
+                           store_likers_ids)
+from db.db_manager import DuplicateUserError
+
+
+class TestMigrations(unittest.TestCase):
+    """ Defines a class for testing the migrations. """
+
+    def tearDown(self):
+        """ Clean up the database after each test """
+        db._db.drop_collection('migrations')
+        db.clear_db()
+
+    def test_migrate_once(self):
+        """ Test that migrations are applied once and in order """
+        applied = db.migrate()
+        self.assertEqual([m.version for m in applied],
+                         [m.version for m in MIGRATIONS])
+
+        self.assertEqual(db.migrate(), [])
+
+    def test_declared_indexes_exist(self):
+        """ Test that every declared index is created """
+        db.migrate()
+
+        for collection, indexes in INDEXES.items():
+            existing = db._db[collection].index_information()
+            for index in indexes:
+                self.assertIn(index.document['name'], existing)
+
+    def test_ensure_indexes_is_idempotent(self):
+        """ Test ensuring the indexes twice """
+        db.ensure_indexes()
+        db.ensure_indexes()
+
+        db.insert_user({'email': 'same@example.com', 'username': 'first',
+                        'password': 'pass'})
+        with self.assertRaises(DuplicateUserError):
+            db.insert_user({'email': 'same@example.com', 'username': 'second',
+                            'password': 'pass'})
+
+    def test_report_duplicate_users(self):
+        """ Test that the initial indexes aren't built over users sharing
+        an email or username
+        """
+        db._db.drop_collection('users')
+        ids = db._db['users'].insert_many([
+            {'email': 'same@example.com', 'username': 'first'},
+            {'email': 'same@example.com', 'username': 'second'},
+            {'email': 'other@example.com', 'username': 'third'},
+        ]).inserted_ids
+
+        with self.assertRaises(DuplicateUsersError) as cm:
+            db.migrate()
+        self.assertEqual(cm.exception.duplicates, {'email': [
+            {'_id': 'same@example.com', 'ids': ids[:2], 'count': 2}
+        ]})
+        self.assertIn('same@example.com', str(cm.exception))
+        self.assertIsNone(db._db['migrations'].find_one({'_id': 1}))
+
+    def test_store_likers_ids(self):
+        """ Test migrating the likers' usernames to their ids """
+        user_id = db.insert_user({'email': 'liker@example.com',
+                                  'username': 'liker', 'password': 'pass'})
+        post_id = db.insert_post({'title': 'Post title',
+                                  'likes': ['liker', 'deleted_user'],
+                                  'number_of_likes': 2})
+        store_likers_ids(db._db)
+
+        post = db.find_post({'_id': post_id})
+        self.assertEqual(post['likes'], [str(user_id)])
+        self.assertEqual(post['number_of_likes'], 1)
+
+    def test_move_likes_to_collection(self):
+        """ Test migrating the embedded likes arrays """
+        user_id = db.insert_user({'email': 'liker@example.com',
+                                  'username': 'liker', 'password': 'pass'})
+        post_id = db.insert_post({'title': 'Post title',
+                                  'likes': ['liker', 'deleted_user'],
+                                  'number_of_likes': 2})
+        db.migrate()
+
+        post = db.find_post({'_id': post_id})
+        self.assertNotIn('likes', post)
+        self.assertEqual(post['number_of_likes'], 1)
+        self.assertEqual(db.find_liked_post_ids(user_id, [post_id]),
+                         {str(post_id)})
+
+    def test_trim_embedded_comments(self):
+        """ Test migrating the embedded comments arrays """
+        post_id = db.insert_post({'title': 'Post title',
+                                  'comments': [{'_id': str(i)}
+                                               for i in range(5)],
+                                  'number_of_comments': 7})
+        for i in range(5):
+            db._db['comments'].insert_one({'post_id': post_id})
+        db.migrate()
+
+        post = db.find_post({'_id': post_id})
+        self.assertEqual(post['number_of_comments'], 5)
+        self.assertEqual([c['_id'] for c in post['comments']],
+                         ['2', '3', '4'])
+
+    def test_convert_comment_dates(self):
+        """ Test migrating the comments' string dates to datetimes """
+        post_id = db.insert_post({'title': 'Post title',
+                                  'comments': [{
+                                      '_id': '1',
+                                      'date_posted':
+                                          'Sat, 02 Mar 2024 10:00:00 GMT'
+                                  }],
+                                  'number_of_comments': 2})
+        for date in ['Sat, 02 Mar 2024 10:00:00 GMT',
+                     'Mon, 12 Feb 2024 10:00:00 GMT']:
+            db._db['comments'].insert_one({'post_id': post_id,
+                                           'date_posted': date})
+        db.migrate()
+
+        comments = db.get_post_comments(post_id)
+        self.assertEqual([c['date_posted'] for c in comments],
+                         [datetime(2024, 2, 12, 10), datetime(2024, 3, 2, 10)])
+
+        post = db.find_post({'_id': post_id})
+        self.assertEqual(post['comments'][0]['date_posted'],
+                         datetime(2024, 3, 2, 10))
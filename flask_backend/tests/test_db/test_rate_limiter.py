@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the Redis token bucket rate limiter.
+"""
+import unittest
+from db.rate_limiter import RateLimiter
+from fakeredis import FakeRedis
+from threading import Barrier, Lock, Thread
+import time
+
+
+class TestRateLimiter(unittest.TestCase):
+    """ Defines a class for testing RateLimiter on a local Redis. """
+
+    def setUp(self):
+        """ Create a rate limiter on a fresh fake Redis """
+        self.redis = FakeRedis()
+        self.limiter = RateLimiter(self.redis)
+
+    def test_burst_then_limited(self):
+        """ Test that a client gets `limit` requests, then must wait """
+        for _ in range(5):
+            self.assertEqual(self.limiter.hit('auth_bp', 'ip:1', 5, 60), 0)
+
+        wait = self.limiter.hit('auth_bp', 'ip:1', 5, 60)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 12)
+
+    def test_clients_and_scopes_are_separate(self):
+        """ Test that each client has its bucket in each scope """
+        self.assertEqual(self.limiter.hit('auth_bp', 'ip:1', 1, 60), 0)
+        self.assertGreater(self.limiter.hit('auth_bp', 'ip:1', 1, 60), 0)
+
+        self.assertEqual(self.limiter.hit('auth_bp', 'ip:2', 1, 60), 0)
+        self.assertEqual(self.limiter.hit('feed_bp', 'ip:1', 1, 60), 0)
+
+    def test_several_clients(self):
+        """ Test that a request counting for several clients is rejected
+        once one of them is out of requests, without taking from the other
+        """
+        keys = ['ip:1', 'user:1']
+        self.assertEqual(self.limiter.hit('feed_bp', 'user:1', 2, 60), 0)
+        self.assertEqual(self.limiter.hit('feed_bp', keys, 2, 60), 0)
+        self.assertGreater(self.limiter.hit('feed_bp', keys, 2, 60), 0)
+
+        # The IP address kept its last request for another user
+        self.assertEqual(
+            self.limiter.hit('feed_bp', ['ip:1', 'user:2'], 2, 60), 0)
+        self.assertGreater(self.limiter.hit('feed_bp', 'ip:1', 2, 60), 0)
+
+    def test_bucket_refills(self):
+        """ Test that tokens come back over time """
+        self.assertEqual(self.limiter.hit('auth_bp', 'ip:1', 1, 0.2), 0)
+        self.assertGreater(self.limiter.hit('auth_bp', 'ip:1', 1, 0.2), 0)
+
+        time.sleep(0.25)
+        self.assertEqual(self.limiter.hit('auth_bp', 'ip:1', 1, 0.2), 0)
+
+    def test_concurrent_clients(self):
+        """ Test that concurrent requests never exceed the limit """
+        limit = 10
+        allowed = {'ip:1': 0, 'ip:2': 0}
+        lock = Lock()
+        barrier = Barrier(20)
+
+        def client(client_key):
+            barrier.wait()
+            for _ in range(5):
+                if self.limiter.hit('auth_bp', client_key, limit, 60) == 0:
+                    with lock:
+                        allowed[client_key] += 1
+
+        threads = [Thread(target=client, args=(f'ip:{i % 2 + 1}',))
+                   for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(allowed, {'ip:1': limit, 'ip:2': limit})
+
+
+if __name__ == '__main__':
+    unittest.main()
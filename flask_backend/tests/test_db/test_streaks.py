@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the users' current streaks.
+"""
+import unittest
+from datetime import datetime, timedelta
+from db import db, leaderboard, redis_client as rc, streaks
+from threading import Thread
+
+
+class TestStreaks(unittest.TestCase):
+    """ Defines a class for testing Streaks. """
+
+    def tearDown(self):
+        """ Clean up Redis and the database after each test """
+        rc.flushdb()
+        db.clear_db()
+
+    def test_record_entries(self):
+        """ Test counting entries, and refusing too recent ones """
+        self.assertEqual(streaks.record_entry('mohamed', 60, 120), (1, 0))
+        self.assertLessEqual(rc.ttl(streaks.key('mohamed')), 120)
+
+        # The streak has more than 60 seconds left
+        streak, wait = streaks.record_entry('mohamed', 60, 120)
+        self.assertEqual(streak, 1)
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 60)
+
+        # The streak has less than 60 seconds left
+        rc.expire(streaks.key('mohamed'), 30)
+        self.assertEqual(streaks.record_entry('mohamed', 60, 120), (2, 0))
+
+    def test_concurrent_entries(self):
+        """ Test that double submitted entries are counted once """
+        results = []
+
+        def record():
+            results.append(streaks.record_entry('mohamed', 60, 120))
+
+        threads = [Thread(target=record) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sorted(wait == 0 for _, wait in results),
+                         [False] * 9 + [True])
+        self.assertEqual(rc.get(streaks.key('mohamed')), b'1')
+
+    def test_update_longest_streak(self):
+        """ Test raising the longest streak to a new record only """
+        user_id = db.insert_user({'email': 'mohamed@example.com',
+                                  'username': 'mohamed', 'password': 'pass',
+                                  'longest_streak': 3})
+
+        self.assertFalse(db.update_longest_streak(user_id, 2))
+        self.assertFalse(db.update_longest_streak(user_id, 3))
+        self.assertTrue(db.update_longest_streak(user_id, 4))
+
+        user = db.find_user({'_id': user_id})
+        self.assertEqual(user['longest_streak'], 4)
+
+    def insert_posts(self, username, hours_ago):
+        """ Insert a user with posts logged `hours_ago` hours ago """
+        user_id = str(db.insert_user({
+            'email': f'{username}@example.com', 'username': username,
+            'password': 'pass', 'longest_streak': 0
+        }))
+        now = datetime.utcnow()
+        for hours in hours_ago:
+            db.insert_post({'user_id': user_id, 'username': username,
+                            'title': 'Title', 'content': 'Content',
+                            'is_public': False,
+                            'datePosted': now - timedelta(hours=hours)})
+
+        return user_id
+
+    def test_rebuild(self):
+        """ Test recomputing the current streaks from the posts """
+        day = 28 * 3600
+        mohamed = self.insert_posts('mohamed', [1, 21, 42, 100, 120])
+        self.insert_posts('sara', [30, 50])
+        ghost = self.insert_posts('ghost', [2, 23])
+        db.delete_user(ghost)
+        rc.delete(streaks.SENTINEL_KEY)
+
+        self.assertEqual(streaks.rebuild(db, day, leaderboard, 2), 1)
+
+        self.assertEqual(rc.get(streaks.key('mohamed')), b'3')
+        self.assertAlmostEqual(rc.ttl(streaks.key('mohamed')), 27 * 3600,
+                               delta=5)
+        self.assertIsNone(rc.get(streaks.key('sara')))
+        self.assertIsNone(rc.get(streaks.key('ghost')))
+        self.assertEqual(leaderboard.top('current', 10), [(mohamed, 3)])
+        self.assertTrue(rc.exists(streaks.SENTINEL_KEY))
+
+    def test_restore_if_lost(self):
+        """ Test restoring the streaks only when the sentinel is lost """
+        self.insert_posts('mohamed', [1, 21])
+
+        # Another process is restoring them
+        rc.set(streaks.LOCK_KEY, 1)
+        self.assertIsNone(streaks.restore_if_lost(db, 28 * 3600))
+        rc.delete(streaks.LOCK_KEY)
+
+        thread = streaks.restore_if_lost(db, 28 * 3600)
+        thread.join()
+        self.assertEqual(rc.get(streaks.key('mohamed')), b'2')
+        self.assertFalse(rc.exists(streaks.LOCK_KEY))
+
+        # They were restored
+        self.assertIsNone(streaks.restore_if_lost(db, 28 * 3600))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the public timeline.
+"""
+import unittest
+from db import db, redis_client as rc, timeline
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+
+class TestTimeline(unittest.TestCase):
+    """ Defines a class for testing Timeline. """
+
+    def setUp(self):
+        """ Insert public and private posts before each test """
+        now = datetime.utcnow()
+        self.public_ids = []
+
+        for i in range(6):
+            post_id = db.insert_post({
+                'user_id': 'dummy_user',
+                'title': f'Post {i} title',
+                'content': f'Post {i} content',
+                'is_public': i % 2 == 0,
+                'datePosted': now + timedelta(minutes=i)
+            })
+            if i % 2 == 0:
+                self.public_ids.insert(0, str(post_id))
+
+    def tearDown(self):
+        """ Clean up the databases after each test """
+        db.clear_db()
+        rc.flushdb()
+
+    def test_page_builds_timeline(self):
+        """ Test that reading an unbuilt timeline rebuilds it in the
+        background, once
+        """
+        self.assertFalse(timeline.is_built())
+
+        with patch.object(timeline, 'rebuild_in_background') as rebuild:
+            self.assertIsNone(timeline.page(0, 10))
+            rebuild.assert_called_once_with()
+
+        # Another process is rebuilding it
+        rc.set(timeline.LOCK_KEY, 1)
+        self.assertIsNone(timeline.rebuild_in_background())
+        self.assertIsNone(timeline.rebuild())
+        rc.delete(timeline.LOCK_KEY)
+
+        timeline.rebuild_in_background().join()
+
+        self.assertFalse(rc.exists(timeline.LOCK_KEY))
+        self.assertTrue(timeline.is_built())
+        self.assertEqual(timeline.page(0, 10), self.public_ids)
+        self.assertEqual(timeline.size(), 3)
+
+    def test_add_and_remove(self):
+        """ Test keeping the timeline in sync with the posts """
+        timeline.rebuild()
+
+        recent_id = db.insert_post({
+            'user_id': 'dummy_user',
+            'title': 'Recent title',
+            'content': 'Recent content',
+            'is_public': True,
+            'datePosted': datetime.utcnow() + timedelta(days=1)
+        })
+        timeline.add(recent_id, datetime.utcnow() + timedelta(days=1))
+        self.assertEqual(timeline.page(0, 1), [str(recent_id)])
+
+        timeline.remove(recent_id, self.public_ids[0])
+        self.assertEqual(timeline.page(0, 10), self.public_ids[1:])
+
+    def test_rebuild_after_flush(self):
+        """ Test rebuilding the timeline after Redis was flushed """
+        timeline.rebuild()
+        rc.flushdb()
+
+        self.assertEqual(timeline.rebuild(), 3)
+        self.assertEqual(timeline.page(1, 2), self.public_ids[1:])
+
+    def test_changes_during_rebuild(self):
+        """ Test that posts added and removed while the timeline is being
+        rebuilt are kept in sync
+        """
+        original = db.iter_public_posts
+        added = []
+
+        def iter_and_change(*args, **kwargs):
+            for post in original(*args, **kwargs):
+                if post['_id'] == self.public_ids[1]:
+                    # A post already read is deleted, and a post is
+                    # published ahead of the posts read
+                    db.delete_post(post['_id'], 'dummy_user')
+                    timeline.remove(post['_id'])
+                    date_posted = datetime.utcnow() + timedelta(days=1)
+                    added.append(str(db.insert_post({
+                        'user_id': 'dummy_user',
+                        'title': 'Recent title',
+                        'content': 'Recent content',
+                        'is_public': True,
+                        'datePosted': date_posted
+                    })))
+                    timeline.add(added[0], date_posted)
+                yield post
+
+        db.iter_public_posts = iter_and_change
+        try:
+            self.assertEqual(timeline.rebuild(batch_size=2), 3)
+        finally:
+            db.iter_public_posts = original
+
+        self.assertEqual(timeline.page(0, 10), [added[0],
+                                                self.public_ids[0],
+                                                self.public_ids[2]])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the in-process cache of verified tokens.
+"""
+import unittest
+from db import redis_client as rc
+from db.token_cache import TokenCache
+from unittest.mock import patch
+import time
+
+
+class TestTokenCache(unittest.TestCase):
+    """ Defines a class for testing TokenCache. """
+
+    def setUp(self):
+        """ Create two workers' caches and a live token """
+        self.cache = TokenCache(rc, ttl=60, max_size=2)
+        self.other_cache = TokenCache(rc, ttl=60, max_size=2)
+        rc.set('user_1', 'token')
+
+    def tearDown(self):
+        """ Clean up Redis after each test """
+        rc.flushdb()
+
+    def wait_for(self, condition) -> bool:
+        """ Wait up to a second for a condition to be true """
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_is_alive(self):
+        """ Test checking stored and missing tokens """
+        self.assertTrue(self.cache.is_alive('user_1'))
+        self.assertFalse(self.cache.is_alive('user_2'))
+
+    def test_skips_redis_when_cached(self):
+        """ Test that a verified identity is not checked again """
+        self.assertTrue(self.cache.is_alive('user_1'))
+
+        with patch.object(rc, 'exists') as exists:
+            self.assertTrue(self.cache.is_alive('user_1'))
+            exists.assert_not_called()
+
+    def test_entries_expire(self):
+        """ Test that an entry is checked again after its ttl """
+        self.cache.configure(ttl=0.1, max_size=2)
+        self.assertTrue(self.cache.is_alive('user_1'))
+
+        rc.delete('user_1')
+        time.sleep(0.15)
+        self.assertFalse(self.cache.is_alive('user_1'))
+
+    def test_lru_eviction(self):
+        """ Test that the least recently used identity is evicted """
+        rc.set('user_2', 'token')
+        rc.set('user_3', 'token')
+        for identity in ['user_1', 'user_2', 'user_1', 'user_3']:
+            self.assertTrue(self.cache.is_alive(identity))
+
+        rc.delete('user_1', 'user_2', 'user_3')
+        self.assertTrue(self.cache.is_alive('user_1'))
+        self.assertFalse(self.cache.is_alive('user_2'))
+
+    def test_revoke_reaches_every_worker(self):
+        """ Test that a revocation is published to the other caches """
+        self.assertTrue(self.cache.is_alive('user_1'))
+        self.assertTrue(self.other_cache.is_alive('user_1'))
+
+        rc.delete('user_1')
+        self.cache.revoke('user_1')
+
+        self.assertFalse(self.cache.is_alive('user_1'))
+        self.assertTrue(self.wait_for(
+            lambda: not self.other_cache.is_alive('user_1')
+        ))
+
+    def test_disabled(self):
+        """ Test that a ttl of 0 always checks Redis """
+        self.cache.configure(ttl=0, max_size=2)
+        self.assertTrue(self.cache.is_alive('user_1'))
+
+        rc.delete('user_1')
+        self.assertFalse(self.cache.is_alive('user_1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
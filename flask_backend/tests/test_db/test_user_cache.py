@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the cache of users' documents.
+"""
+import unittest
+from datetime import datetime
+from db import db, redis_client as rc
+from db.user_cache import UserCache
+from unittest.mock import patch
+import time
+
+
+class TestUserCache(unittest.TestCase):
+    """ Defines a class for testing UserCache. """
+
+    def setUp(self):
+        """ Create two workers' caches and a user """
+        self.cache = UserCache(rc, db, ttl=60, max_size=2)
+        self.other_cache = UserCache(rc, db, ttl=60, max_size=2)
+        for cache in (self.cache, self.other_cache):
+            db.on_user_changed(cache.invalidate)
+        self.addCleanup(db._user_listeners.remove, self.cache.invalidate)
+        self.addCleanup(db._user_listeners.remove,
+                        self.other_cache.invalidate)
+
+        self.user_id = str(db.insert_user({
+            'email': 'mohamed@example.com', 'username': 'mohamed',
+            'password': 'pass', 'longest_streak': 0
+        }))
+
+    def tearDown(self):
+        """ Clean up Redis and the database after each test """
+        rc.flushdb()
+        db.clear_db()
+
+    def wait_for(self, condition) -> bool:
+        """ Wait up to a second for a condition to be true """
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_get(self):
+        """ Test getting a user without its password """
+        user = self.cache.get(self.user_id)
+
+        self.assertEqual(user, {'_id': self.user_id, 'username': 'mohamed',
+                                'email': 'mohamed@example.com',
+                                'longest_streak': 0})
+        self.assertIsNone(self.cache.get('0' * 24))
+
+    def test_dates(self):
+        """ Test that dates are cached as datetimes """
+        created_at = datetime(2024, 5, 1, 12, 30)
+        db.update_user_info(self.user_id, {'created_at': created_at})
+
+        self.cache.get(self.user_id)
+        user = self.other_cache.get(self.user_id)
+
+        self.assertEqual(user['created_at'], created_at)
+        self.assertEqual(self.other_cache.stats()['redis_hits'], 1)
+
+    def test_tiers(self):
+        """ Test that a user is read from MongoDB once, then from Redis
+        by another worker, then from memory
+        """
+        self.cache.get(self.user_id)
+
+        with patch.object(db, 'find_user_by_id') as find:
+            self.assertEqual(self.other_cache.get(self.user_id)['username'],
+                             'mohamed')
+            find.assert_not_called()
+
+        with patch.object(rc, 'get') as get:
+            self.assertEqual(self.other_cache.get(self.user_id)['username'],
+                             'mohamed')
+            get.assert_not_called()
+
+        self.assertEqual(self.cache.stats(), {
+            'local_hits': 0, 'redis_hits': 0, 'misses': 1, 'hit_rate': 0.0
+        })
+        self.assertEqual(self.other_cache.stats(), {
+            'local_hits': 1, 'redis_hits': 1, 'misses': 0, 'hit_rate': 1.0
+        })
+
+    def test_total_stats(self):
+        """ Test that the workers' counts are added up in Redis """
+        cache = UserCache(rc, db, ttl=60, max_size=2, stats_interval=0)
+        other_cache = UserCache(rc, db, ttl=60, max_size=2,
+                                stats_interval=60)
+        cache.get(self.user_id)
+        cache.get(self.user_id)
+        other_cache.get(self.user_id)
+
+        # The other worker pushes its counts once the interval elapsed
+        self.assertEqual(cache.total_stats(), {
+            'local_hits': 1, 'redis_hits': 0, 'misses': 1, 'hit_rate': 0.5
+        })
+
+        cache.reset_total_stats()
+        self.assertEqual(cache.total_stats()['misses'], 0)
+
+    def test_update_invalidates(self):
+        """ Test that updating a user reaches every worker """
+        self.cache.get(self.user_id)
+        self.other_cache.get(self.user_id)
+
+        db.update_user_info(self.user_id, {'username': 'mo'})
+
+        self.assertEqual(self.cache.get(self.user_id)['username'], 'mo')
+        self.assertTrue(self.wait_for(
+            lambda: self.other_cache.get(self.user_id)['username'] == 'mo'
+        ))
+
+    def test_longest_streak_invalidates(self):
+        """ Test that a new longest streak is seen """
+        self.cache.get(self.user_id)
+
+        db.update_longest_streak(self.user_id, 3)
+
+        self.assertEqual(self.cache.get(self.user_id)['longest_streak'], 3)
+
+    def test_delete_invalidates(self):
+        """ Test that a deleted user is not found anymore """
+        self.cache.get(self.user_id)
+
+        db.delete_user(self.user_id)
+
+        self.assertIsNone(self.cache.get(self.user_id))
+        self.assertFalse(rc.exists(UserCache.key(self.user_id)))
+
+    def test_disabled_in_memory(self):
+        """ Test that a ttl of 0 always reads Redis """
+        self.cache.configure(ttl=0, max_size=2)
+        self.cache.get(self.user_id)
+        self.cache.get(self.user_id)
+
+        self.assertEqual(self.cache.stats()['local_hits'], 0)
+        self.assertEqual(self.cache.stats()['redis_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the passwords hashing service.
+"""
+import unittest
+from passwords import PasswordHasher, hash_rounds
+
+
+class TestPasswordHasher(unittest.TestCase):
+    """ Defines a class for testing PasswordHasher. """
+
+    def test_hash_and_verify_inline(self):
+        """ Test hashing in the calling thread """
+        hasher = PasswordHasher(rounds=4, workers=0)
+        hashed = hasher.hash('pass123')
+
+        self.assertEqual(hash_rounds(hashed), 4)
+        self.assertTrue(hasher.verify(hashed, 'pass123'))
+        self.assertFalse(hasher.verify(hashed, 'badpass'))
+
+    def test_hash_and_verify_in_pool(self):
+        """ Test hashing in the pool of processes """
+        hasher = PasswordHasher(rounds=4, workers=1)
+        self.addCleanup(hasher.configure, 4, 0)
+
+        hashed = hasher.hash('pass123')
+
+        self.assertEqual(hash_rounds(hashed), 4)
+        self.assertTrue(hasher.verify(hashed, 'pass123'))
+        self.assertFalse(hasher.verify(hashed, 'badpass'))
+
+    def test_needs_rehash(self):
+        """ Test detecting hashes of another cost """
+        hasher = PasswordHasher(rounds=4, workers=0)
+        hashed = hasher.hash('pass123')
+        self.assertFalse(hasher.needs_rehash(hashed))
+
+        hasher.configure(rounds=5, workers=0)
+        self.assertTrue(hasher.needs_rehash(hashed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,11 @@
 """
 from config import TestConfig
 from datetime import datetime
-from db import db, redis_client as rc
+from db import db, redis_client as rc, sessions
 from db.db_manager import check_hash_password
+from flask_jwt_extended import get_jti
 from main import create_app
+from passwords import hash_rounds
 import unittest
 
 
@@ -172,6 +174,50 @@ class LoginTests(unittest.TestCase):
         self.assertIn('access_token', data)
         self.assertIn('refresh_token', data)
 
+    def test_login_rehashes_password(self):
+        """ Test that logging in rehashes a password of another cost """
+        self.assertEqual(
+            hash_rounds(db.get_hash(self.login_detail['email'])), 4
+        )
+
+        class CostlierConfig(TestConfig):
+            BCRYPT_ROUNDS = 5
+
+        client = create_app(CostlierConfig).test_client()
+        self.addCleanup(create_app, TestConfig)
+
+        res = client.post('/api/login', json=self.login_detail)
+        self.assertEqual(res.status_code, 200)
+
+        hashed_pwd = db.get_hash(self.login_detail['email'])
+        self.assertEqual(hash_rounds(hashed_pwd), 5)
+        self.assertTrue(
+            check_hash_password(hashed_pwd, self.login_detail['password'])
+        )
+
+    def test_login_rate_limited(self):
+        """ Test that a client trying too many logins is limited """
+        class RateLimitConfig(TestConfig):
+            RATE_LIMIT_ENABLED = True
+            RATE_LIMITS = dict(TestConfig.RATE_LIMITS, auth_bp=(2, 60))
+
+        client = create_app(RateLimitConfig).test_client()
+        self.addCleanup(rc.flushdb)
+
+        for _ in range(2):
+            res = client.post('/api/login', json=self.login_detail)
+            self.assertEqual(res.status_code, 200)
+
+        res = client.post('/api/login', json=self.login_detail)
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.get_json(), {'error': 'Too many requests'})
+        self.assertGreater(int(res.headers['Retry-After']), 0)
+
+        # Another client is not limited
+        res = client.post('/api/login', json=self.login_detail,
+                          environ_base={'REMOTE_ADDR': '10.0.0.2'})
+        self.assertEqual(res.status_code, 200)
+
     def test_login_with_bad_email(self):
         """ Test logging a user with incorrect email  """
         login_detail = {
@@ -264,6 +310,10 @@ class LoggedInTests(unittest.TestCase):
         self.access_token = data['access_token']
         self.refresh_token = data['refresh_token']
 
+        # Redis key of the session of the tokens
+        with self.app.app_context():
+            self.session_key = sessions.key(get_jti(self.refresh_token))
+
     def tearDown(self):
         """Clear database
         """
@@ -311,7 +361,7 @@ class LoggedInTests(unittest.TestCase):
         headers = {
             'Authorization': f'Bearer {self.access_token}'
         }
-        rc.delete(str(self.user_id))
+        rc.delete(self.session_key)
 
         res = self.client.get('/api/', headers=headers)
         data = res.get_json()
@@ -358,7 +408,7 @@ class LoggedInTests(unittest.TestCase):
         headers = {
             'Authorization': f'Bearer {self.refresh_token}'
         }
-        rc.delete(str(self.user_id) + '_refresh')
+        rc.delete(self.session_key)
 
         res = self.client.post('/api/refresh', headers=headers)
         data = res.get_json()
@@ -386,7 +436,71 @@ class LoggedInTests(unittest.TestCase):
         res = self.client.post('/api/logout', headers=headers)
 
         self.assertEqual(res.status_code, 204)
-        self.assertIsNone(rc.get(str(self.user_id)))
+        self.assertIsNone(rc.get(self.session_key))
+
+    def test_logout_with_token_cache(self):
+        """ Test that logging out revokes a cached token right away """
+        class CachingConfig(TestConfig):
+            TOKEN_CACHE_TTL = 60
+
+        client = create_app(CachingConfig).test_client()
+        # Leave the cache disabled for the other tests
+        self.addCleanup(create_app, TestConfig)
+        headers = {
+            'Authorization': f'Bearer {self.access_token}'
+        }
+
+        self.assertEqual(client.get('/api/', headers=headers).status_code, 200)
+        self.assertEqual(
+            client.post('/api/logout', headers=headers).status_code, 204
+        )
+
+        res = client.get('/api/', headers=headers)
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json(), {'error': 'Token has been revoked'})
+
+    def test_sessions_of_several_devices(self):
+        """ Test that logging in again keeps the other sessions """
+        res = self.client.post('/api/login', json=self.login_detail)
+        other_token = res.get_json()['access_token']
+
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        other_headers = {'Authorization': f'Bearer {other_token}'}
+
+        self.assertEqual(
+            self.client.get('/api/', headers=headers).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get('/api/', headers=other_headers).status_code, 200
+        )
+
+        # Logging out ends the current session only
+        self.client.post('/api/logout', headers=other_headers)
+
+        self.assertEqual(
+            self.client.get('/api/', headers=headers).status_code, 200
+        )
+        self.assertEqual(
+            self.client.get('/api/', headers=other_headers).status_code, 401
+        )
+
+    def test_logout_all(self):
+        """ Test logging out of every session """
+        res = self.client.post('/api/login', json=self.login_detail)
+        other_refresh_token = res.get_json()['refresh_token']
+
+        headers = {'Authorization': f'Bearer {self.access_token}'}
+        res = self.client.post('/api/logout_all', headers=headers)
+
+        self.assertEqual(res.status_code, 204)
+        self.assertEqual(rc.keys('session*'), [])
+
+        res = self.client.post(
+            '/api/refresh',
+            headers={'Authorization': f'Bearer {other_refresh_token}'}
+        )
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(res.get_json(), {'error': 'Token has been revoked'})
 
     def test_logout_missing_token(self):
         """ Test logout users with a missing authorization header """
@@ -395,14 +509,14 @@ class LoggedInTests(unittest.TestCase):
 
         self.assertEqual(res.status_code, 401)
         self.assertEqual(data, {'error': 'Missing Authorization Header'})
-        self.assertIsNotNone(rc.get(str(self.user_id)))
+        self.assertIsNotNone(rc.get(self.session_key))
 
     def test_logout_expired_token(self):
         """ Test logout with an expired access token """
         headers = {
             'Authorization': f'Bearer {self.access_token}'
         }
-        rc.delete(str(self.user_id))
+        rc.delete(self.session_key)
 
         res = self.client.post('/api/logout', headers=headers)
         data = res.get_json()
@@ -3,9 +3,9 @@
 """
 from config import TestConfig
 from datetime import datetime, timedelta
-from db import db, redis_client as rc
-from flask_jwt_extended import create_access_token
-from routes.auth import store_token
+from db import db, like_buffer, redis_client as rc
+from routes.auth import issue_tokens
+from routes.feed import serialize_comment
 from main import create_app
 import unittest
 from bson import ObjectId
@@ -47,16 +47,9 @@ class TestGetFeedPosts(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                user_id
+            )['access_token']
 
         # Create dummy posts
         cls.public_posts = []
@@ -90,6 +83,8 @@ class TestGetFeedPosts(unittest.TestCase):
             if i % 2 == 0:
                 p = post.copy()
                 p['_id'] = str(p['_id'])
+                del p['likes']
+                p['liked_by_me'] = False
                 cls.public_posts.append(p)
 
         # Sort posts from the most to the less recent
@@ -104,6 +99,7 @@ class TestGetFeedPosts(unittest.TestCase):
         """Clear database
         """
         db.clear_db()
+        rc.flushall()
 
     def test_get_feed_with_no_token(self):
         """Test getting feed's posts with no authentication
@@ -149,6 +145,24 @@ class TestGetFeedPosts(unittest.TestCase):
         for recieved, expected in zip(data, self.public_posts):
             self.assertEqual(recieved, expected)
 
+    def test_get_feed_stream(self):
+        """Test streaming feed's posts as NDJSON
+        """
+        for kwargs in (
+            {'query_string': {'stream': 1}, 'headers': {}},
+            {'headers': {'Accept': 'application/x-ndjson'}},
+        ):
+            kwargs['headers']['Authorization'] = 'Bearer ' + self.access_token
+            response = self.client.get('/api/feed/get_posts', **kwargs)
+
+            # Verify response
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+
+            lines = response.get_data(as_text=True).splitlines()
+            self.assertEqual([json.loads(line) for line in lines],
+                             self.public_posts)
+
     def test_get_feed_page_1(self):
         """Test getting first feed's page
         """
@@ -234,6 +248,23 @@ class TestGetFeedPosts(unittest.TestCase):
             data, {'error': 'page number must be greater or equal to 1'}
         )
 
+    def test_get_feed_page_above_max(self):
+        """Test getting feed's with a page above FEED_MAX_PAGE
+        """
+        for page in ('501', '9' * 30):
+            response = self.client.get(
+                f'/api/feed/get_posts?page={page}',
+                headers={'Authorization': 'Bearer ' + self.access_token}
+            )
+            data = response.get_json()
+
+            # Verify response
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(data, {
+                'error': 'page number must be lower or equal to 500, '
+                         'use cursor to read further'
+            })
+
     def test_get_feed_invalid_page_type(self):
         """Test getting feed's with page=page_1
         """
@@ -246,6 +277,166 @@ class TestGetFeedPosts(unittest.TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(data, {'error': 'page argument must be an integer'})
 
+    def test_get_feed_with_cursor(self):
+        """Test walking through the feed's pages with cursors
+        """
+        received = []
+        cursor = ''
+        pages = 0
+
+        while cursor is not None:
+            response = self.client.get(
+                '/api/feed/get_posts',
+                query_string={'cursor': cursor},
+                headers={'Authorization': 'Bearer ' + self.access_token}
+            )
+            data = response.get_json()
+
+            # Verify response
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(data['data']), 20)
+
+            received.extend(data['data'])
+            cursor = data['next_cursor']
+            pages += 1
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(received, self.public_posts)
+
+    def test_get_feed_invalid_cursor(self):
+        """Test getting feed's with a malformed cursor
+        """
+        response = self.client.get('/api/feed/get_posts?cursor=cursor_1',
+                                   headers={
+                                       'Authorization':
+                                       'Bearer ' + self.access_token
+                                   })
+        data = response.get_json()
+
+        # Verify response
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(data, {'error': 'invalid cursor'})
+
+
+class TestFeedListing(unittest.TestCase):
+    """ Tests for the posts representation in the feed """
+
+    def setUp(self):
+        """ Runs once before every test """
+        self.app = create_app(TestConfig)
+        self.client = self.app.test_client()
+
+        user_id = str(db.insert_user({
+            'username': 'hermione',
+            'email': 'granger@poud.mgc',
+            'password': 'leviosa',
+            'longest_streak': 0
+        }))
+
+        with self.app.app_context():
+            self.access_token = issue_tokens(
+                user_id
+            )['access_token']
+
+        self.comments = [
+            {'_id': str(ObjectId()), 'user_id': ObjectId(),
+             'post_id': ObjectId(), 'username': 'ron', 'body': f'Wow {i}'}
+            for i in range(5)
+        ]
+        ron_id = str(ObjectId())
+        for i, likers in enumerate(([ron_id, user_id], [ron_id])):
+            post_id = db.insert_post({
+                'user_id': ron_id,
+                'username': 'ron',
+                'title': f'Title {i}',
+                'content': f'This is post {i}',
+                'is_public': True,
+                'number_of_likes': 0,
+                'comments': self.comments,
+                'number_of_comments': len(self.comments),
+                'datePosted': datetime.utcnow() - timedelta(days=i)
+            })
+            for liker_id in likers:
+                db.like_post(liker_id, post_id)
+
+    def tearDown(self):
+        """ Runs once after every test """
+        db.clear_db()
+        rc.flushall()
+
+    def test_listed_posts(self):
+        """ Test the counters, like flag and comments preview of posts """
+        response = self.client.get('/api/feed/get_posts?page=1', headers={
+            'Authorization': 'Bearer ' + self.access_token
+        })
+        data = response.get_json()
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data), 2)
+        self.assertEqual([p['liked_by_me'] for p in data], [True, False])
+        self.assertEqual([p['number_of_likes'] for p in data], [2, 1])
+
+        for post in data:
+            self.assertNotIn('likes', post)
+            self.assertEqual(post['number_of_comments'], 5)
+            self.assertEqual([c['body'] for c in post['comments']],
+                             ['Wow 2', 'Wow 3', 'Wow 4'])
+
+    def test_cached_page_shared_by_users(self):
+        """ Test that the cached page shows each user's own likes """
+        db.insert_post({
+            'user_id': str(ObjectId()),
+            'username': 'ron',
+            'title': 'Lines',
+            'content': 'First line\nSecond "line"}',
+            'is_public': True,
+            'number_of_likes': 0,
+            'comments': [],
+            'number_of_comments': 0,
+            'datePosted': datetime.utcnow() + timedelta(days=1)
+        })
+        with self.app.app_context():
+            other_token = issue_tokens(str(ObjectId()))['access_token']
+
+        pages = [
+            self.client.get('/api/feed/get_posts?page=1', headers={
+                'Authorization': 'Bearer ' + token
+            }).get_json()
+            for token in (self.access_token, other_token)
+        ]
+
+        self.assertEqual(pages[0][0]['content'], 'First line\nSecond "line"}')
+        self.assertEqual([p['liked_by_me'] for p in pages[0]],
+                         [False, True, False])
+        self.assertEqual([p['liked_by_me'] for p in pages[1]],
+                         [False, False, False])
+        self.assertEqual([p['number_of_likes'] for p in pages[1]], [0, 2, 1])
+
+    def test_listed_posts_with_buffered_likes(self):
+        """ Test that buffered likes show before they are flushed """
+
+        class BufferingConfig(TestConfig):
+            LIKES_BUFFERING = True
+
+        client = create_app(BufferingConfig).test_client()
+        headers = {'Authorization': 'Bearer ' + self.access_token}
+
+        data = client.get('/api/feed/get_posts?page=1',
+                          headers=headers).get_json()
+        response = client.post('/api/feed/like', headers=headers,
+                               json={'post_id': data[1]['_id']})
+        self.assertEqual(response.status_code, 201)
+
+        data = client.get('/api/feed/get_posts?page=1',
+                          headers=headers).get_json()
+        self.assertEqual([p['liked_by_me'] for p in data], [True, True])
+        self.assertEqual([p['number_of_likes'] for p in data], [2, 2])
+
+        like_buffer.flush()
+        self.assertEqual(db.find_post({'_id': ObjectId(data[1]['_id'])})
+                         ['number_of_likes'], 2)
+
 
 class TestLikeUnlike(unittest.TestCase):
     """ Tests for liking and unliking routes """
@@ -292,6 +483,33 @@ class TestLikeUnlike(unittest.TestCase):
         db.clear_db()
         rc.flushall()
 
+    def test_like_rate_limited_by_user_and_ip(self):
+        """ Test that a user is limited across IP addresses, and an IP
+        address across users
+        """
+        class RateLimitConfig(TestConfig):
+            RATE_LIMIT_ENABLED = True
+            RATE_LIMITS = dict(TestConfig.RATE_LIMITS, feed_bp=(2, 60))
+
+        client = create_app(RateLimitConfig).test_client()
+        with self.app.app_context():
+            other_token = issue_tokens(str(ObjectId()))['access_token']
+
+        def like(token, ip):
+            return client.post(
+                '/api/feed/like',
+                headers={'Authorization': f'Bearer {token}'},
+                json={'post_id': str(self.post_id)},
+                environ_base={'REMOTE_ADDR': ip}
+            ).status_code
+
+        self.assertEqual(like(self.access_token, '10.0.0.1'), 201)
+        self.assertEqual(like(self.access_token, '10.0.0.2'), 400)
+        self.assertEqual(like(self.access_token, '10.0.0.3'), 429)
+
+        self.assertEqual(like(other_token, '10.0.0.1'), 201)
+        self.assertEqual(like(other_token, '10.0.0.1'), 429)
+
     def test_like_post(self):
         """ Test for liking posts for authed users """
 
@@ -313,7 +531,10 @@ class TestLikeUnlike(unittest.TestCase):
         post = db.find_post({'_id': self.post_id, 'user_id': self.dummy_user})
 
         self.assertEqual(post['number_of_likes'], 1)
-        self.assertIn(self.username, post['likes'])
+        self.assertEqual(
+            db.find_liked_post_ids(self.user_id, [self.post_id]),
+            {str(self.post_id)}
+        )
 
     def test_like_post_twice(self):
         """ Test for liking posts that's already liked by the current user """
@@ -336,7 +557,10 @@ class TestLikeUnlike(unittest.TestCase):
         post = db.find_post({'_id': self.post_id, 'user_id': self.dummy_user})
 
         self.assertEqual(post['number_of_likes'], 1)
-        self.assertIn(self.username, post['likes'])
+        self.assertEqual(
+            db.find_liked_post_ids(self.user_id, [self.post_id]),
+            {str(self.post_id)}
+        )
 
         res = self.client.post(
             '/api/feed/like', headers=headers, data=json.dumps(dump)
@@ -424,7 +648,10 @@ class TestLikeUnlike(unittest.TestCase):
         post = db.find_post({'_id': self.post_id, 'user_id': self.dummy_user})
 
         self.assertEqual(post['number_of_likes'], 0)
-        self.assertNotIn(self.username, post['likes'])
+        self.assertEqual(
+            db.find_liked_post_ids(self.user_id, [self.post_id]),
+            set()
+        )
 
     def test_unlike_post_twice(self):
         """ Test for unliking posts that's
@@ -450,7 +677,10 @@ class TestLikeUnlike(unittest.TestCase):
         post = db.find_post({'_id': self.post_id, 'user_id': self.dummy_user})
 
         self.assertEqual(post['number_of_likes'], 0)
-        self.assertNotIn(self.username, post['likes'])
+        self.assertEqual(
+            db.find_liked_post_ids(self.user_id, [self.post_id]),
+            set()
+        )
 
     def test_unlike_non_existing_post(self):
         """ Test unliking a post that's does not exist """
@@ -584,7 +814,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertIsNotNone(comment)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
     def test_comment_anonymous(self):
         """ Test comment for unauthenticed users. """
@@ -629,7 +859,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertIsNotNone(comment)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
         updated_comment = {
             'post_id': str(self.post_id),
@@ -649,7 +879,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertEqual(post['number_of_comments'], 1)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
     def test_update_comment_with_no_body(self):
         """ Test for updating a comment with no body. """
@@ -677,7 +907,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertIsNotNone(comment)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
         updated_comment = {
             'post_id': str(self.post_id),
@@ -721,7 +951,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertIsNotNone(comment)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
         updated_comment = {
             'comment_id': post['comments'][0]['_id'],
@@ -765,7 +995,7 @@ class TestComments(unittest.TestCase):
         comment = db.find_comment(post['comments'][0]['_id'], self.username)
 
         self.assertIsNotNone(comment)
-        self.assertEqual(data['data'], comment)
+        self.assertEqual(data['data'], serialize_comment(comment))
 
         updated_comment = {
             'post_id': str(self.post_id),
@@ -949,3 +1179,123 @@ class TestComments(unittest.TestCase):
         self.assertEqual(len(data['data']), 2)
         self.assertEqual(data['data'][0]['body'], 'Second Comment')
         self.assertEqual(data['data'][1]['body'], 'First Comment')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_get_post_comments_pages(self):
+        """ Test walking through the comments of a post by pages """
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.access_token}',
+        }
+        # Dates spanning months, in the wrong lexicographic order
+        start = datetime(2024, 1, 31, 10)
+        for i in range(5):
+            db._db['comments'].insert_one({
+                'user_id': self.user_id,
+                'username': self.username,
+                'post_id': self.post_id,
+                'body': f'Comment {i}',
+                'date_posted': start + timedelta(days=15 * i)
+            })
+
+        bodies = []
+        dump = {'post_id': str(self.post_id), 'page_size': 2}
+        while True:
+            res = self.client.post(
+                '/api/feed/post_comments',
+                headers=headers,
+                data=json.dumps(dump)
+            )
+            self.assertEqual(res.status_code, 200)
+
+            data = res.get_json()
+            self.assertLessEqual(len(data['data']), 2)
+            bodies += [c['body'] for c in data['data']]
+
+            if not data['next_cursor']:
+                break
+            dump['cursor'] = data['next_cursor']
+
+        self.assertEqual(bodies, [f'Comment {i}' for i in range(5)])
+        self.assertEqual(data['data'][-1]['date_posted'],
+                         'Sun, 31 Mar 2024 10:00:00 GMT')
+
+    def test_get_post_comments_bad_page(self):
+        """ Test asking for comments with an invalid cursor or page_size """
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.access_token}',
+        }
+        for dump in [{'cursor': 'not a cursor'}, {'page_size': 0},
+                     {'page_size': 'ten'}, {'page_size': True}]:
+            dump['post_id'] = str(self.post_id)
+            res = self.client.post(
+                '/api/feed/post_comments',
+                headers=headers,
+                data=json.dumps(dump)
+            )
+            self.assertEqual(res.status_code, 400)
+
+    def test_get_posts_comments(self):
+        """ Test getting the first page of comments of several posts """
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.access_token}',
+        }
+        other_post_id = db.insert_post(dict(self.post_info, _id=ObjectId()))
+        empty_post_id = db.insert_post(dict(self.post_info, _id=ObjectId()))
+
+        start = datetime(2024, 1, 31, 10)
+        for post_id, count in [(self.post_id, 3), (other_post_id, 1)]:
+            for i in range(count):
+                db._db['comments'].insert_one({
+                    'user_id': self.user_id,
+                    'username': self.username,
+                    'post_id': post_id,
+                    'body': f'Comment {i}',
+                    'date_posted': start + timedelta(days=i)
+                })
+
+        dump = {
+            'post_ids': [str(self.post_id), str(other_post_id),
+                         str(empty_post_id)],
+            'page_size': 2
+        }
+        res = self.client.post(
+            '/api/feed/posts_comments', headers=headers, data=json.dumps(dump)
+        )
+        data = res.get_json()['data']
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([c['body'] for c in data[str(self.post_id)]['data']],
+                         ['Comment 0', 'Comment 1'])
+        self.assertEqual(len(data[str(other_post_id)]['data']), 1)
+        self.assertIsNone(data[str(other_post_id)]['next_cursor'])
+        self.assertEqual(data[str(empty_post_id)],
+                         {'data': [], 'next_cursor': None})
+
+        # The cursor continues with /feed/post_comments
+        dump = {
+            'post_id': str(self.post_id),
+            'cursor': data[str(self.post_id)]['next_cursor']
+        }
+        res = self.client.post(
+            '/api/feed/post_comments', headers=headers, data=json.dumps(dump)
+        )
+        self.assertEqual([c['body'] for c in res.get_json()['data']],
+                         ['Comment 2'])
+
+    def test_get_posts_comments_bad_request(self):
+        """ Test getting the comments of several posts with invalid ids """
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.access_token}',
+        }
+        for post_ids in [None, [], str(self.post_id), ['not an id'],
+                         [str(ObjectId()) for _ in range(51)]]:
+            res = self.client.post(
+                '/api/feed/posts_comments',
+                headers=headers,
+                data=json.dumps({'post_ids': post_ids})
+            )
+            self.assertEqual(res.status_code, 400)
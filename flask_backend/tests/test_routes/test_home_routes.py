@@ -4,9 +4,8 @@
 from bson import ObjectId
 from config import TestConfig
 from datetime import datetime
-from db import db, redis_client as rc
-from flask_jwt_extended import create_access_token
-from routes.auth import store_token
+from db import db, leaderboard, redis_client as rc
+from routes.auth import issue_tokens
 from main import create_app
 from time import sleep
 import unittest
@@ -38,16 +37,9 @@ class TestCreateLog(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
         # Define current streak ken in Redis
         cls.cs_key = 'albushog99_CS'
@@ -106,7 +98,7 @@ class TestCreateLog(unittest.TestCase):
         self.assertEqual(post.get('content'), data['content'])
         self.assertEqual(post.get('is_public'), data['is_public'])
         self.assertEqual(post.get('number_of_likes'), 0)
-        self.assertEqual(post.get('likes'), [])
+        self.assertNotIn('likes', post)
         self.assertEqual(post.get('comments'), [])
         self.assertEqual(post.get('datePosted').strftime('%Y/%m/%d %H:%M:%S'),
                          data['datePosted'])
@@ -156,7 +148,7 @@ class TestCreateLog(unittest.TestCase):
         self.assertEqual(post.get('content'), data['content'])
         self.assertEqual(post.get('is_public'), data['is_public'])
         self.assertEqual(post.get('number_of_likes'), 0)
-        self.assertEqual(post.get('likes'), [])
+        self.assertNotIn('likes', post)
         self.assertEqual(post.get('comments'), [])
         self.assertEqual(post.get('datePosted').strftime('%Y/%m/%d %H:%M:%S'),
                          data['datePosted'])
@@ -391,3 +383,97 @@ class TestCreateLog(unittest.TestCase):
         # Verify longest streak
         user = db.find_user({'_id': ObjectId(self.user_id)})
         self.assertEqual(user['longest_streak'], 5)
+
+
+class TestLeaderboard(unittest.TestCase):
+    """Tests for 'GET /leaderboard' route
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs once before all tests
+        """
+
+        # Create app
+        cls.app = create_app(TestConfig)
+
+        # Create client
+        cls.client = cls.app.test_client()
+
+        # Create dummy users with their streaks
+        cls.user_ids = []
+        for i, (current, longest) in enumerate([(2, 6), (5, 5), (1, 8)]):
+            infos = {
+                'username': f'wizard{i}',
+                'email': f'wizard{i}@poud.mgc',
+                'password': 'gumbledore',
+                'longest_streak': longest
+            }
+            user_id = str(db.insert_user(infos))
+            leaderboard.record(user_id, longest, 60)
+            leaderboard.record(user_id, current, 60)
+            cls.user_ids.append(user_id)
+
+        # Create JWT Access Token
+        with cls.app.app_context():
+            cls.access_token = issue_tokens(
+                cls.user_ids[0]
+            )['access_token']
+
+        cls.headers = {'Authorization': 'Bearer ' + cls.access_token}
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clear Mongo and Redis databases
+        """
+        db.clear_db()
+        rc.flushdb()
+
+    def test_leaderboard_with_no_token(self):
+        """Test getting the leaderboard with no authentication
+        """
+        response = self.client.get('/api/leaderboard')
+
+        # Verify response
+        self.assertEqual(response.status_code, 401)
+
+    def test_current_leaderboard(self):
+        """Test ranking the users by current streak
+        """
+        response = self.client.get('/api/leaderboard', headers=self.headers)
+        data = response.get_json()
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data, [
+            {'rank': 1, 'user_id': self.user_ids[1],
+             'username': 'wizard1', 'streak': 5},
+            {'rank': 2, 'user_id': self.user_ids[0],
+             'username': 'wizard0', 'streak': 2},
+            {'rank': 3, 'user_id': self.user_ids[2],
+             'username': 'wizard2', 'streak': 1}
+        ])
+
+    def test_longest_leaderboard_with_limit(self):
+        """Test ranking the best users by longest streak
+        """
+        response = self.client.get('/api/leaderboard?board=longest&limit=2',
+                                   headers=self.headers)
+        data = response.get_json()
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([user['username'] for user in data],
+                         ['wizard2', 'wizard0'])
+        self.assertEqual([user['streak'] for user in data], [8, 6])
+
+    def test_leaderboard_with_wrong_arguments(self):
+        """Test getting the leaderboard with an invalid board or limit
+        """
+        for query in ('board=best', 'limit=0', 'limit=many'):
+            response = self.client.get(f'/api/leaderboard?{query}',
+                                       headers=self.headers)
+
+            # Verify response
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
@@ -3,12 +3,14 @@
 """
 from bson import ObjectId
 from config import TestConfig
-from datetime import datetime
-from db import db, redis_client as rc
+from datetime import datetime, timedelta
+from db import (
+    activity, db, feed_cache, job_queue, leaderboard, redis_client as rc
+)
 from db.db_manager import hash_pass, check_hash_password
-from flask_jwt_extended import create_access_token
-from routes.auth import store_token
+from routes.auth import issue_tokens
 from main import create_app
+from tasks import TASKS
 import string
 from time import sleep
 import random
@@ -41,16 +43,9 @@ class TestGetInfos(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
     @classmethod
     def tearDownClass(cls):
@@ -98,6 +93,43 @@ class TestGetInfos(unittest.TestCase):
             'username': 'albushog99'
         })
 
+    def test_get_infos_of_a_registered_user(self):
+        """Test the cached routes with a user created by /register, whose
+        document has dates
+        """
+        response = self.client.post('/api/register', json={
+            'email': 'minerva@poud.mgc',
+            'username': 'mcgonagall',
+            'password': 'transfiguration'
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.post('/api/login', json={
+            'email': 'minerva@poud.mgc',
+            'password': 'transfiguration'
+        })
+        headers = {
+            'Authorization': 'Bearer ' + response.get_json()['access_token']
+        }
+
+        # The first call caches the user, the next ones read the cache
+        for _ in range(2):
+            response = self.client.get('/api/me/get_infos', headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get_json(), {
+                'email': 'minerva@poud.mgc',
+                'username': 'mcgonagall'
+            })
+
+        response = self.client.get('/api/me/streaks', headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/api/log', headers=headers, json={
+            'title': 'Diary',
+            'content': 'Taught some spells'
+        })
+        self.assertEqual(response.status_code, 201)
+
 
 class TestGetStreaks(unittest.TestCase):
     """Tests for 'GET /me/streaks' route
@@ -125,16 +157,9 @@ class TestGetStreaks(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
         # Define current streak ken in Redis
         cls.cs_key = 'albushog99_CS'
@@ -212,6 +237,193 @@ class TestGetStreaks(unittest.TestCase):
                                 'current_streak': 48, 'ttl': 2})
 
 
+class TestGetRank(unittest.TestCase):
+    """Tests for 'GET /me/rank' route
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs once before all tests
+        """
+
+        # Create app
+        cls.app = create_app(TestConfig)
+
+        # Create client
+        cls.client = cls.app.test_client()
+
+        # Create dummy user
+        infos = {
+            'username': 'albushog99',
+            'email': 'lumos@poud.mgc',
+            'password': 'gumbledore',
+            'longest_streak': 0
+        }
+        cls.user_id = str(db.insert_user(infos))
+
+        # Create JWT Access Token
+        with cls.app.app_context():
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
+
+        cls.headers = {'Authorization': 'Bearer ' + cls.access_token}
+
+        # Create another ranked user
+        cls.other_user_id = str(ObjectId())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clear Mongo and Redis databases
+        """
+        db.clear_db()
+        rc.flushdb()
+
+    def tearDown(self):
+        """Reset streaks and ranks after each test
+        """
+        rc.delete('albushog99_CS')
+        leaderboard.remove(self.user_id)
+        leaderboard.remove(self.other_user_id)
+
+    def test_get_rank_with_no_token(self):
+        """Test getting rank with no authentication
+        """
+        response = self.client.get('/api/me/rank')
+
+        # Verify response
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_rank_unranked(self):
+        """Test getting the rank of a user without streak
+        """
+        response = self.client.get('/api/me/rank', headers=self.headers)
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(),
+                         {'current': None, 'longest': None})
+
+    def test_get_rank_after_logging(self):
+        """Test getting the rank of a user who logged an entry
+        """
+        leaderboard.record(self.other_user_id, 4, 60)
+
+        response = self.client.post('/api/log', headers=self.headers, json={
+            'title': 'Diary',
+            'content': 'Practiced some spells'
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/me/rank', headers=self.headers)
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {
+            'current': {'rank': 2, 'streak': 1},
+            'longest': {'rank': 2, 'streak': 1}
+        })
+
+
+class TestGetActivity(unittest.TestCase):
+    """Tests for 'GET /me/activity' route
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Runs once before all tests
+        """
+
+        # Create app
+        cls.app = create_app(TestConfig)
+
+        # Create client
+        cls.client = cls.app.test_client()
+
+        # Create dummy user
+        infos = {
+            'username': 'albushog99',
+            'email': 'lumos@poud.mgc',
+            'password': 'gumbledore',
+            'longest_streak': 0
+        }
+        cls.user_id = str(db.insert_user(infos))
+
+        # Create JWT Access Token
+        with cls.app.app_context():
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
+
+        cls.headers = {'Authorization': 'Bearer ' + cls.access_token}
+
+    @classmethod
+    def tearDownClass(cls):
+        """Clear Mongo and Redis databases
+        """
+        db.clear_db()
+        rc.flushdb()
+
+    def test_get_activity_with_no_token(self):
+        """Test getting activity with no authentication
+        """
+        response = self.client.get('/api/me/activity')
+
+        # Verify response
+        self.assertEqual(response.status_code, 401)
+
+    def test_get_activity_of_a_year(self):
+        """Test getting the activity of a given year
+        """
+        for day in (4, 5, 6, 8):
+            activity.mark(self.user_id, datetime(2021, 3, day, 9))
+
+        response = self.client.get('/api/me/activity?year=2021',
+                                   headers=self.headers)
+        data = response.get_json()
+
+        # Verify response
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['year'], 2021)
+        self.assertEqual(len(data['days']), 365)
+        self.assertEqual(data['active_days'], 4)
+        self.assertEqual(data['streaks'], [
+            {'start': '2021-03-04', 'length': 3},
+            {'start': '2021-03-08', 'length': 1}
+        ])
+        self.assertEqual(data['longest_streak'], 3)
+
+    def test_get_activity_after_logging(self):
+        """Test that logging an entry marks the current day
+        """
+        response = self.client.post('/api/log', headers=self.headers, json={
+            'title': 'Diary',
+            'content': 'Practiced some spells',
+            'is_public': False
+        })
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/me/activity', headers=self.headers)
+        data = response.get_json()
+
+        # Verify response
+        today = datetime.utcnow()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['year'], today.year)
+        self.assertEqual(data['days'][today.timetuple().tm_yday - 1], 1)
+
+    def test_get_activity_with_wrong_year(self):
+        """Test getting activity with an invalid year
+        """
+        for year in ('abc', '0', '10000'):
+            response = self.client.get(f'/api/me/activity?year={year}',
+                                       headers=self.headers)
+
+            # Verify response
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
+
+
 class TestUpdateInfos(unittest.TestCase):
     """Tests for 'PUT /me/update_infos' route
     """
@@ -238,16 +450,9 @@ class TestUpdateInfos(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
     @classmethod
     def tearDownClass(cls):
@@ -300,6 +505,24 @@ class TestUpdateInfos(unittest.TestCase):
     def test_update_email_and_username(self):
         """Test successefully updating user's email and username
         """
+        # Create a post and a comment with the old username
+        post_id = db.insert_post({
+            'user_id': self.user_id,
+            'username': 'albushog99',
+            'title': 'title',
+            'content': 'content',
+            'is_public': True,
+            'comments': [],
+            'datePosted': datetime.utcnow()
+        })
+        db.insert_comment({
+            'post_id': post_id,
+            'user_id': ObjectId(self.user_id),
+            'username': 'albushog99',
+            'body': 'comment',
+            'date_posted': datetime.utcnow()
+        }, str(post_id))
+
         headers = {'Authorization': 'Bearer ' + self.access_token}
         to_update = {'email': 'albus@poud.com', 'username': 'phoenix00'}
         response = self.client.put('/api/me/update_infos',
@@ -309,14 +532,65 @@ class TestUpdateInfos(unittest.TestCase):
         data = response.get_json()
 
         # Verify response
-        self.assertEqual(response.status_code, 201)
-        self.assertEqual(data, {'success': 'user updated'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(data['success'], 'user updated')
+        self.assertIn('job_id', data)
 
         # Ensure the user was updated
         user = db.find_user({'_id': ObjectId(self.user_id)})
         self.assertEqual(user['email'], to_update['email'])
         self.assertEqual(user['username'], to_update['username'])
 
+        # Run the job copying the username to the posts and comments
+        self.assertEqual(job_queue.work(TASKS, burst=True), 1)
+        job = self.client.get(f"/api/jobs/{data['job_id']}",
+                              headers=headers).get_json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['done'], 2)
+
+        post = db.find_post({'_id': post_id})
+        self.assertEqual(post['username'], 'phoenix00')
+        self.assertEqual(post['comments'][0]['username'], 'phoenix00')
+        comments = db.get_post_comments(str(post_id))
+        self.assertEqual(comments[0]['username'], 'phoenix00')
+
+    def test_update_email_only(self):
+        """Test updating user's email without starting a job
+        """
+        headers = {'Authorization': 'Bearer ' + self.access_token}
+        response = self.client.put('/api/me/update_infos',
+                                   headers=headers,
+                                   json={'email': 'dumble@poud.com'})
+
+        # Verify response
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json(), {'success': 'user updated'})
+
+    def test_update_to_used_email_or_username(self):
+        """Test updating user's email or username to another user's
+        """
+        db.insert_user({'username': 'hermione', 'email': 'granger@poud.mgc',
+                        'password': 'leviosa'})
+        headers = {'Authorization': 'Bearer ' + self.access_token}
+
+        response = self.client.put('/api/me/update_infos',
+                                   headers=headers,
+                                   json={'username': 'hermione'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(),
+                         {'error': 'Username already used'})
+
+        response = self.client.put('/api/me/update_infos',
+                                   headers=headers,
+                                   json={'email': 'granger@poud.mgc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json(), {'error': 'Email already used'})
+
+        # The user kept its email and username
+        user = db.find_user({'_id': ObjectId(self.user_id)})
+        self.assertNotEqual(user['username'], 'hermione')
+        self.assertNotEqual(user['email'], 'granger@poud.mgc')
+
 
 class TestUpdatePassword(unittest.TestCase):
     """Tests for 'PUT /me/update_password' route
@@ -346,16 +620,9 @@ class TestUpdatePassword(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
     @classmethod
     def tearDownClass(cls):
@@ -479,27 +746,20 @@ class TestGetPosts(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                user_id
+            )['access_token']
 
         # Create dummy posts
         cls.posts = []
 
-        for _ in range(3):
+        for i in range(3):
             characters = string.ascii_letters + string.punctuation
 
             title = ''.join(random.choice(characters) for _ in range(10))
             content = ''.join(random.choice(characters) for _ in range(30))
             is_public = random.choice([True, False])
-            datePosted = datetime.utcnow()
+            datePosted = datetime.utcnow() + timedelta(minutes=i)
 
             post = {
                 'username': infos['username'],
@@ -513,7 +773,10 @@ class TestGetPosts(unittest.TestCase):
                 'datePosted': datePosted
             }
 
-            cls.posts.append(post.copy())
+            listed_post = post.copy()
+            del listed_post['likes']
+            listed_post['liked_by_me'] = False
+            cls.posts.append(listed_post)
 
             post['user_id'] = user_id
             db.insert_post(post)
@@ -598,16 +861,9 @@ class TestUpdateLog(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
         # Create dummy malicious user
         infos = {
@@ -620,16 +876,9 @@ class TestUpdateLog(unittest.TestCase):
 
         # Create JWT malicious Access Token
         with cls.app.app_context():
-            cls.dark_access_token = create_access_token(
-                identity=cls.dark_user_id
-            )
-
-        # Store JWT malicious Access Token
-        store_token(
-            cls.dark_user_id,
-            cls.dark_access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.dark_access_token = issue_tokens(
+                cls.dark_user_id
+            )['access_token']
 
         # Create two dummy posts
         doc1 = {
@@ -926,16 +1175,9 @@ class TestDeleteLog(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
         # Create dummy malicious user
         infos = {
@@ -948,16 +1190,9 @@ class TestDeleteLog(unittest.TestCase):
 
         # Create JWT malicious Access Token
         with cls.app.app_context():
-            cls.dark_access_token = create_access_token(
-                identity=cls.dark_user_id
-            )
-
-        # Store JWT malicious Access Token
-        store_token(
-            cls.dark_user_id,
-            cls.dark_access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.dark_access_token = issue_tokens(
+                cls.dark_user_id
+            )['access_token']
 
         # Create two dummy posts
         doc1 = {
@@ -1138,16 +1373,9 @@ class TestDeleteUser(unittest.TestCase):
 
         # Create JWT Access Token
         with cls.app.app_context():
-            cls.access_token = create_access_token(
-                identity=cls.user_id
-            )
-
-        # Store JWT Access Token
-        store_token(
-            cls.user_id,
-            cls.access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.access_token = issue_tokens(
+                cls.user_id
+            )['access_token']
 
         # Create another dummy user
         infos = {
@@ -1160,16 +1388,9 @@ class TestDeleteUser(unittest.TestCase):
 
         # Create another JWT Access Token
         with cls.app.app_context():
-            cls.another_access_token = create_access_token(
-                identity=cls.another_user_id
-            )
-
-        # Store another JWT Access Token
-        store_token(
-            cls.another_user_id,
-            cls.another_access_token,
-            cls.app.config["JWT_ACCESS_TOKEN_EXPIRES"]
-        )
+            cls.another_access_token = issue_tokens(
+                cls.another_user_id
+            )['access_token']
 
         # Create two dummy posts for the first user
         doc1 = {
@@ -1240,18 +1461,39 @@ class TestDeleteUser(unittest.TestCase):
 
         # Make the call
         headers = {'Authorization': 'Bearer ' + self.access_token}
+        version = feed_cache.version()
 
         response = self.client.delete('/api/me/delete_user', headers=headers)
 
         data = response.get_json()
 
         # Verify response
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(data, {'success': 'account deleted'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(data['success'], 'account deletion started')
 
-        # Check the deletion of the user and the user's posts
+        # The user is hidden right away, and the cached feed dropped
         self.assertIsNone(db.find_user({'_id': ObjectId(self.user_id)}))
+        self.assertGreater(feed_cache.version(), version)
+
+        # Only the user follows the job, even once logged out
+        response = self.client.get(f"/api/jobs/{data['job_id']}")
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get(f"/api/jobs/{data['job_id']}", headers={
+            'Authorization': 'Bearer ' + self.another_access_token
+        })
+        self.assertEqual(response.status_code, 404)
+
+        # Run the job deleting the user's posts
+        self.assertEqual(job_queue.work(TASKS, burst=True), 1)
+        job = self.client.get(f"/api/jobs/{data['job_id']}",
+                              headers=headers).get_json()
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['done'], 2)
+
+        # Check the deletion of the user and the user's posts
         self.assertEqual(len(db.find_user_posts(self.user_id)), 0)
+        self.assertEqual(db._db['users'].count_documents(
+            {'_id': ObjectId(self.user_id)}), 0)
 
     def test_delete_user_with_no_posts(self):
         """Test deleting a user having no posts
@@ -1270,8 +1512,9 @@ class TestDeleteUser(unittest.TestCase):
         data = response.get_json()
 
         # Verify response
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(data, {'success': 'account deleted'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(data['success'], 'account deletion started')
+        self.assertEqual(job_queue.work(TASKS, burst=True), 1)
 
         # Check the user's deletion of the user
         self.assertIsNone(db.find_user(
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Module unittest for the tasks of the background jobs.
+"""
+import unittest
+from bson import ObjectId
+from datetime import datetime, timedelta
+from db import db, job_queue, redis_client as rc, timeline
+from db.job_queue import JobQueue
+from tasks import TASKS
+from unittest.mock import patch
+import tasks
+
+
+class TestTasks(unittest.TestCase):
+    """ Defines a class for testing the tasks of the background jobs. """
+
+    def setUp(self):
+        """ Create a user commenting and liking another user's post """
+        self.user_id = self.insert_user('mohamed')
+        self.other_id = self.insert_user('sara')
+
+        self.post_ids = [self.insert_post(self.user_id, 'mohamed')
+                         for _ in range(3)]
+        self.other_post_id = self.insert_post(self.other_id, 'sara')
+
+        # Comments alternate between both users, mohamed's are the latest
+        start = datetime.utcnow()
+        for i in range(6):
+            user_id, username = [(self.other_id, 'sara'),
+                                 (self.user_id, 'mohamed')][i % 2]
+            db.insert_comment({
+                'post_id': self.other_post_id,
+                'user_id': ObjectId(user_id),
+                'username': username,
+                'body': f'Comment {i}',
+                'date_posted': start + timedelta(seconds=i)
+            }, str(self.other_post_id))
+
+        db.like_post(self.user_id, str(self.other_post_id))
+        db.like_post(self.other_id, str(self.other_post_id))
+
+    def tearDown(self):
+        """ Clean up Redis and the database after each test """
+        rc.flushdb()
+        db.clear_db()
+
+    def insert_user(self, username):
+        """ Insert a user and return its id """
+        return str(db.insert_user({
+            'email': f'{username}@example.com', 'username': username,
+            'password': 'pass', 'longest_streak': 0
+        }))
+
+    def insert_post(self, user_id, username):
+        """ Insert a public post in the timeline and return its id """
+        document = {'user_id': user_id, 'username': username,
+                    'title': 'Title', 'content': 'Content',
+                    'is_public': True, 'number_of_likes': 0,
+                    'comments': [], 'datePosted': datetime.utcnow()}
+        post_id = db.insert_post(document)
+        timeline.add(post_id, document['datePosted'])
+
+        return post_id
+
+    def run_job(self, name, **args):
+        """ Queue a job and run it, return its state """
+        job_id = job_queue.enqueue(name, **args)
+        job_queue.work(TASKS, burst=True)
+
+        return job_queue.status(job_id)
+
+    @patch.object(tasks, 'BATCH_SIZE', 2)
+    def test_delete_user(self):
+        """ Test deleting a user's documents, and the user's comments and
+        likes from the other posts
+        """
+        status = self.run_job('delete_user', user_id=self.user_id)
+
+        self.assertEqual(status['status'], 'done')
+        # 3 comments, 1 like and 3 posts
+        self.assertEqual(status['done'], 7)
+
+        self.assertEqual(db.find_user_posts(self.user_id), [])
+        self.assertEqual(db._db['users'].count_documents(
+            {'_id': ObjectId(self.user_id)}), 0)
+        for post_id in self.post_ids:
+            self.assertIsNone(rc.zscore(timeline.KEY, str(post_id)))
+
+        post = db.find_post({'_id': self.other_post_id})
+        self.assertEqual(post['number_of_likes'], 1)
+        self.assertEqual(post['number_of_comments'], 3)
+        self.assertEqual([c['body'] for c in post['comments']],
+                         ['Comment 0', 'Comment 2', 'Comment 4'])
+
+    def test_delete_user_resumes(self):
+        """ Test that a retried deletion resumes after its checkpoint """
+        calls = []
+        delete_posts_batch = db.delete_user_posts_batch
+
+        def fail_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise ConnectionError('Lost connection')
+            return delete_posts_batch(*args)
+
+        queue = JobQueue(rc, max_attempts=2, retry_delay=0)
+        job_id = queue.enqueue('delete_user', user_id=self.user_id)
+        with patch.object(db, 'delete_user_posts_batch', fail_once), \
+                patch.object(db, 'delete_user_comments_batch',
+                             wraps=db.delete_user_comments_batch) as comments:
+            queue.work(TASKS, burst=True)
+
+        status = queue.status(job_id)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['attempts'], 2)
+        self.assertEqual(status['done'], 7)
+        # Twice in the first attempt, then once by the final delete_user:
+        # the retry resumed after the comments
+        self.assertEqual(comments.call_count, 3)
+        self.assertEqual(db._db['users'].count_documents(
+            {'_id': ObjectId(self.user_id)}), 0)
+
+    @patch.object(tasks, 'BATCH_SIZE', 2)
+    def test_rename_user(self):
+        """ Test copying a new username to the user's documents """
+        db.update_user_info(self.user_id, {'username': 'mo'})
+
+        status = self.run_job('rename_user', user_id=self.user_id)
+
+        self.assertEqual(status['status'], 'done')
+        # 3 posts and 3 comments
+        self.assertEqual(status['done'], 6)
+
+        for post in db.find_user_posts(self.user_id):
+            self.assertEqual(post['username'], 'mo')
+        post = db.find_post({'_id': self.other_post_id})
+        self.assertEqual([c['username'] for c in post['comments']],
+                         ['mo', 'sara', 'mo'])
+        self.assertEqual(db._db['comments'].count_documents(
+            {'username': 'mohamed'}), 0)
+
+    def test_rename_deleted_user(self):
+        """ Test that renaming a deleted user does nothing """
+        db.mark_user_deleted(self.user_id)
+
+        status = self.run_job('rename_user', user_id=self.user_id)
+
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['done'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
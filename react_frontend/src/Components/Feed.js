@@ -10,7 +10,7 @@ function Posts() {
   const [username, setUsername] = useState('');
   const [posts, setPosts] = useState([]);
   const [comments, setComments] = useState({});
-  const [showAllLikes, setShowAllLikes] = useState(false);
+  const [commentCursors, setCommentCursors] = useState({});
   const [showComments, setShowComments] = useState(false);
   const [newCommentText, setNewCommentText] = useState('');
   const navigate = useNavigate();
@@ -43,6 +43,23 @@ function Posts() {
     }
   };
 
+  // Function to fetch the next page of the comments of a post
+  const fetchComments = async (postId) => {
+    try {
+      const res = await apiClient.post('/feed/post_comments', {
+        post_id: postId,
+        cursor: commentCursors[postId],
+      });
+      setComments({
+        ...comments,
+        [postId]: [...(comments[postId] || []), ...res.data.data],
+      });
+      setCommentCursors({ ...commentCursors, [postId]: res.data.next_cursor });
+    } catch (error) {
+      console.error('Error fetching comments:', error);
+    }
+  };
+
   // Function to handle liking a post
   const handleLikePost = async (postId) => {
     try {
@@ -84,13 +101,13 @@ function Posts() {
       fetchPosts();
       // Clear the input field
       setNewCommentText('');
-      // Update comments state
-      setComments({
-        ...comments,
-        [postId]: comments[postId]
-          ? [...comments[postId], response.data]
-          : [response.data],
-      });
+      // Update comments state, unless the comment comes in a next page
+      if (comments[postId] && !commentCursors[postId]) {
+        setComments({
+          ...comments,
+          [postId]: [...comments[postId], response.data.data],
+        });
+      }
     } catch (error) {
       console.error('Error posting comment:', error);
     }
@@ -109,12 +126,14 @@ function Posts() {
       // Fetch posts again to update the feed
       fetchPosts();
       // Remove the deleted comment from state
-      setComments({
-        ...comments,
-        [postId]: comments[postId].filter(
-          (comment) => comment._id !== commentId
-        ),
-      });
+      if (comments[postId]) {
+        setComments({
+          ...comments,
+          [postId]: comments[postId].filter(
+            (comment) => comment._id !== commentId
+          ),
+        });
+      }
     } catch (error) {
       console.error('Error deleting comment:', error);
     }
@@ -151,7 +170,7 @@ function Posts() {
 
                 <div className='mb-2'>
                   {/* Like OR Unlike button */}
-                  {post.likes.includes(username) ? (
+                  {post.liked_by_me ? (
                     <button
                       className='bg-white-500 text-blue-500 border border-blue-500 px-2 py-1 rounded mt-2 mr-1'
                       onClick={() => handleUnlikePost(post._id)}
@@ -167,50 +186,16 @@ function Posts() {
                     </button>
                   )}
 
-                  {/* Display usernames of users who liked the post */}
+                  {/* Display the number of likes */}
                   <p className='text-sm inline text-gray-700 mt-2'>
-                    {post.number_of_likes > 0 && (
+                    {post.number_of_likes > 0 ? (
                       <>
-                        Liked by {post.likes[0]}
-                        {post.number_of_likes > 1 && (
-                          <>
-                            {' '}
-                            {!showAllLikes && (
-                              <>
-                                and {post.number_of_likes - 1} other
-                                {post.number_of_likes > 2 ? 's' : ''}.
-                                <button
-                                  className='text-orange underline ml-1'
-                                  onClick={() => setShowAllLikes(true)}
-                                >
-                                  Show all
-                                </button>
-                              </>
-                            )}
-                            {showAllLikes && (
-                              <>
-                                {', '}
-                                {post.likes.slice(1).map((like, index) => (
-                                  <span key={like}>
-                                    {like}
-                                    {index < post.number_of_likes - 2
-                                      ? ', '
-                                      : '.'}
-                                  </span>
-                                ))}
-                                <button
-                                  className='text-black underline ml-1'
-                                  onClick={() => setShowAllLikes(false)}
-                                >
-                                  Hide
-                                </button>
-                              </>
-                            )}
-                          </>
-                        )}
+                        Liked by {post.number_of_likes} user
+                        {post.number_of_likes > 1 ? 's' : ''}.
                       </>
+                    ) : (
+                      <span>No likes yet</span>
                     )}
-                    {post.number_of_likes === 0 && <span>No likes yet</span>}
                   </p>
 
                   {/* Comment input field */}
@@ -258,8 +243,8 @@ function Posts() {
                     <>
                       {/* Display comments */}
                       <div>
-                        {post.comments &&
-                          post.comments.map((comment) => (
+                        {(comments[post._id] || post.comments || []).map(
+                          (comment) => (
                             <div
                               key={comment._id}
                               className='border border-gray-300 rounded p-2 mb-2'
@@ -280,7 +265,23 @@ function Posts() {
                                 Delete
                               </button>
                             </div>
-                          ))}
+                          )
+                        )}
+
+                        {/* Only the latest comments come with the post */}
+                        {((!comments[post._id] &&
+                          post.number_of_comments >
+                            (post.comments || []).length) ||
+                          commentCursors[post._id]) && (
+                          <button
+                            className='text-orange underline text-sm'
+                            onClick={() => fetchComments(post._id)}
+                          >
+                            {comments[post._id]
+                              ? 'Show more comments'
+                              : 'Show all comments'}
+                          </button>
+                        )}
                       </div>
                     </>
                   )}
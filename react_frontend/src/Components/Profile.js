@@ -54,7 +54,7 @@ function Profile() {
     try {
       const response = await apiClient.delete('/me/delete_user');
 
-      if (response.status === 200) {
+      if (response.status === 202) {
         localStorage.removeItem('jwt_access_token');
         localStorage.removeItem('jwt_refresh_token');
         navigate('/login');
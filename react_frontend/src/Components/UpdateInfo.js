@@ -38,7 +38,7 @@ function UpdateInfo() {
     try {
       const response = await apiClient.put('/me/update_infos', userInfo);
 
-      if (response.status == 201) {
+      if (response.status == 201 || response.status == 202) {
         navigate('/profile', {
           state: { successMessage: 'Your infos were updated successfully !' },
         });